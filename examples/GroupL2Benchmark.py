@@ -0,0 +1,70 @@
+'''
+Times the groupL2 regularizer against a loop over the groups, as groupL2
+was previously implemented, for increasing numbers of groups.
+'''
+import numpy as np
+import sys
+sys.path.append('../')
+import regularizers as rg
+from time import time
+
+def loopGroupL2(dimension,groups):
+    # the loop implementation, for comparison
+    appearCount = np.zeros(dimension)
+    for group in groups:
+        for i in group:
+            if not isinstance(i,int):
+                raise Exception("non-integer index")
+            elif i < 0 or i >= dimension:
+                raise Exception("index out of range")
+            else:
+                appearCount[i] += 1
+    leftOut = np.array([i for i in range(dimension) if appearCount[i] == 0],dtype=int)
+
+    def val(x):
+        regVal = 0.0
+        for group in groups:
+            regVal += np.linalg.norm(x[group],2)
+        return regVal
+
+    def prox(x,scale):
+        v = np.zeros(dimension)
+        v[leftOut] = x[leftOut]
+        for group in groups:
+            groupNorm = np.linalg.norm(x[group],2)
+            if groupNorm > scale:
+                v[group] = (groupNorm - scale)*x[group]/groupNorm
+        return v
+
+    return val,prox
+
+def timeIt(f,repeats):
+    t0 = time()
+    for _ in range(repeats):
+        out = f()
+    return (time() - t0)/repeats,out
+
+np.random.seed(1)
+groupSize = 8
+repeats = 3
+print("{:>10} {:>12} {:>12} {:>12} {:>12} {:>12} {:>12}".format(
+    "groups","build loop","build vec","prox loop","prox vec","value loop","value vec"))
+for ngroups in [10**3,10**4,10**5]:
+    d = ngroups*groupSize
+    # groups of random indices, each leaving one index out
+    perm = [int(i) for i in np.random.permutation(d)]
+    groups = [perm[i*groupSize:(i+1)*groupSize - 1] for i in range(ngroups)]
+    x = np.random.normal(0,1,d)
+    scale = 1.0 # scaling times step of reg
+
+    tBuildLoop,(loopVal,loopProx) = timeIt(lambda: loopGroupL2(d,groups),1)
+    tBuildVec,reg = timeIt(lambda: rg.groupL2(d,groups),1)
+    tProxLoop,vLoop = timeIt(lambda: loopProx(x,scale),repeats)
+    tProxVec,vVec = timeIt(lambda: reg.getProx(x),repeats)
+    tValLoop,valLoop = timeIt(lambda: loopVal(x),repeats)
+    tValVec,valVec = timeIt(lambda: reg.evaluate(x),repeats)
+
+    assert np.abs(vLoop - vVec).max() < 1e-10
+    assert abs(valLoop - valVec) < 1e-8*valLoop
+    print("{:>10d} {:>12.4f} {:>12.4f} {:>12.4f} {:>12.4f} {:>12.4f} {:>12.4f}".format(
+        ngroups,tBuildLoop,tBuildVec,tProxLoop,tProxVec,tValLoop,tValVec))
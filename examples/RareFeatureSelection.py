@@ -1,7 +1,7 @@
 import sys
 sys.path.append('../')
 import projSplitFit as ps
-from scipy.sparse.linalg import LinearOperator
+import projSplitUtils as ut
 import numpy as np
 import regularizers
 import lossProcessors
@@ -25,13 +25,9 @@ projSplit.addData(X,r,loss='logistic',linearOp=H,normalize=False)
 ### first regularizer
 mu=0.5
 lam=1e-4
-def applyG(x):
-    return x[:-1]
-def applyGtranspose(v):
-    return np.append(v,0.0)
+# all coefficients but the last one (the root of the tree)
 (_,nv) = H.shape
-shape = (nv-1,nv)
-G = LinearOperator(shape,matvec=applyG,rmatvec = applyGtranspose)
+G = ut.Subset(nv,slice(0,nv-1))
 projSplit.addRegularizer(regularizers.L1(scaling = mu*lam),linearOp=G)
 
 ### second regularizer
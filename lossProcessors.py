@@ -7,9 +7,19 @@ from numpy import zeros
 from numpy import ones
 from numpy import copy as npcopy
 from numpy import identity
+from numpy import sqrt
+from numpy import arange
+from numpy import tile
+from numpy import sum as npsum
+from numpy import sort as npsort
+from numpy import array
 from numpy.linalg import inv as npinv
 from numpy.linalg import norm
+from numpy import isfinite
+from numpy.random import default_rng
+from scipy.sparse import issparse
 import userInputVal as ui
+import projSplitUtils as ut
 #-----------------------------------------------------------------------------
 # processor class and related objects
 #-----------------------------------------------------------------------------
@@ -31,16 +41,110 @@ class LossProcessor(object):
     embedOK = False  # This flag is True if this lossProcessor can handle an embedded
                      # regularizer. Examples which can are Forward1x and Forward2x
                      # but backward classes cannot.
+    needsCurvature = False # This flag is True for lossProcessors which need the
+                           # second derivative of the loss, such as BackwardNewtonCG
+    multiResponseOK = False # This flag is True for lossProcessors which can work
+                            # with iterates holding one column per response
+    needsMatrix = False # This flag is True for lossProcessors which need the entries
+                        # of the observations, such as BackwardExact, and so cannot
+                        # use a matrix-free projSplitUtils.ObservationOperator
+    lipschitzPowerIters = 100 # maximum number of power iterations used to estimate
+                              # the largest eigenvalue of A_i^T A_i in _estimateLipschitz
+    lipschitzPowerTol = 1e-6  # relative change at which the power iterations stop
 
     @staticmethod
     def _getAGrad(psObj,point,thisSlice):
 
         yhat = psObj.A[thisSlice].dot(point)
+        return LossProcessor._getGradFromPredictions(psObj,yhat,thisSlice)
+
+    @staticmethod
+    def _getGradFromPredictions(psObj,yhat,thisSlice):
+        # gradient of the block loss given the predictions yhat = A[thisSlice] x
         gradL = psObj.loss.derivative(yhat,psObj.yresponse[thisSlice])
         grad = (1.0/psObj.nrowsOfA)*psObj.A[thisSlice].T.dot(gradL)
 
         return grad
 
+    @staticmethod
+    def _getGradsFromPredictions(psObj,yhats,thisSlice):
+        # batched version of _getGradFromPredictions: column j of yhats holds
+        # the predictions of trial point j. The loss derivative is applied to
+        # the stacked columns so that it only ever sees 1D arrays.
+        yresp = psObj.yresponse[thisSlice]
+        gradL = psObj.loss.derivative(yhats.ravel(order='F'),tile(yresp,yhats.shape[1]))
+        gradL = gradL.reshape(yhats.shape,order='F')
+        return (1.0/psObj.nrowsOfA)*psObj.A[thisSlice].T.dot(gradL)
+
+    @staticmethod
+    def _proxColumns(psObj,T,steps):
+        # apply the embedded regularizer prox (leaving the intercept alone)
+        # to each column of T, using the matching stepsize
+        if not psObj.embeddedRegInUse:
+            return npcopy(T)
+        X = npcopy(T)
+        for j in range(len(steps)):
+            psObj.embedded.setStep(steps[j])
+            X[1:,j] = psObj.embedded.getProx(T[1:,j])
+        return X
+
+    @staticmethod
+    def _estimateLipschitz(psObj):
+        # Estimate the Lipschitz modulus L_i of the gradient of each block loss
+        # f_i as (c_i/n)*lambda_max(A_i^T A_i), where c_i bounds the second
+        # derivative of the loss. lambda_max comes from power iterations,
+        # falling back to the squared Frobenius norm of A_i (an upper bound).
+        # Returns None if the loss has no curvature bound.
+        if psObj.loss.curvatureBound is None:
+            print("Warning: the loss has no curvature bound, so Lipschitz constants")
+            print("cannot be estimated. Keeping the initial stepsize")
+            return None
+
+        rng = default_rng(0)
+        L = zeros(psObj.nDataBlocks)
+        for block in range(psObj.nDataBlocks):
+            thisSlice = psObj.partition[block]
+            A = psObj.A[thisSlice]
+            v = rng.standard_normal(A.shape[1])
+            v /= norm(v)
+            lam = 0.0
+            for _ in range(LossProcessor.lipschitzPowerIters):
+                u = A.T.dot(A.dot(v))
+                lamOld = lam
+                lam = norm(u)
+                if lam == 0:
+                    break
+                v = u/lam
+                # a fixed small number of iterations can badly underestimate
+                # lambda_max when the start has little weight on its eigenvector
+                if abs(lam - lamOld) <= LossProcessor.lipschitzPowerTol*lam:
+                    break
+            if not (lam > 0 and isfinite(lam)):
+                if issparse(A):
+                    lam = A.multiply(A).sum()
+                elif isinstance(A,ut.ObservationMatrix):
+                    # available if the operator provides its row norms
+                    normSq = A.squaredNorm()
+                    if normSq is not None:
+                        lam = normSq
+                else:
+                    lam = (A**2).sum()
+            L[block] = psObj.loss.curvatureBound(psObj.yresponse[thisSlice])*lam/psObj.nrowsOfA
+        return L
+
+    def _passesErrCheck(self,psObj,x,t,block,gradfx):
+        # relative error criterion of Eck17, CE18, for1 for approximate
+        # backward steps. Uses self.step and self.sigma.
+        w = psObj.wdata[block]
+        e = x + self.step * gradfx - t
+        err1 = e.T.dot(psObj.Hz - x) + self.sigma * norm(psObj.Hz - x) ** 2
+        if err1 >= 0:
+            err2 = e.T.dot(gradfx - w) \
+                   - self.step * norm(gradfx - w)
+            if err2 <= 0:
+                return True
+        return False
+
     def getStep(self):
         '''
         Return the stepsize in use with this loss processor.
@@ -78,6 +182,25 @@ class LossProcessor(object):
         #  psObj.xdata[block] and psObj.ydata[block]
         pass
 
+    def repartition(self,psObj):
+        # runs instead of initialize when the blocks hold other rows than in
+        # the previous run but the iterates are kept, as in
+        # ProjSplitFit.runCoarseToFine. Loss processors should rebuild any
+        # data depending on the rows of the blocks, and may keep what they
+        # have learned, such as stepsizes.
+        self.initialize(psObj)
+
+    def getColumnState(self):
+        # with several responses, returns the list of auxiliary arrays having
+        # one column (last axis) per response, so that ProjSplitFit can drop
+        # the columns of converged responses. Loss processors with no such
+        # arrays can leave this method and setColumnState as they are.
+        return []
+
+    def setColumnState(self,state):
+        # replaces the arrays returned by getColumnState, in the same order
+        pass
+
 
 #############
 class Forward2Fixed(LossProcessor):
@@ -99,7 +222,7 @@ class Forward2Fixed(LossProcessor):
     ``ProjSplitFit.addData``.
 
     '''
-    def __init__(self,step=1.0):
+    def __init__(self,step=1.0,autoStep=False):
         r'''
         Parameters
         ----------
@@ -111,10 +234,26 @@ class Forward2Fixed(LossProcessor):
             If this value is unknown or is infinite, use the
             ``Forward2Backtrack`` loss processor instead.
 
+        autoStep : :obj:`bool`, optional
+            If ``True``, estimate each :math:`L_i` before the first iteration
+            (by power iterations on :math:`A_i^\top A_i` and a bound on the
+            second derivative of the loss) and replace ``step`` by
+            :math:`0.9/\max_i L_i`. Only available for the
+            :math:`\ell_2^2` and logistic losses. Defaults to ``False``.
+
         '''
 
         self.step = ui.checkUserInput(step,float,'float','stepsize',default=1.0,low=0.0)
+        self.autoStep = ui.checkUserBool(autoStep,'autoStep')
         self.embedOK = True
+        self.multiResponseOK = True
+
+    def initialize(self,psObj):
+        if self.autoStep:
+            L = self._estimateLipschitz(psObj)
+            if (L is not None) and (L.max() > 0):
+                self.step = 0.9/L.max()
+                psObj.embedded.setStep(self.step)
 
     def update(self,psObj,block):
         thisSlice = psObj.partition[block]
@@ -151,7 +290,7 @@ class Forward2Backtrack(LossProcessor):
     '''
 
     def __init__(self,initialStep=1.0,Delta=1.0,backtrackFactor=0.7,
-                 growFactor=1.0,growFreq=None):
+                 growFactor=1.0,growFreq=None,trialBatch=1,autoStep=False):
         r'''
         Parameters
         ----------
@@ -177,9 +316,27 @@ class Forward2Backtrack(LossProcessor):
                 How often, in terms of iterations, to grow the stepsize,
                 defaults to ``None``, which means to never grow the stepsize. Must be
                 at least 1.
+
+            trialBatch : :obj:`int`, optional
+                Number of trial stepsizes evaluated at once. If larger than 1,
+                each round of backtracking evaluates the ladder
+                :math:`\rho,\rho\beta,\ldots,\rho\beta^{K-1}`, where
+                :math:`\beta` is ``backtrackFactor`` and :math:`K` is
+                ``trialBatch``, with a single matrix-matrix product, and
+                accepts the largest stepsize passing the termination test.
+                Defaults to 1, meaning one trial at a time.
+
+            autoStep : :obj:`bool`, optional
+                If ``True``, ignore ``initialStep`` and start each block
+                :math:`i` at :math:`1/(L_i+\Delta)`, where :math:`L_i` is an
+                estimate of the Lipschitz modulus of the gradient of the
+                block loss computed before the first iteration. Only
+                available for the :math:`\ell_2^2` and logistic losses.
+                Defaults to ``False``.
         '''
 
         self.embedOK = True
+        self.multiResponseOK = True
         self.step = ui.checkUserInput(initialStep,float,'float','stepsize',default=1.0,low=0.0)
         self.Delta = ui.checkUserInput(Delta,float,'float','Delta',default=1.0,low=0.0)
         self.decFactor = ui.checkUserInput(backtrackFactor,float,'float','backtrackFactor',default=0.7,low=0.0,high=1.0)
@@ -188,35 +345,293 @@ class Forward2Backtrack(LossProcessor):
             self.growFreq = None
         else:
             self.growFreq = ui.checkUserInput(growFreq,int,'int','growFreq',default=10,low = 0)
+        self.trialBatch = ui.checkUserInput(trialBatch,int,'int','trialBatch',default=1,low=1,lowAllowed=True)
+        self.autoStep = ui.checkUserBool(autoStep,'autoStep')
 
     def initialize(self,psObj):
 
         self.steps = ones(psObj.nDataBlocks) * self.step
+        if self.autoStep:
+            L = self._estimateLipschitz(psObj)
+            if L is not None:
+                # largest stepsize guaranteed to pass the termination condition
+                self.steps = 1.0/(L + self.Delta)
+
+    def repartition(self,psObj):
+        # nothing depends on the rows, keep the stepsizes found by backtracking
+        pass
 
     def update(self,psObj,block):
         thisSlice = psObj.partition[block]
-        gradHz = self._getAGrad(psObj,psObj.Hz,thisSlice)
+        AHz = psObj.A[thisSlice].dot(psObj.Hz)
+        gradHz = self._getGradFromPredictions(psObj,AHz,thisSlice)
         if self.growFreq is not None:
             if psObj.k % self.growFreq == 0:
                 # time to grow the stepsize
                 self.steps[block] *= self.growFactor
         psObj.embedded.setStep(self.steps[block])
+        self._backtrack(psObj,block,AHz,gradHz)
 
+    def _backtrack(self,psObj,block,AHz,gradHz):
+        # backtracking linesearch starting from self.steps[block].
+        # Sets xdata[block] and ydata[block] and returns the gradient at xdata[block]
+        if (self.trialBatch > 1) and (psObj.nResponses == 1):
+            # with several responses the products with A are already
+            # matrix-matrix products, so trials are made one at a time
+            return self._batchUpdate(psObj,block,gradHz)
+
+        thisSlice = psObj.partition[block]
+        # Without an embedded regularizer, the trial point Hz - rho*(gradHz - w)
+        # is affine in rho, so after the first rejected trial the predictions
+        # at later trials are formed from A*Hz and A*(gradHz - w) rather than
+        # by another product with A.
+        predictionsLinear = not psObj.embeddedRegInUse
+        Adirec = None
         while True:
             t = psObj.Hz - self.steps[block]*(gradHz - psObj.wdata[block])
             psObj.xdata[block][1:] = psObj.embedded.getProx(t[1:])
             psObj.xdata[block][0] = t[0]
             a = self.steps[block]**(-1)*(t-psObj.xdata[block])
-            gradx = self._getAGrad(psObj,psObj.xdata[block],thisSlice)
+            if Adirec is None:
+                yhat = psObj.A[thisSlice].dot(psObj.xdata[block])
+            else:
+                yhat = AHz - self.steps[block]*Adirec
+            gradx = self._getGradFromPredictions(psObj,yhat,thisSlice)
             psObj.ydata[block] = a + gradx
             lhs = psObj.Hz - psObj.xdata[block]
             rhs = psObj.ydata[block] - psObj.wdata[block]
-            if lhs.T.dot(rhs)>=self.Delta*norm(lhs,2)**2:
+            # with several responses the condition must hold for each of them
+            if (npsum(lhs*rhs,axis=0) >= self.Delta*npsum(lhs**2,axis=0)).all():
                 break
             else:
+                if predictionsLinear and (Adirec is None):
+                    Adirec = (AHz - yhat)/self.steps[block]
                 self.steps[block] *= self.decFactor
                 psObj.embedded.setStep(self.steps[block])
+        return gradx
+
+    def _batchUpdate(self,psObj,block,gradHz):
+        thisSlice = psObj.partition[block]
+        Hz = psObj.Hz[:,None]
+        w = psObj.wdata[block][:,None]
+        direc = (gradHz - psObj.wdata[block])[:,None]
+        ladder = self.decFactor**arange(self.trialBatch)
+        while True:
+            steps = self.steps[block]*ladder
+            T = Hz - direc*steps
+            X = self._proxColumns(psObj,T,steps)
+            G = self._getGradsFromPredictions(psObj,psObj.A[thisSlice].dot(X),thisSlice)
+            Y = (T - X)/steps + G
+            lhs = Hz - X
+            accepted = npsum(lhs*(Y - w),axis=0) >= self.Delta*npsum(lhs**2,axis=0)
+            if accepted.any():
+                j = accepted.argmax()
+                self.steps[block] = steps[j]
+                psObj.embedded.setStep(steps[j])
+                psObj.xdata[block] = X[:,j]
+                psObj.ydata[block] = Y[:,j]
+                return G[:,j]
+            self.steps[block] = steps[-1]*self.decFactor
+
+
+
+class Forward2BB(Forward2Backtrack):
+    r'''
+    Two forward steps with stepsizes chosen from secant (Barzilai-Borwein
+    type) curvature estimates, safeguarded by the backtracking linesearch of
+    ``Forward2Backtrack``.
 
+    The returned pair of vectors takes the same form as for
+    ``Forward2Backtrack``,
+
+    .. math::
+        x_i^k &= H z^k - \rho_{ik} (\nabla f_i(H z^k) - w_i^k) \\
+        y_i^k &= \nabla f_i(x_i^k).
+
+    Each update of block :math:`i` already evaluates the gradient at the two
+    points :math:`H z^k` and :math:`x_i^k`. With :math:`s = x_i^k - H z^k`,
+    these give the curvature estimate
+
+    .. math::
+        \kappa_{ik} = \frac{s^\top(\nabla f_i(x_i^k) - \nabla f_i(H z^k))}{\|s\|^2},
+
+    and the next trial stepsize for the block is
+
+    .. math::
+        \rho_{i,k+1} = \min\left\{\frac{0.9}{\kappa_{ik}+\Delta},\; g\rho_{ik}\right\},
+
+    where :math:`1/(\kappa_{ik}+\Delta)` is the largest stepsize passing the
+    linesearch termination condition of :cite:`for1` if the curvature is
+    unchanged, and :math:`g` is ``maxGrowFactor``. Backtracking is only performed if the
+    trial stepsize fails the termination condition, so no gradient
+    evaluations are spent on a fixed growth schedule.
+
+    Objects of this class may be used as the ``process`` argument to
+    ``ProjSplitFit.addData``.
+    '''
+
+    def __init__(self,initialStep=1.0,Delta=1.0,backtrackFactor=0.7,
+                 maxGrowFactor=1.5,trialBatch=1,autoStep=False):
+        r'''
+        Parameters
+        ----------
+            initialStep : :obj:`float`, optional
+                Initial trial choice of the stepsize :math:`\rho_{ik}`, defaulting to 1.0
+
+            Delta : :obj:`float`, optional
+                the parameter :math:`\Delta` in backtracking linesearch
+                termination condition of :cite:`for1`. Defaults to 1.0.
+
+            backtrackFactor : :obj:`float`, optional
+                How much to shrink the stepsize by at each iteration of backtracking.
+                Must be strictly between 0 and 1. Defaults to 0.7
+
+            maxGrowFactor : :obj:`float`, optional
+                Largest factor by which the stepsize of a block may grow from
+                one update to the next. Must be at least 1.0. Defaults to 1.5
+
+            trialBatch : :obj:`int`, optional
+                Number of trial stepsizes evaluated at once when backtracking,
+                as in ``Forward2Backtrack``. Defaults to 1.
+
+            autoStep : :obj:`bool`, optional
+                If ``True``, estimate the initial stepsize of each block from its
+                Lipschitz modulus, as in ``Forward2Backtrack``. Defaults to ``False``.
+        '''
+        Forward2Backtrack.__init__(self,initialStep,Delta,backtrackFactor,
+                                   trialBatch=trialBatch,autoStep=autoStep)
+        self.multiResponseOK = False
+        self.maxGrowFactor = ui.checkUserInput(maxGrowFactor,float,'float','maxGrowFactor',
+                                               default=1.5,low=1.0,lowAllowed=True)
+
+    def update(self,psObj,block):
+        thisSlice = psObj.partition[block]
+        AHz = psObj.A[thisSlice].dot(psObj.Hz)
+        gradHz = self._getGradFromPredictions(psObj,AHz,thisSlice)
+        psObj.embedded.setStep(self.steps[block])
+        gradx = self._backtrack(psObj,block,AHz,gradHz)
+
+        # secant step for the next update of this block
+        s = psObj.xdata[block] - psObj.Hz
+        normsSq = s.T.dot(s)
+        if normsSq > 0:
+            kappa = max(s.T.dot(gradx - gradHz)/normsSq,0.0)
+            self.steps[block] = min(0.9/(kappa + self.Delta),self.maxGrowFactor*self.steps[block])
+
+
+class Forward2Stochastic(LossProcessor):
+    r'''
+    Two forward steps with a fixed stepsize, in which the block gradients are
+    estimated from a random minibatch of the block's rows. This is intended
+    for blocks holding very many rows, where exact block gradients are
+    expensive.
+
+    The returned vectors take the form
+
+    .. math::
+        x_i^k &= H z^k - \rho (g_i(H z^k) - w_i^k) \\
+        y_i^k &= g_i(x_i^k)
+
+    where :math:`g_i` is a SAGA-type variance-reduced estimate of
+    :math:`\nabla f_i`.  For each row :math:`j` of block :math:`i`, the
+    derivative :math:`\ell'_j` of the loss at the last point where row
+    :math:`j` was sampled is stored (one scalar per row), along with
+    :math:`\bar g_i = \frac{1}{n}\sum_{j\in\text{block }i}\ell'_j a_j`.
+    Given a minibatch :math:`B` of the block's rows, the estimate at
+    :math:`t` is
+
+    .. math::
+        g_i(t) = \bar g_i + \frac{n_i}{|B|}\frac{1}{n}\sum_{j\in B}
+                 \big(\ell'(a_j^\top t,r_j) - \ell'_j\big)a_j
+
+    where :math:`n_i` is the number of rows in block :math:`i`, after which
+    the stored derivatives of the rows in :math:`B` and :math:`\bar g_i` are
+    refreshed. The estimates are unbiased and their variance vanishes as the
+    iterates converge. Each update touches only :math:`2|B|` rows of the
+    block, plus one full pass over the data before the first iteration.
+
+    Objects of this class may be used as the ``process`` argument to
+    ``ProjSplitFit.addData``.
+    '''
+    def __init__(self,step=1.0,batchSize=100,autoStep=False,seed=None):
+        r'''
+        Parameters
+        ----------
+        step : :obj:`float`, optional
+            the stepsize :math:`\rho`, defaulting to 1.0.  Should be positive
+            and less than :math:`1/L_i`, as for ``Forward2Fixed``.
+
+        batchSize : :obj:`int`, optional
+            number of rows sampled from the block for each gradient estimate.
+            Blocks with fewer rows use all of their rows. Defaults to 100.
+            Must be at least 1.
+
+        autoStep : :obj:`bool`, optional
+            If ``True``, replace ``step`` by an estimate computed from the
+            Lipschitz moduli of the block gradients, as for ``Forward2Fixed``.
+            Defaults to ``False``.
+
+        seed : :obj:`int`, optional
+            Seed of the minibatch sampling, which restarts from it on every
+            call to ``ProjSplitFit.run`` that starts from zero. Defaults to
+            ``None``. The global NumPy random state is not used.
+        '''
+        self.step = ui.checkUserInput(step,float,'float','stepsize',default=1.0,low=0.0)
+        self.batchSize = ui.checkUserInput(batchSize,int,'int','batchSize',default=100,low=1,lowAllowed=True)
+        self.autoStep = ui.checkUserBool(autoStep,'autoStep')
+        self.seed = seed
+        self.embedOK = True
+
+    def initialize(self,psObj):
+        if self.autoStep:
+            L = self._estimateLipschitz(psObj)
+            if (L is not None) and (L.max() > 0):
+                self.step = 0.9/L.max()
+                psObj.embedded.setStep(self.step)
+
+        self.rng = default_rng(self.seed)
+        # stored loss derivative of every row, and their weighted sum per block
+        self.rowDerivs = []
+        self.gradTable = zeros((psObj.nDataBlocks,psObj.nDataBlockVars))
+        self.rowIndices = []
+        for block in range(psObj.nDataBlocks):
+            thisSlice = psObj.partition[block]
+            A = psObj.A[thisSlice]
+            if not psObj.sparseObservationMtx:
+                # absolute row numbers, so minibatches can be sliced straight out of A
+                self.rowIndices.append(array(thisSlice))
+            derivs = psObj.loss.derivative(A.dot(psObj.xdata[block]),psObj.yresponse[thisSlice])
+            self.rowDerivs.append(derivs)
+            self.gradTable[block] = (1.0/psObj.nrowsOfA)*A.T.dot(derivs)
+
+    def _estimateGrad(self,psObj,point,block):
+        thisSlice = psObj.partition[block]
+        nBlockRows = len(self.rowDerivs[block])
+        batch = npsort(self.rng.choice(nBlockRows,min(self.batchSize,nBlockRows),replace=False))
+        if psObj.sparseObservationMtx:
+            Ab = psObj.A[thisSlice][batch]
+            yb = psObj.yresponse[thisSlice][batch]
+        else:
+            rows = self.rowIndices[block][batch]
+            Ab = psObj.A[rows]
+            yb = psObj.yresponse[rows]
+
+        derivs = psObj.loss.derivative(Ab.dot(point),yb)
+        delta = (1.0/psObj.nrowsOfA)*Ab.T.dot(derivs - self.rowDerivs[block][batch])
+        grad = self.gradTable[block] + (nBlockRows/len(batch))*delta
+
+        self.gradTable[block] += delta
+        self.rowDerivs[block][batch] = derivs
+        return grad
+
+    def update(self,psObj,block):
+        gradHz = self._estimateGrad(psObj,psObj.Hz,block)
+        t = psObj.Hz - self.step*(gradHz - psObj.wdata[block])
+        psObj.xdata[block][1:] = psObj.embedded.getProx(t[1:])
+        psObj.xdata[block][0] = t[0]
+        a = self.step**(-1)*(t-psObj.xdata[block])
+        gradx = self._estimateGrad(psObj,psObj.xdata[block],block)
+        psObj.ydata[block] = a + gradx
 
 
 class Forward2Affine(LossProcessor):
@@ -286,7 +701,7 @@ class  Forward1Fixed(LossProcessor):
     the case that ``blocksPerIteration`` is smaller than ``nBlocks``, although
     it is suspected that it does indeed converge in this case.
     '''
-    def __init__(self,stepsize=1.0, blendFactor=0.1):
+    def __init__(self,stepsize=1.0, blendFactor=0.1, autoStep=False):
         r'''
         Parameters
         ----------
@@ -304,15 +719,35 @@ class  Forward1Fixed(LossProcessor):
                 The averaging parameter :math:`\alpha` in one-forward-step
                 calculations above. Defaults to 0.1. Must be strictly between
                 0 and 1.
+
+            autoStep : :obj:`bool`, optional
+                If ``True``, estimate each :math:`L_i` before the first
+                iteration and replace ``stepsize`` by
+                :math:`1.8(1-\alpha)/\max_i L_i`. Only available for the
+                :math:`\ell_2^2` and logistic losses. Defaults to ``False``.
         '''
         self.step = ui.checkUserInput(stepsize,float,'float','stepsize',default=1.0,low=0.0)
         self.alpha = ui.checkUserInput(blendFactor,float,'float','blendFactor',default=0.1,low=0.0,high=1.0)
+        self.autoStep = ui.checkUserBool(autoStep,'autoStep')
         self.embedOK = True
+        self.multiResponseOK = True
+
+    def getColumnState(self):
+        return [self.gradxdata]
+
+    def setColumnState(self,state):
+        (self.gradxdata,) = state
 
     def initialize(self,psObj):
         # this routine is used by Forward1Fixed
         # to initialize the gradients of xdata
 
+        if self.autoStep:
+            L = self._estimateLipschitz(psObj)
+            if (L is not None) and (L.max() > 0):
+                self.step = 1.8*(1-self.alpha)/L.max()
+                psObj.embedded.setStep(self.step)
+
         self.gradxdata = zeros(psObj.xdata.shape)
         # gradxdata will store the gradient of the loss for each xdata[block]
 
@@ -360,7 +795,7 @@ class Forward1Backtrack(LossProcessor):
 
     '''
     def __init__(self,initialStep=1.0, blendFactor=0.1,backTrackFactor = 0.7,
-                 growFactor = 1.0, growFreq = None):
+                 growFactor = 1.0, growFreq = None, trialBatch = 1, autoStep = False):
         r'''
 
         Parameters
@@ -385,6 +820,21 @@ class Forward1Backtrack(LossProcessor):
                 defaults to ``None``, which means to never grow the stepsize.
                 Must be at least 1.
 
+            trialBatch : :obj:`int`, optional
+                Number of trial stepsizes evaluated at once. If larger than 1,
+                each round of backtracking evaluates a geometric ladder of
+                ``trialBatch`` stepsizes with a single matrix-matrix product,
+                and accepts the largest stepsize passing the termination test.
+                Defaults to 1, meaning one trial at a time.
+
+            autoStep : :obj:`bool`, optional
+                If ``True``, ignore ``initialStep`` and start each block
+                :math:`i` at :math:`2(1-\alpha)/L_i`, where :math:`L_i` is an
+                estimate of the Lipschitz modulus of the gradient of the
+                block loss computed before the first iteration. Only
+                available for the :math:`\ell_2^2` and logistic losses.
+                Defaults to ``False``.
+
         '''
         self.embedOK = True
         self.step = ui.checkUserInput(initialStep,float,'float','initialStep',default=1.0,low=0.0)
@@ -397,6 +847,8 @@ class Forward1Backtrack(LossProcessor):
         else:
             self.growFreq = ui.checkUserInput(growFreq,int,'int','growFreq',default=10,low = 0)
 
+        self.trialBatch = ui.checkUserInput(trialBatch,int,'int','trialBatch',default=1,low=1,lowAllowed=True)
+        self.autoStep = ui.checkUserBool(autoStep,'autoStep')
         self.eta = float('inf')
 
     def initialize(self,psObj):
@@ -404,6 +856,10 @@ class Forward1Backtrack(LossProcessor):
         #to initialize the gradients of xdata, \hat{theta}, \hat{w}, xdata, and ydata, and the stepsizes for each block
 
         self.steps = ones(psObj.nDataBlocks)*self.step
+        if self.autoStep:
+            L = self._estimateLipschitz(psObj)
+            if L is not None:
+                self.steps[L > 0] = 2.0*(1-self.alpha)/L[L > 0]
         self.thetahat = zeros(psObj.xdata.shape)
         self.what = zeros(psObj.xdata.shape)
         self.gradxdata = zeros(psObj.xdata.shape)
@@ -418,6 +874,12 @@ class Forward1Backtrack(LossProcessor):
         psObj.xdata = self.thetahat
         psObj.ydata = self.what
 
+    def repartition(self,psObj):
+        # restart the block points on the new rows, keeping the stepsizes
+        steps = self.steps
+        self.initialize(psObj)
+        self.steps = steps
+
     def update(self,psObj,block):
 
         if self.growFreq is not None:
@@ -440,12 +902,27 @@ class Forward1Backtrack(LossProcessor):
         t1 = (1-self.alpha)*xold +self.alpha*psObj.Hz
         t2 = npcopy(self.gradxdata[block])
         t2 -= psObj.wdata[block]
+
+        if self.trialBatch > 1:
+            self._batchUpdate(psObj,block,phi,xold,yold,t1,t2)
+            return
+
+        # Without an embedded regularizer, the trial point t1 - rho*t2 is
+        # affine in rho, so after the first rejected trial the predictions at
+        # later trials are formed from A*t1 and A*t2.
+        predictionsLinear = not psObj.embeddedRegInUse
+        At1 = None
+        At2 = None
         while True:
             t = t1 - self.steps[block]*t2
             psObj.xdata[block][1:] = psObj.embedded.getProx(t[1:])
             psObj.xdata[block][0] = t[0]
 
-            self.gradxdata[block] = self._getAGrad(psObj,psObj.xdata[block],thisSlice)
+            if At2 is None:
+                Ax = psObj.A[thisSlice].dot(psObj.xdata[block])
+            else:
+                Ax = At1 - self.steps[block]*At2
+            self.gradxdata[block] = self._getGradFromPredictions(psObj,Ax,thisSlice)
             psObj.ydata[block] = self.steps[block]**(-1)*(t-psObj.xdata[block])+self.gradxdata[block]
 
             yhat = self.steps[block]**(-1)*( (1-self.alpha)*xold +self.alpha*psObj.Hz - psObj.xdata[block] )\
@@ -468,9 +945,53 @@ class Forward1Backtrack(LossProcessor):
                     self.eta = numer/denom
                     break
 
+            if predictionsLinear and (At2 is None):
+                At2 = psObj.A[thisSlice].dot(t2)
+                At1 = Ax + self.steps[block]*At2
             self.steps[block] *= self.delta
             psObj.embedded.setStep(self.steps[block])
 
+    def _batchUpdate(self,psObj,block,phi,xold,yold,t1,t2):
+        thisSlice = psObj.partition[block]
+        Hz = psObj.Hz[:,None]
+        w = psObj.wdata[block]
+        thetahat = self.thetahat[block]
+        ladder = self.delta**arange(self.trialBatch)
+
+        # parts of the termination test which do not depend on the stepsize
+        rhs1Fixed = (1-self.alpha)*norm(xold - thetahat,2) + self.alpha*norm(psObj.Hz - thetahat,2)
+        normwDiff = norm(w - self.what[block],2)
+        normyoldSq = norm(yold - w,2)**2
+        w = w[:,None]
+        while True:
+            steps = self.steps[block]*ladder
+            T = t1[:,None] - t2[:,None]*steps
+            X = self._proxColumns(psObj,T,steps)
+            G = self._getGradsFromPredictions(psObj,psObj.A[thisSlice].dot(X),thisSlice)
+            Y = (T - X)/steps + G
+            yhat = (t1[:,None] - X)/steps + w
+            phiPlus = npsum((Hz - X)*(Y - w),axis=0)
+
+            lhs1 = norm(X - thetahat[:,None],2,axis=0)
+            rhs1 = rhs1Fixed + steps*normwDiff
+            numer = npsum((yhat - w)**2,axis=0)
+            denom = npsum((Y - w)**2,axis=0)
+            rhs2_1 = 0.5*(steps/self.alpha)*(denom + self.alpha*numer)
+            rhs2_2 = (1-self.alpha)*(phi - 0.5*(steps/self.alpha)*normyoldSq)
+
+            accepted = (lhs1 <= rhs1) & (phiPlus >= rhs2_1 + rhs2_2)
+            if accepted.any():
+                #backtracking termination criteria satisfied
+                j = accepted.argmax()
+                self.steps[block] = steps[j]
+                psObj.embedded.setStep(steps[j])
+                psObj.xdata[block] = X[:,j]
+                psObj.ydata[block] = Y[:,j]
+                self.gradxdata[block] = G[:,j]
+                self.eta = numer[j]/denom[j]
+                break
+            self.steps[block] = steps[-1]*self.delta
+
 
 
 ############# Back step (proximal) based loss processors ###############################
@@ -516,6 +1037,8 @@ class BackwardExact(LossProcessor):
 
         self.embedOK = False
         self.pMustBe2 = True
+        self.needsMatrix = True
+        self.multiResponseOK = True
 
         self.step = ui.checkUserInput(stepsize,float,'float','stepsize',default=1.0,low=0.0)
 
@@ -524,13 +1047,27 @@ class BackwardExact(LossProcessor):
                                  # which needs to update precomputed inverses whenever
                                  # the stepsize is changed.
 
+        # optional dict of precomputed inverses shared between problems with
+        # blocks in common, set by ProjSplitFit.crossValidate
+        self.factorCache = None
+
+    def getColumnState(self):
+        return list(self.Aty)
+
+    def setColumnState(self,state):
+        self.Aty = list(state)
+
 
     def initialize(self,psObj):
-        block_len = len(psObj.partition[0])
         # block length is the number of observations in each block
         # we only check the len of the first block because our createApartition()
-        # function guarantees that all blocks are within 1 of the same block_len
-        if block_len < psObj.ncolsOfA//2:
+        # function guarantees that all blocks are within 1 of the same block_len.
+        # Sparse observations are held as a list of blocks.
+        if psObj.sparseObservationMtx:
+            block_len = psObj.A[psObj.partition[0]].shape[0]
+        else:
+            block_len = len(psObj.partition[0])
+        if block_len < (psObj.nDataBlockVars - 1)//2:
             # wide matrices, use the matrix inversion lemma
             self.matInvLemma = True
 
@@ -542,22 +1079,37 @@ class BackwardExact(LossProcessor):
             thisSlice = psObj.partition[block]
             self.Aty.append(psObj.A[thisSlice].T.dot(psObj.yresponse[thisSlice]))
 
+        self.matInv = []
+        for block in range(psObj.nDataBlocks):
+            thisSlice = psObj.partition[block]
+            self.matInv.append(self._blockInverse(psObj,block))
+
+    def _blockInverse(self,psObj,block):
+        # The inverse only depends on the rows of the block and on
+        # step/nrowsOfA, so problems sharing blocks of the same matrix
+        # (the folds of a cross-validation) may share it. The cache is keyed
+        # by the rows of the block in that matrix, psObj.rowBlocks[block],
+        # since with sparse observations psObj.partition only numbers the
+        # blocks of each problem.
+        thisSlice = psObj.partition[block]
+        key = None
+        if (self.factorCache is not None) and (psObj.rowBlocks is not None):
+            rows = psObj.rowBlocks[block]
+            key = (rows.start,rows.stop,self.step/psObj.nrowsOfA,self.matInvLemma)
+            if key in self.factorCache:
+                return self.factorCache[key]
+
         if self.matInvLemma == False:
-            self.matInv = []
-            for block in range(psObj.nDataBlocks):
-                thisSlice = psObj.partition[block]
-                mat2inv = (self.step/psObj.nrowsOfA)*psObj.A[thisSlice].T.dot(psObj.A[thisSlice])
-                (d,_) = mat2inv.shape
-                mat2inv += identity(d)
-                self.matInv.append(npinv(mat2inv))
+            mat2inv = (self.step/psObj.nrowsOfA)*psObj.A[thisSlice].T.dot(psObj.A[thisSlice])
         else:
-            self.matInv = []
-            for block in range(psObj.nDataBlocks):
-                thisSlice = psObj.partition[block]
-                mat2inv = (self.step/psObj.nrowsOfA)*psObj.A[thisSlice].dot(psObj.A[thisSlice].T)
-                (n,_) = mat2inv.shape
-                mat2inv += identity(n)
-                self.matInv.append(npinv(mat2inv))
+            mat2inv = (self.step/psObj.nrowsOfA)*psObj.A[thisSlice].dot(psObj.A[thisSlice].T)
+        (n,_) = mat2inv.shape
+        mat2inv += identity(n)
+        matInv = npinv(mat2inv)
+
+        if key is not None:
+            self.factorCache[key] = matInv
+        return matInv
 
 
     def update(self,psObj,block):
@@ -720,6 +1272,162 @@ class BackwardCG(LossProcessor):
         psObj.ydata[block] = gradfx
 
 
+class BackwardNewtonCG(LossProcessor):
+    r'''
+    Approximate backward step computed by a Hessian-free (truncated) Newton
+    method. Applicable to any loss with a second derivative, such as the
+    logistic loss and the :math:`\ell_p^p` losses with :math:`p\geq 2`.
+
+    Updates are of the form
+
+    .. math::
+        x_i^k &= \text{prox}_{\rho f_i}( H z^k +\rho w_i^k) \\
+        y_i^k &= \rho^{-1}(H z^k + \rho w_i^k - x_i^k)
+
+    where
+
+    .. math::
+        f_i(t) = \frac{1}{n}\sum_{j\in\text{block }i}\ell (t_0 + a_j^T t,r_j).
+
+    Each Newton direction is found by running the conjugate gradient method on
+    the Newton equations, using Hessian-vector products of the form
+    :math:`v + (\rho/n)A_i^\top D A_i v`, where :math:`D` is the diagonal
+    matrix of second derivatives of the loss at the current predictions.
+    The stepsize along each Newton direction is chosen by a safeguarded
+    one-dimensional Newton method, which only involves the already computed
+    products :math:`A_i x` and :math:`A_i p`.
+
+    Newton iterations are continued until the relative error criteria
+    specified in :cite:`Eck17,CE18,for1` are met, or the maximum number of
+    iterations is reached.  Convergence is not guaranteed when the maximum
+    number of Newton iterations is reached in more than a finite number of
+    projective splitting iterations.
+
+    Objects of this class may be used as the ``process`` argument to
+    ``ProjSplitFit.addData``.
+    '''
+
+    def __init__(self,relativeErrorFactor=0.9,stepsize=1.0,maxIter=100,maxCGIter=20):
+        r'''
+        Parameters
+        ----------
+            relativeErrorFactor : :obj:`float`, optional
+                :math:`\sigma`, relative error factor. Must be in [0,1). Defaults to 0.9
+
+            stepsize : :obj:`float`, optional
+                stepsize :math:`\rho`, defaults to 1.0
+
+            maxIter : :obj:`int`, optional
+                Maximum number of Newton iterations. Defaults to 100.
+                Must be at least 1.
+
+            maxCGIter : :obj:`int`, optional
+                Maximum number of conjugate gradient iterations used to compute
+                each Newton direction. Defaults to 20. Must be at least 1.
+        '''
+        self.embedOK = False
+        self.needsCurvature = True
+
+        self.step = ui.checkUserInput(stepsize,float,'float','stepsize',default=1.0,low=0.0)
+        self.sigma = ui.checkUserInput(relativeErrorFactor,float,'float',
+                                       'relativeErrorFactor',default=0.9,low=0.0,high=1.0,lowAllowed=True)
+        self.maxIter = ui.checkUserInput(maxIter,int,'int','maxIter',default=100,low=0)
+        self.maxCGIter = ui.checkUserInput(maxCGIter,int,'int','maxCGIter',default=20,low=0)
+        self.lineSearchIter = 20
+        self.lineSearchTol = 0.1
+
+    @staticmethod
+    def _newtonDirection(A,D,g,maxCGIter):
+        # conjugate gradient on (I + A^T D A) p = -g, started from p = 0 and
+        # stopped with the forcing term min(0.5,sqrt(|g|))|g|
+        normg = norm(g)
+        tol = (min(0.5,sqrt(normg))*normg)**2
+        p = zeros(len(g))
+        r = -g
+        direc = npcopy(r)
+        rTr = r.T.dot(r)
+        for _ in range(maxCGIter):
+            Hd = direc + A.T.dot(D*A.dot(direc))
+            denom = direc.T.dot(Hd)
+            if denom <= 0:
+                break
+            alpha = rTr/denom
+            p += alpha*direc
+            r -= alpha*Hd
+            rTrPlus = r.T.dot(r)
+            if rTrPlus <= tol:
+                break
+            direc = r + (rTrPlus/rTr)*direc
+            rTr = rTrPlus
+        return p
+
+    def _lineSearch(self,psObj,Ax,Ap,yresp,pxt,pp,scale,dphi0):
+        # Safeguarded Newton method on the derivative of the convex function
+        # phi(a) = Fprox(x + a*p), started from the full Newton step a = 1.
+        # Both derivatives of phi only need the predictions Ax + a*Ap.
+        lo = 0.0
+        hi = float('inf')
+        alpha = 1.0
+        for _ in range(self.lineSearchIter):
+            pred = Ax + alpha*Ap
+            dphi = scale*Ap.T.dot(psObj.loss.derivative(pred,yresp)) + pxt + alpha*pp
+            if abs(dphi) <= self.lineSearchTol*abs(dphi0):
+                return alpha
+            if dphi < 0:
+                lo = alpha
+            else:
+                hi = alpha
+            d2phi = scale*(Ap**2).T.dot(psObj.loss.secondDerivative(pred,yresp)) + pp
+            alphaNew = alpha - dphi/d2phi
+            if (alphaNew <= lo) or (alphaNew >= hi):
+                if hi < float('inf'):
+                    alphaNew = 0.5*(lo+hi)
+                else:
+                    alphaNew = 2.0*alpha
+            alpha = alphaNew
+
+        if lo > 0:
+            return lo
+        return alpha
+
+    def update(self,psObj,block):
+
+        thisSlice = psObj.partition[block]
+        A = psObj.A[thisSlice]
+        yresp = psObj.yresponse[thisSlice]
+        scale = self.step/psObj.nrowsOfA
+
+        t = psObj.Hz + self.step*psObj.wdata[block]
+        x = npcopy(psObj.xdata[block])
+        Ax = A.dot(x)
+
+        i = 0
+        while True:
+            #gradfx is gradient w.r.t. the loss slice.
+            gradfx = (1.0/psObj.nrowsOfA)*A.T.dot(psObj.loss.derivative(Ax,yresp))
+            if i >= self.maxIter:
+                break
+            if (i > 0) and self._passesErrCheck(psObj,x,t,block,gradfx):
+                break
+
+            g = self.step*gradfx + x - t
+            D = scale*psObj.loss.secondDerivative(Ax,yresp)
+            p = self._newtonDirection(A,D,g,self.maxCGIter)
+            dphi0 = g.T.dot(p)
+            if dphi0 >= 0:
+                # the prox subproblem is already solved to machine precision
+                break
+
+            Ap = A.dot(p)
+            alpha = self._lineSearch(psObj,Ax,Ap,yresp,p.T.dot(x - t),p.T.dot(p),scale,dphi0)
+            x += alpha*p
+            Ax += alpha*Ap
+            i += 1
+
+        psObj.xdata[block] = x
+        psObj.ydata[block] = gradfx
+
+
 class BackwardLBFGS(LossProcessor):
     r'''
     Approximate backward step computed by the limited-memory BFGS (L-BFGS) method.
@@ -742,6 +1450,12 @@ class BackwardLBFGS(LossProcessor):
     iterations is reached in more than a finite number of projective
     splitting iterations.
 
+    The curvature of the prox subproblem does not depend on :math:`H z^k` or
+    :math:`w_i^k`, so the L-BFGS memory of each block is kept between
+    projective splitting iterations and each prox computation is warm-started
+    with the curvature information gathered in previous ones. The memory is
+    cleared whenever the stepsize :math:`\rho` is changed.
+
     Objects of this class may be used as the ``process`` argument to
     ``ProjSplitFit.addData``.
 
@@ -759,8 +1473,8 @@ class BackwardLBFGS(LossProcessor):
                 :math:`\sigma`, relative error factor. Must be in [0,1). Defaults to 0.9
 
             memory : :obj:`int`, optional
-                how many iterations of memory are held by L-BFGS. Defaults to 10.
-                Must be at least 1.
+                how many iterations of memory are held by L-BFGS for each block.
+                Defaults to 10. Must be at least 1.
 
             c1 : :obj:`float`, optional
                 the :math:`c_1` parameter in the Wolfe linesearch used by L-BFGS.
@@ -809,78 +1523,125 @@ class BackwardLBFGS(LossProcessor):
         self.maxiter = ui.checkUserInput(maxiter,int,'int','maxiter',default=100,low=0)
         self.lineSearchIter = ui.checkUserInput(lineSearchIter,int,'int','maxiter',default=20,low=0)
 
+        self.stepChanged = False # set by setStep, which invalidates the stored curvature pairs
+
+
+    def _proxValueAndDerivs(self,psObj,Ax,x,thisSlice,t):
+        # value of the prox subproblem objective at x, given Ax = A[thisSlice] x,
+        # together with the loss derivatives at the predictions Ax. Both come
+        # from a single call to the fused loss kernel.
+        vals,derivs = psObj.loss.valueAndDerivative(Ax,psObj.yresponse[thisSlice])
+        f = (self.step/psObj.nrowsOfA)*npsum(vals) + 0.5*norm(t - x,2)**2
+        return f,derivs
+
+    def _proxGrad(self,psObj,derivs,x,thisSlice,t):
+        # gradient of the prox subproblem objective from the loss derivatives
+        return (self.step/psObj.nrowsOfA)*psObj.A[thisSlice].T.dot(derivs) + x - t
+
+    def initialize(self,psObj):
+        # The Hessian of the prox subproblem objective is
+        # step*Hess(f_i) + I, which does not depend on the prox center t.
+        # Curvature pairs gathered while solving one prox subproblem therefore
+        # remain valid for the next one, so each block keeps a ring buffer of
+        # the most recent (s,y) pairs which persists across outer iterations.
+        d = psObj.nDataBlockVars
+        self.S = zeros((psObj.nDataBlocks,self.m,d))
+        self.Y = zeros((psObj.nDataBlocks,self.m,d))
+        self.rho = zeros((psObj.nDataBlocks,self.m))
+        self.alpha = zeros(self.m)
+        self.memHead = zeros(psObj.nDataBlocks,dtype=int)   # next slot to overwrite
+        self.memCount = zeros(psObj.nDataBlocks,dtype=int)  # number of valid pairs
+        self.stepChanged = False
 
-    def Fprox(self,psObj,x,thisSlice,t):
-        Ax = psObj.A[thisSlice].dot(x)
-        f = (self.step/psObj.nrowsOfA)\
-            *sum(psObj.loss.value(Ax,psObj.yresponse[thisSlice]))
-        f += 0.5*norm(t - x,2)**2
-        return f
+    def setStep(self,step):
+        self.step = step
+        # stored curvature pairs depend on the stepsize
+        self.stepChanged = True
 
-    def gradprox(self,psObj,x,thisSlice,t):
-        return self.step*self._getAGrad(psObj,x,thisSlice) + x - t
+    def _clearMemory(self):
+        self.memHead[:] = 0
+        self.memCount[:] = 0
+
+    def _storePair(self,block,s,y):
+        ys = y.T.dot(s)
+        if ys <= 0:
+            # pair violates the curvature condition; keep the memory positive definite
+            return
+        slot = self.memHead[block]
+        self.S[block,slot] = s
+        self.Y[block,slot] = y
+        self.rho[block,slot] = 1.0/ys
+        self.memHead[block] = (slot + 1) % self.m
+        if self.memCount[block] < self.m:
+            self.memCount[block] += 1
+
+    def _twoLoop(self,block,grad):
+        # L-BFGS two-loop recursion over the ring buffer of this block,
+        # newest pair first. Returns the approximate inverse Hessian times grad.
+        count = self.memCount[block]
+        if count == 0:
+            return grad
+
+        S = self.S[block]
+        Y = self.Y[block]
+        rho = self.rho[block]
+        alpha = self.alpha
+        newest = (self.memHead[block] - 1) % self.m
+        order = [(newest - j) % self.m for j in range(count)]
+
+        q = npcopy(grad)
+        for i in order:
+            alpha[i] = rho[i]*S[i].T.dot(q)
+            q -= alpha[i]*Y[i]
+
+        gamma = 1.0/(rho[newest]*Y[newest].T.dot(Y[newest]))
+        q *= gamma
+
+        for i in reversed(order):
+            beta = rho[i]*Y[i].T.dot(q)
+            q += (alpha[i] - beta)*S[i]
+        return q
 
     def update(self,psObj,block):
+        if self.stepChanged:
+            self._clearMemory()
+            self.stepChanged = False
+
         thisSlice = psObj.partition[block]
         t = psObj.Hz + self.step*psObj.wdata[block]
         x = psObj.xdata[block]
-        d = len(x)
-        Y = zeros([self.m,d])
-        S = zeros([self.m,d])
-        rho = zeros(self.m)
-        alpha = zeros(self.m)
-
 
-
-        grad = self.gradprox(psObj,x,thisSlice,t)
-        f = self.Fprox(psObj,x,thisSlice,t)
-        z = grad
+        A = psObj.A[thisSlice]
+        Ax = A.dot(x)
+        f,derivs = self._proxValueAndDerivs(psObj,Ax,x,thisSlice,t)
+        grad = self._proxGrad(psObj,derivs,x,thisSlice,t)
+        z = self._twoLoop(block,grad)
 
         k = 0
         while k < self.maxiter:
             p = -z
 
-            xnew,gradnew,fnew = self.wolfeLineSearch(psObj,x,p,grad,f,t,thisSlice)
+            xnew,Axnew,gradnew,fnew = self.wolfeLineSearch(psObj,x,Ax,A.dot(p),p,grad,f,t,thisSlice)
             gradfx = (gradnew - (xnew - t))/self.step
             k += 1
-            if self.passesErrCheck(psObj,xnew,t,block,gradfx) or (k>=self.maxiter):
-                x = xnew
-                break
 
-            snew = xnew - x
+            self._storePair(block,xnew - x,gradnew - grad)
             x = xnew
-            ynew = gradnew - grad
+            Ax = Axnew
+            if self._passesErrCheck(psObj,xnew,t,block,gradfx) or (k>=self.maxiter):
+                break
+
             grad = gradnew
             f = fnew
-
-            self.shift(Y,ynew)
-            self.shift(S,snew)
-
-            rhonew = 1.0/ynew.T.dot(snew)
-            self.shift(rho,rhonew)
-
-            q = grad
-            for i in range(self.m-1,-1,-1):
-                alpha[i] = rho[i]*S[i].T.dot(q)
-                q = q - alpha[i]*Y[i]
-
-            gamma = snew.T.dot(ynew)/(ynew.T.dot(ynew))
-            z = gamma*q
-
-            for i in range(self.m):
-                beta = rho[i]*Y[i].T.dot(z)
-                z = z + (alpha[i] - beta)*S[i]
+            z = self._twoLoop(block,grad)
 
         psObj.xdata[block] = x
         psObj.ydata[block] = gradfx
 
-    @staticmethod
-    def shift(vec,newel):
-        vec[0:-1] = vec[1:]
-        vec[-1] = newel
-
-    def wolfeLineSearch(self,psObj,x,p,grad,f,t,thisSlice):
-
+    def wolfeLineSearch(self,psObj,x,Ax,Ap,p,grad,f,t,thisSlice):
+        # Predictions are linear in the step, A(x + step*p) = Ax + step*Ap,
+        # so trial points cost no products with A. The gradient, which needs a
+        # product with A^T, is only formed once the Armijo condition holds.
         direcDeriv = grad.T.dot(p)
         step = 1.0
         stepNotFound = True
@@ -888,12 +1649,13 @@ class BackwardLBFGS(LossProcessor):
         gradNotComputed = True
         while stepNotFound:
             xTrial = x + step * p
-            fTrial = self.Fprox(psObj, xTrial, thisSlice, t)
+            AxTrial = Ax + step * Ap
+            fTrial,derivs = self._proxValueAndDerivs(psObj, AxTrial, xTrial, thisSlice, t)
 
             cond1 = fTrial - f - self.c1 * step * direcDeriv
             if cond1 <= 0:
                 gradNotComputed = False
-                gradTrial = self.gradprox(psObj, xTrial, thisSlice, t)
+                gradTrial = self._proxGrad(psObj, derivs, xTrial, thisSlice, t)
                 cond2 = gradTrial.T.dot(p) - self.c2 * direcDeriv
                 if cond2 >= 0:
                     stepNotFound = False
@@ -908,15 +1670,5 @@ class BackwardLBFGS(LossProcessor):
                 stepNotFound = False
 
         if gradNotComputed:
-            gradTrial = self.gradprox(psObj, xTrial, thisSlice, t)
-        return xTrial, gradTrial, fTrial
-
-    def passesErrCheck(self, psObj, x, t, block, gradfx):
-        w = psObj.wdata[block]
-        e = x + self.step * gradfx - t
-        err1 = e.T.dot(psObj.Hz - x) + self.sigma * norm(psObj.Hz - x) ** 2
-        if err1 >= 0:
-            err2 = e.T.dot(gradfx - w) \
-                   - self.step * norm(gradfx - w)
-            if err2 <= 0:
-                return True
+            gradTrial = self._proxGrad(psObj, derivs, xTrial, thisSlice, t)
+        return xTrial, AxTrial, gradTrial, fTrial
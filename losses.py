@@ -4,11 +4,14 @@ Created on Wed Jul  1 16:11:49 2020
 
 @author: pjohn
 """
-from numpy import log
 from numpy import exp
-from numpy import isinf
-from numpy import nan_to_num
+from numpy import log1p
+from numpy import logaddexp
+from numpy import maximum
+from numpy import where
 from numpy import ones
+from numpy import clip
+from scipy.special import expit
 
 
 #-----------------------------------------------------------------------------
@@ -21,15 +24,31 @@ class Loss(object):
 
     Used internally within the addRegularizer method.
 
+    Besides ``value`` and ``derivative``, a loss carries
+    ``valueAndDerivative``, returning both at once for callers that need
+    both (sharing the work between them where possible), and may carry
+    ``secondDerivative``, a function of the predictions and responses, and
+    ``curvatureBound``, a function of the responses returning an upper bound
+    on the second derivative. These are ``None`` when not available.
+
     '''
     def __init__(self,p):
 
         if(p == 'logistic'):
             self.value = lambda yhat,y: LR_loss(yhat,y)
             self.derivative = lambda yhat,y: LR_derivative(yhat,y)
+            self.valueAndDerivative = lambda yhat,y: LR_value_and_derivative(yhat,y)
+            self.secondDerivative = lambda yhat,y: LR_second_derivative(yhat,y)
+            self.curvatureBound = lambda y: 0.25*(y**2).max()
         elif(type(p) == LossPlugIn):
             self.value = p.value
             self.derivative = p.derivative
+            if p.valueAndDerivative is None:
+                self.valueAndDerivative = lambda yhat,y: (p.value(yhat,y),p.derivative(yhat,y))
+            else:
+                self.valueAndDerivative = p.valueAndDerivative
+            self.secondDerivative = p.secondDerivative
+            self.curvatureBound = p.curvatureBound
         else:
 
             try:
@@ -37,8 +56,20 @@ class Loss(object):
                     self.value = lambda yhat,y: (1.0/p)*abs(yhat-y)**p
                     if(p>1):
                         self.derivative = lambda yhat,y:  (2.0*(yhat>=y)-1.0)*abs(yhat-y)**(p-1)
+                        self.valueAndDerivative = lambda yhat,y: pnorm_value_and_derivative(yhat,y,p)
                     else:
                         self.derivative = None
+                        self.valueAndDerivative = None
+                    if(p>=2):
+                        self.secondDerivative = lambda yhat,y: (p-1.0)*abs(yhat-y)**(p-2)
+                    else:
+                        # the second derivative is unbounded near yhat=y
+                        self.secondDerivative = None
+                    if(p==2):
+                        self.curvatureBound = lambda y: 1.0
+                    else:
+                        # the second derivative is unbounded
+                        self.curvatureBound = None
                 elif(p<1):
                     raise Exception("Error, lossFunction p is not >= 1")
             except:
@@ -52,17 +83,30 @@ def LR_loss(yhat,y):
     return LR_loss_from_score(score)
 
 def LR_loss_from_score(score):
-    pos = log(1 + exp(score))
-    pos2 = (~isinf(pos))*nan_to_num(pos)
-    neg = score + log(1+exp(-score))
-    neg2 = (~isinf(neg)) * nan_to_num(neg)
-    coef = 0.5*ones(len(pos))
-    coef = coef+0.5*isinf(pos)+0.5*isinf(neg)
-    return coef*(pos2+neg2)
+    # log(1+exp(score)) without overflow
+    return logaddexp(0.0,score)
 
 def LR_derivative(yhat,y):
+    return -expit(-yhat*y)*y
+
+def LR_second_derivative(yhat,y):
+    sigma = expit(-yhat*y)
+    return sigma*(1.0-sigma)*y**2
+
+def LR_value_and_derivative(yhat,y):
+    # the value log(1+exp(score)) and the sigmoid of the score in the
+    # derivative share the single exponential exp(-|score|)
     score = -yhat*y
-    return -exp(score - LR_loss_from_score(score))*y
+    e = exp(-abs(score))
+    value = maximum(score,0.0) + log1p(e)
+    sigma = where(score >= 0,1.0,e)/(1.0 + e)
+    return value,-sigma*y
+
+def pnorm_value_and_derivative(yhat,y,p):
+    diff = yhat - y
+    absDiff = abs(diff)
+    absPow = absDiff**(p-1)
+    return (1.0/p)*absPow*absDiff,(2.0*(diff>=0)-1.0)*absPow
 
 
 class LossPlugIn(object):
@@ -76,10 +120,14 @@ class LossPlugIn(object):
     Other choices require creating a ``LossPlugIn`` object.  This in turn
     requires supplying a function to compute the derivative of the loss function.
     If you plan to compute objective function values, you must also supply a
-    function to compute the loss function value.
+    function to compute the loss function value. Ready-made ``LossPlugIn``
+    objects for the Huber, squared hinge, Poisson and quantile losses are
+    returned by the functions ``huber``, ``squaredHinge``, ``poisson`` and
+    ``quantile`` of this module.
     '''
 
-    def __init__(self,derivative,value=None):
+    def __init__(self,derivative,value=None,valueAndDerivative=None,
+                 secondDerivative=None,curvatureBound=None):
         r'''
         You need only supply a *value* function if you wish to compute
         objective function values (either with ``ProjSplitFit.getObjective``
@@ -105,6 +153,27 @@ class LossPlugIn(object):
             (for the response), the function should return :math:`\ell(q_i,r_i)`.
             Defaults to ``None``.  If the default is used, however, attempting to
             compute the objective value will raise an exception.
+
+        valueAndDerivative : :obj:`function`, optional
+            Function of the same two arrays as ``derivative``, returning the
+            pair ``(values, derivatives)`` of arrays computed by ``value`` and
+            ``derivative``. Loss processors which need both at the same points
+            call this function, so supplying it is worthwhile when the two
+            computations share expensive work. Defaults to ``None``, in which
+            case ``value`` and ``derivative`` are called separately.
+
+        secondDerivative : :obj:`function`, optional
+            Function of the same two arrays as ``derivative``, returning the
+            array of second partial derivatives with respect to the predicted
+            values. Required by loss processors which take Newton-type steps,
+            such as ``BackwardNewtonCG``. Defaults to ``None``.
+
+        curvatureBound : :obj:`function`, optional
+            Function of a 1D array of responses returning a ``float`` upper
+            bound on the second derivative of the loss over all predicted
+            values, that is, a Lipschitz constant for ``derivative``. Used by
+            loss processors created with ``autoStep=True`` to choose their
+            stepsizes. Defaults to ``None``.
         '''
 
         try:
@@ -115,10 +184,25 @@ class LossPlugIn(object):
             output = derivative(test,test)
             if len(output)!= 100:
                 raise Exception
+            if valueAndDerivative is not None:
+                vals,derivs = valueAndDerivative(test,test)
+                if (len(vals) != 100) or (len(derivs) != 100):
+                    raise Exception
+            if secondDerivative is not None:
+                output = secondDerivative(test,test)
+                if len(output) != 100:
+                    raise Exception
+            if curvatureBound is not None:
+                output = float(curvatureBound(test))
         except:
             print("Value should be a function of one array which outputs a float")
             print("derivative is a function of two arrays of the same shape which outputs an array")
             print("of the same shape")
+            print("valueAndDerivative (if not None) is a function of two arrays of the same shape")
+            print("which outputs a pair of arrays of the same shape")
+            print("secondDerivative (if not None) is a function of two arrays of the same shape")
+            print("which outputs an array of the same shape")
+            print("curvatureBound (if not None) is a function of one array which outputs a float")
             raise Exception("Value or derivative incorrect")
 
         if value is None:
@@ -127,3 +211,196 @@ class LossPlugIn(object):
             self.value = value
 
         self.derivative = derivative
+        self.valueAndDerivative = valueAndDerivative
+        self.secondDerivative = secondDerivative
+        self.curvatureBound = curvatureBound
+
+
+#-----------------------------------------------------------------------------
+# built-in losses
+#-----------------------------------------------------------------------------
+
+def huber(delta=1.0):
+    r'''
+    Returns the Huber loss
+
+    .. math::
+      \ell(q,r) = \left\{
+        \begin{array}{ll}
+          \frac{1}{2}(q-r)^2, & |q-r| \leq \delta \\
+          \delta\left(|q-r| - \frac{\delta}{2}\right), & |q-r| > \delta,
+        \end{array}\right.
+
+    which is quadratic for small residuals and linear for large ones. The
+    output is an object of class ``losses.LossPlugIn``, suitable as the
+    ``loss`` argument of ``ProjSplitFit.addData``, and carries curvature
+    information (the second derivative is bounded by 1).
+
+    Parameters
+    ----------
+    delta : :obj:`float`, optional
+        Residual magnitude at which the loss switches from quadratic to linear.
+        Defaults to 1.0. Must be positive and finite.
+
+    Returns
+    -------
+    lossObj : :obj:`losses.LossPlugIn` object
+    '''
+    delta = _checkPositive(delta,'delta')
+
+    def val(yhat,y):
+        absDiff = abs(yhat - y)
+        return where(absDiff <= delta,0.5*absDiff**2,delta*(absDiff - 0.5*delta))
+
+    def deriv(yhat,y):
+        return clip(yhat - y,-delta,delta)
+
+    def valDeriv(yhat,y):
+        diff = yhat - y
+        absDiff = abs(diff)
+        value = where(absDiff <= delta,0.5*absDiff**2,delta*(absDiff - 0.5*delta))
+        return value,clip(diff,-delta,delta)
+
+    def secondDeriv(yhat,y):
+        return 1.0*(abs(yhat - y) <= delta)
+
+    return LossPlugIn(deriv,val,valDeriv,secondDeriv,lambda y: 1.0)
+
+
+def squaredHinge():
+    r'''
+    Returns the squared hinge loss for classification with responses
+    :math:`r\in\{-1,1\}`,
+
+    .. math::
+      \ell(q,r) = \frac{1}{2}\max\{0,1-qr\}^2.
+
+    The output is an object of class ``losses.LossPlugIn``, suitable as the
+    ``loss`` argument of ``ProjSplitFit.addData``, and carries curvature
+    information (the second derivative is bounded by :math:`\max_i r_i^2`).
+
+    Returns
+    -------
+    lossObj : :obj:`losses.LossPlugIn` object
+    '''
+    def val(yhat,y):
+        return 0.5*maximum(1.0 - yhat*y,0.0)**2
+
+    def deriv(yhat,y):
+        return -maximum(1.0 - yhat*y,0.0)*y
+
+    def valDeriv(yhat,y):
+        margin = maximum(1.0 - yhat*y,0.0)
+        return 0.5*margin**2,-margin*y
+
+    def secondDeriv(yhat,y):
+        return (yhat*y < 1.0)*y**2
+
+    return LossPlugIn(deriv,val,valDeriv,secondDeriv,lambda y: (y**2).max())
+
+
+def poisson():
+    r'''
+    Returns the Poisson regression (negative log-likelihood) loss with the
+    log link,
+
+    .. math::
+      \ell(q,r) = e^{q} - rq,
+
+    for count-valued responses :math:`r\geq 0`. The output is an object of
+    class ``losses.LossPlugIn``, suitable as the ``loss`` argument of
+    ``ProjSplitFit.addData``. It supplies the second derivative :math:`e^q`,
+    but no curvature bound, since the second derivative is unbounded.
+
+    Returns
+    -------
+    lossObj : :obj:`losses.LossPlugIn` object
+    '''
+    def val(yhat,y):
+        return exp(yhat) - y*yhat
+
+    def deriv(yhat,y):
+        return exp(yhat) - y
+
+    def valDeriv(yhat,y):
+        expYhat = exp(yhat)
+        return expYhat - y*yhat,expYhat - y
+
+    def secondDeriv(yhat,y):
+        return exp(yhat)
+
+    return LossPlugIn(deriv,val,valDeriv,secondDeriv)
+
+
+def quantile(tau=0.5,smoothing=1e-2):
+    r'''
+    Returns the quantile (pinball) loss for estimating the :math:`\tau`
+    quantile of the responses. With residual :math:`u = r - q`, the loss is
+    :math:`\ell(q,r) = \max\{\tau u,(\tau-1)u\}`. Since this function is
+    not differentiable at :math:`u=0`, it is smoothed by replacing it with
+    the quadratic :math:`u^2/(2h)` for :math:`(\tau-1)h\leq u\leq\tau h`,
+    where :math:`h` is the *smoothing* parameter, and shifting the linear
+    pieces to match. The derivative of the smoothed loss is Lipschitz with
+    constant :math:`1/h`.
+
+    The output is an object of class ``losses.LossPlugIn``, suitable as the
+    ``loss`` argument of ``ProjSplitFit.addData``, and carries curvature
+    information when *smoothing* is positive.
+
+    Parameters
+    ----------
+    tau : :obj:`float`, optional
+        Quantile level, strictly between 0 and 1. Defaults to 0.5, which
+        gives a smoothed absolute-value loss.
+    smoothing : :obj:`float`, optional
+        Width :math:`h` of the smoothed region. Defaults to 0.01. If set to
+        zero, the exact pinball loss is used, its derivative is replaced by a
+        subgradient, and no curvature information is available.
+
+    Returns
+    -------
+    lossObj : :obj:`losses.LossPlugIn` object
+    '''
+    try:
+        tau = float(tau)
+        smoothing = float(smoothing)
+        if (tau <= 0) or (tau >= 1) or (smoothing < 0) or (smoothing == float('inf')):
+            raise Exception
+    except:
+        print("tau must be strictly between 0 and 1 and smoothing must be nonnegative and finite")
+        raise Exception("quantile loss input error")
+
+    h = smoothing
+
+    def val(yhat,y):
+        u = y - yhat
+        if h == 0.0:
+            return maximum(tau*u,(tau-1.0)*u)
+        return where(u > tau*h,tau*u - 0.5*h*tau**2,
+                     where(u < (tau-1.0)*h,(tau-1.0)*u - 0.5*h*(tau-1.0)**2,0.5*u**2/h))
+
+    def deriv(yhat,y):
+        u = y - yhat
+        if h == 0.0:
+            return where(u > 0,-tau,1.0-tau)
+        return -clip(u/h,tau-1.0,tau)
+
+    if h == 0.0:
+        return LossPlugIn(deriv,val)
+
+    def secondDeriv(yhat,y):
+        u = y - yhat
+        return ((u >= (tau-1.0)*h) & (u <= tau*h))/h
+
+    return LossPlugIn(deriv,val,None,secondDeriv,lambda y: 1.0/h)
+
+
+def _checkPositive(value,name):
+    try:
+        value = float(value)
+        if (value <= 0) or (value == float('inf')):
+            raise Exception
+    except:
+        print("{} must be positive and finite".format(name))
+        raise Exception("loss input error")
+    return value
@@ -10,19 +10,31 @@ from numpy import ones
 from numpy import concatenate
 from numpy import array
 from numpy.random import choice
+from numpy.random import default_rng
 from numpy import ndarray
 from numpy import sqrt
+from numpy import maximum
+from numpy import where
+from numpy import arange
+from numpy import cumsum
+from numpy import vstack as npvstack
 
 from scipy.sparse.linalg import aslinearoperator
 from scipy.sparse import issparse
 from scipy.sparse import csr_matrix
 from scipy.sparse.linalg import norm as sparse_norm
 from scipy.sparse import hstack
+from scipy.sparse import vstack
+from scipy.sparse import csc_matrix
 
 from time import time
+from copy import copy
+from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor
 
 
 from regularizers import Regularizer
+from regularizers import fuseRegularizers as fuseRegularizerList
 from losses import Loss
 import lossProcessors as lp
 import projSplitUtils as ut
@@ -89,9 +101,20 @@ class ProjSplitFit(object):
 
         self.allRegularizers = []
         self.numRegs = 0
+        # the regularizers of the blocks of projective splitting, with those
+        # fused by regularizers.fuseRegularizers replaced by one regularizer
+        self.regBlocks = []
         self.dataAdded = False
         self.runCalled = False
 
+        # fixed row blocks of the loss, used by crossValidate and runCoarseToFine
+        self.rowBlocks = None
+        self.rowsChanged = False
+
+        # output buffers for structured regularizer operators, by regularizer
+        # index and direction
+        self.opBuffers = {}
+
 
 
     def setDualScaling(self,dualScaling):
@@ -124,7 +147,8 @@ class ProjSplitFit(object):
 
 
     def addData(self,observations,responses,loss,process=lp.Forward2Backtrack(),
-                intercept=True,normalize=True,linearOp = None,embed = None):
+                intercept=True,normalize=True,linearOp = None,embed = None,
+                formProduct = False):
         r'''
         Introduces the data for the fitting model, and configures the loss function.
 
@@ -146,11 +170,53 @@ class ProjSplitFit(object):
             since this format is the most convenient for the row slicing and
             arithmetic operations required by the solution algorithm.
 
-        responses : 1d :obj:`numpy.ndarray` or :obj:`list`
+            May also be a list of equally shaped 2D NumPy arrays (or a 3D
+            array), to solve a batch of independent problems sharing the
+            loss, loss processor and regularizers, one for each matrix. The
+            problems are advanced together, so each iteration processes the
+            whole batch with a few array operations rather than one Python
+            loop per problem, and problems which have converged are no longer
+            updated. ``responses`` must then be a list of 1D arrays (or a 2D
+            array) giving the responses of each problem, ``linearOp`` must be
+            ``None``, normalization is applied to each problem separately,
+            and ``getSolution`` returns a list of solutions. As for several
+            responses (see below), only the ``Forward2Fixed``,
+            ``Forward2Backtrack`` and ``Forward1Fixed`` loss processors are
+            supported.
+
+            May also be an object of a class derived from
+            :obj:`projSplitUtils.ObservationOperator`, for observations which
+            are never stored as a matrix. The class implements the products
+            ``blockMatvec(rows,x)`` and ``blockRmatvec(rows,u)`` of a block
+            of rows and its transpose with a vector (``rows`` is a slice or a
+            1D array of row indices, and ``x`` and ``u`` are 2D with one
+            column per response if there are several responses). The
+            observations are only normalized if the class also implements
+            ``columnNorms()``, and ``rowNorms(rows)`` may be implemented to
+            bound Lipschitz constants when power iterations fail. All loss
+            processors other than ``BackwardExact``, which needs the entries
+            of the matrix, are supported.
+
+        responses : 1d :obj:`numpy.ndarray` or :obj:`list`, or 2d :obj:`numpy.ndarray`
             the elements within this object comprise the response values
             :math:`r_i` above.  The number of elements should equal the number
             of rows in ``observations``.
 
+            May also be an :math:`n\times K` array, in which case :math:`K`
+            independent problems sharing the observations, loss and
+            regularizers are solved at once, one per column of responses.
+            The iterates are then :math:`(d+1)\times K` arrays, so products
+            with the observations are matrix-matrix products, and each
+            response is tracked separately for convergence; responses that
+            have converged are no longer updated. ``getSolution`` then
+            returns an array with one column per response, and
+            ``getObjective``, ``getPrimalViolation`` and ``getDualViolation``
+            return one value per response. Only the ``Forward2Fixed``,
+            ``Forward2Backtrack``, ``Forward1Fixed`` and ``BackwardExact``
+            loss processors support multiple responses, and the loss
+            functions receive 2D arrays, so plug-in losses must act
+            elementwise.
+
         loss : :obj:`float` or :obj:`string` or :obj:`losses.LossPlugIn`
             Specifies the loss function :math:`\ell`.
             May be a :obj:`float` :math:`p > 1` to indicate the :math:`\ell_p^p`
@@ -185,7 +251,49 @@ class ProjSplitFit(object):
             embed is used with any other loss processor, a warning is
             printed and the regularizer is added as an ordinary regularizer instead.
 
+        formProduct : :obj:`bool` or :obj:`str`, optional
+            If ``True``, the product :math:`AH` of the (normalized)
+            observations and ``linearOp`` is formed once here and used as
+            the observations, so that the loss processors work directly
+            with :math:`z` and :math:`H` is not applied during the
+            iterations. This is often faster when :math:`A` and :math:`H`
+            are sparse and the product stays sparse. With ``'auto'``, the
+            product is only formed when :math:`H` is a matrix and
+            multiplying by :math:`AH` is estimated to cost no more, in
+            nonzeros, than multiplying by :math:`H` and then :math:`A`.
+            The problem solved is the same either way, but the product
+            cannot be formed with ``embed``, since the embedded regularizer
+            is applied to :math:`Hz`. Defaults to ``False``.
+
         '''
+        if formProduct not in [False,True,'auto']:
+            raise Exception("formProduct must be True, False or 'auto'")
+
+        self.batchMode = isinstance(observations,list) or \
+            (isinstance(observations,ndarray) and (observations.ndim == 3))
+        batchObservations = None
+        if self.batchMode:
+            try:
+                observations = array(observations,dtype=float)
+                responses = array(responses,dtype=float)
+                if (observations.ndim != 3) or (responses.shape != observations.shape[:2]):
+                    raise Exception
+            except:
+                print("Error: for a batch of problems, observations must be a list of 2D arrays")
+                print("of the same shape and responses a list of matching 1D arrays")
+                raise Exception("Invalid batch of observations and responses")
+
+            if linearOp is not None:
+                raise Exception("linearOp is not supported for a batch of problems")
+
+            if len(observations) == 1:
+                # a batch of one is an ordinary problem
+                observations = observations[0]
+                responses = responses[0]
+            else:
+                batchObservations = observations
+                observations = observations[0] # all problems share its shape
+                responses = responses.T # one column per problem
 
         try:
             (self.nrowsOfA,self.ncolsOfA) = observations.shape
@@ -194,12 +302,13 @@ class ProjSplitFit(object):
             print("NumPy arrays. They must have a shape attribute. Aborting, did not add data")
             raise Exception("Observations and responses should be 2D numpy-like arrays")
 
+        self.matrixFree = isinstance(observations,ut.ObservationOperator)
         if issparse(observations):
             #sparse matrix format
             observations = csr_matrix(observations)
             self.sparseObservationMtx = True
-        elif isinstance(observations,ndarray) == False:
-            raise Exception("Observations must be either a numpy ndarray or a scipy.sparse matrix")
+        elif (isinstance(observations,ndarray) == False) and (self.matrixFree == False):
+            raise Exception("Observations must be a numpy ndarray, a scipy.sparse matrix or a projSplitUtils.ObservationOperator")
         else:
             self.sparseObservationMtx = False
 
@@ -209,12 +318,15 @@ class ProjSplitFit(object):
             self.yresponse = array(responses)
 
             if len(self.yresponse.shape) > 2:
-                raise Exception("responses must be a list or a 1D array")
-            elif (len(self.yresponse.shape)==2) and (self.yresponse.shape[1] != 1):
-                raise Exception("responses must be a list or a 1D array")
+                raise Exception("responses must be a list, a 1D array or a 2D array")
 
         except:
-            raise Exception("responses must be a list or a 1D array")
+            raise Exception("responses must be a list, a 1D array or a 2D array")
+
+        if (len(self.yresponse.shape) == 2) and (self.yresponse.shape[1] > 1):
+            self.nResponses = self.yresponse.shape[1]
+        else:
+            self.nResponses = 1
 
         if (self.nrowsOfA == 0) | (self.ncolsOfA == 0):
             self.yresponse = None
@@ -231,9 +343,34 @@ class ProjSplitFit(object):
             print("Using Forward2Backtrack() as the process object")
             self.process = lp.Forward2Backtrack()
 
+        if (self.nResponses > 1) and (self.process.multiResponseOK == False):
+            print("Warning: this process object does not support multiple responses")
+            print("Using Forward2Backtrack() as the process object")
+            self.process = lp.Forward2Backtrack()
+
+        if (batchObservations is not None) and self.process.pMustBe2:
+            # these processors factor A^T A, which differs across the batch
+            print("Warning: this process object does not support a batch of problems")
+            print("Using Forward2Backtrack() as the process object")
+            self.process = lp.Forward2Backtrack()
+
+        if self.matrixFree and self.process.needsMatrix:
+            print("Warning: this process object needs the observation matrix, which an")
+            print("ObservationOperator does not provide")
+            print("Using Forward2Backtrack() as the process object")
+            self.process = lp.Forward2Backtrack()
+
+        self.loss = Loss(loss)
+
+        if self.process.needsCurvature and (self.loss.secondDerivative is None):
+            print("Warning: this process object needs the second derivative of the loss")
+            print("which is not available for this loss")
+            print("Using Forward2Backtrack() as the process object")
+            self.process = lp.Forward2Backtrack()
+
 
         if linearOp is None:
-            self.dataLinOp = ut.MyLinearOperator(matvec=lambda x:x,rmatvec=lambda x:x)
+            self.dataLinOp = ut.IdentityOperator()
             self.nPrimalVars = self.ncolsOfA
             self.linOpUsedWithLoss = False
         else:
@@ -247,11 +384,9 @@ class ProjSplitFit(object):
                     self.nPrimalVars = None
                     raise Exception("Error! number of columns of the data matrix must equal number rows of composed linear operator")
                 else:
-                    # expandOperator to deal with the intercept term
                     # the first entry of the input is the intercept which is
                     # just passed through
-                    matvec,rmatvec = ut.expandOperator(linearOp)
-                    self.dataLinOp = ut.MyLinearOperator(matvec,rmatvec)
+                    self.dataLinOp = ut.InterceptOperator(linearOp)
                     self.nPrimalVars = linearOp.shape[1]
                     self.linOpUsedWithLoss = True
             except:
@@ -295,10 +430,27 @@ class ProjSplitFit(object):
 
 
 
+        colScale = None
+        if normalize and self.matrixFree and (observations.columnNorms() is None):
+            print("Warning: the ObservationOperator does not provide its column norms")
+            print("so the observations cannot be normalized. Not normalizing")
+            normalize = False
+
         if normalize:
             print("Normalizing columns of observation matrix to have square norm equal to num rows")
             self.normalize = True
-            if self.sparseObservationMtx == False:
+            if batchObservations is not None:
+                # one column of scaling factors per problem
+                scaling = norm(batchObservations,axis=1)
+                scaling += 1.0*(scaling < 1e-10)
+                batchObservations = sqrt(self.nrowsOfA)*batchObservations/scaling[:,None,:]
+                self.scaling = scaling.T
+            elif self.matrixFree:
+                # applied by ut.ObservationMatrix on every product
+                self.scaling = array(observations.columnNorms(),dtype=float)
+                self.scaling += 1.0*(self.scaling < 1e-10)
+                colScale = sqrt(self.nrowsOfA)/self.scaling
+            elif self.sparseObservationMtx == False:
                 self.A = npcopy(observations)
                 self.scaling = norm(self.A,axis=0)
                 self.scaling += 1.0*(self.scaling < 1e-10)
@@ -315,7 +467,22 @@ class ProjSplitFit(object):
             self.A = observations
             self.normalize = False
 
-        self.loss = Loss(loss)
+        self.dataProduct = False
+        if self.linOpUsedWithLoss and (formProduct is not False):
+            if self.embeddedRegInUse:
+                if formProduct is True:
+                    print("Warning: the product of the observations and linearOp")
+                    print("cannot be formed with an embedded regularizer, applying linearOp instead")
+            elif self.matrixFree:
+                if formProduct is True:
+                    print("Warning: the product of an ObservationOperator and linearOp")
+                    print("cannot be formed, applying linearOp instead")
+            elif (formProduct is True) or ut.productIsCheaper(self.A,linearOp):
+                self.A = ut.composeMatrices(self.A,linearOp)
+                self.sparseObservationMtx = issparse(self.A)
+                self.dataLinOp = ut.IdentityOperator()
+                self.linOpUsedWithLoss = False
+                self.dataProduct = True
 
         if (intercept not in [False,True]):
             print("Warning: intercept should be a bool")
@@ -325,7 +492,13 @@ class ProjSplitFit(object):
             intercept = int(intercept)
 
         col2Add = intercept * ones((self.nrowsOfA, 1))
-        if self.sparseObservationMtx == False:
+        if batchObservations is not None:
+            col2Add = intercept * ones((len(batchObservations),self.nrowsOfA,1))
+            self.A = ut.BatchedMatrix(concatenate((col2Add,batchObservations),axis=2))
+            self.Abatch = self.A
+        elif self.matrixFree:
+            self.A = ut.ObservationMatrix(observations,intercept,colScale)
+        elif self.sparseObservationMtx == False:
             self.A = concatenate((col2Add,self.A),axis=1)
         else:
             self.A = hstack((col2Add, self.A))
@@ -400,6 +573,10 @@ class ProjSplitFit(object):
                 Introduces the matrix :math:`G_j` above, which otherwise defaults to
                 an identity matrix.  If a sparse matrix is supplied, it is
                 internally converted to the :obj:`scipy.sparse.csr_matrix` format.
+                The structured operators of ``projSplitUtils`` (``Difference1d``,
+                ``Difference2d``, ``Subset``, ``BlockDiagonal`` and ``Kronecker``)
+                are applied without forming a matrix and, during ``run``,
+                without allocating new arrays on each iteration.
 
         '''
         if isinstance(regObj,Regularizer) == False:
@@ -452,7 +629,9 @@ class ProjSplitFit(object):
         Returns
         ---------
         currentLoss : :obj:`float`
-            the current objective value evaluated at the current iterate
+            the current objective value evaluated at the current iterate, or
+            a 1D array with one value per response if ``addData`` was given
+            several responses
         '''
         if self.runCalled == False:
             raise Exception("Method not run yet, no objective to return. Call run() first.")
@@ -549,7 +728,9 @@ class ProjSplitFit(object):
         Returns
         -------
             z : 1D numpy array
-                :math:`z^k`
+                :math:`z^k`. If ``addData`` was given several responses,
+                a 2D array with one column per response. If ``addData`` was
+                given a batch of problems, a list with one solution per problem.
 
         '''
 
@@ -566,7 +747,7 @@ class ProjSplitFit(object):
 
         if descale:
             if self.normalize:
-                if self.linOpUsedWithLoss:
+                if self.linOpUsedWithLoss or self.dataProduct:
                     print("Warning: Cannot descale because of the presence of a linear operator")
                     print("composed with the data. Just returning the unnormalized solution vector")
                     out = z2use
@@ -581,6 +762,11 @@ class ProjSplitFit(object):
         if (self.intercept==False):
             out = out[1:]
 
+        if self.batchMode:
+            if self.nResponses == 1:
+                return [out]
+            return [out[:,j] for j in range(self.nResponses)]
+
         return out
 
 
@@ -616,7 +802,8 @@ class ProjSplitFit(object):
         Returns
         -------
             primalErr : :obj:`float`
-                Primal Violation.
+                Primal Violation. One value per response if ``addData`` was
+                given several responses.
         '''
         if self.runCalled == False:
             raise Exception("Method not run yet, no primal violation to return. Call run() first.")
@@ -652,7 +839,8 @@ class ProjSplitFit(object):
         Returns
         -------
             dualErr : :obj:`float`
-                Dual Violation.
+                Dual Violation. One value per response if ``addData`` was
+                given several responses.
         '''
         if self.runCalled == False:
             raise Exception("Method not run yet, no dual violation to return. Call run() first.")
@@ -683,6 +871,10 @@ class ProjSplitFit(object):
         3. Dual violation
         4. Value of the :math:`\phi(p^k)` quantity used in hyperplane construction
 
+        If ``addData`` was given several responses, the objective value is
+        summed over the responses and the violations are the largest over
+        the responses.
+
         If ``run`` has not yet been called with ``keepHistory`` set to True,
         this function will raise an Exception when called.
 
@@ -705,7 +897,9 @@ class ProjSplitFit(object):
 
     def run(self,primalTol = 1e-6, dualTol=1e-6,maxIterations=None,keepHistory = False,
             historyFreq = 10, nblocks = 1, blockActivation="greedy", blocksPerIteration=1,
-            resetIterate=False,verbose=False,ergodic=None,equalizeStepsizes=False):
+            resetIterate=False,verbose=False,ergodic=None,equalizeStepsizes=False,
+            continuation=None,continuationStart=100.0,continuationShrink=0.1,
+            fuseRegularizers=False):
         r'''
         Run projective splitting.
 
@@ -833,11 +1027,54 @@ class ProjSplitFit(object):
                 ``True``, set the regularizer stepsizes according to the
                 stepsizes returned by backtracking. Defaults to ``False``.
 
+            continuation : :obj:`regularizers.Regularizer` or :obj:`list` or :obj:`bool`, optional
+                Regularizers to solve by continuation: their scalings
+                :math:`\nu_j` start at ``continuationStart`` times their values
+                and are multiplied by ``continuationShrink`` each time the
+                primal and dual violations fall below their tolerances times
+                the current multiple, until they reach their values. The
+                iterates and stepsizes carry over from one stage to the next.
+                For weak regularization, such as a small :math:`\ell_1`
+                penalty, the strongly regularized early stages settle
+                quickly and the final stage starts close to its solution.
+                May be one regularizer, a list of regularizers, or ``True``
+                for all the regularizers of the problem, including an
+                embedded one. Defaults to ``None``, for no continuation.
+
+            continuationStart : :obj:`float`, optional
+                Initial multiple of the scalings of the ``continuation``
+                regularizers, at least 1. Defaults to 100.0.
+
+            continuationShrink : :obj:`float`, optional
+                Factor by which the multiple is reduced at the end of each
+                stage of continuation, strictly between 0 and 1. Defaults to 0.1.
+
+            fuseRegularizers : :obj:`bool`, optional
+                If ``True``, the regularizers added without a linear operator
+                whose sum has a closed-form prox, such as ``L1`` with ``L2sq``
+                or with ``nonnegative``, are fused into a single block of
+                projective splitting by ``regularizers.fuseRegularizers``.
+                This saves a prox evaluation and a set of variables per fused
+                regularizer on every iteration, and often iterations too when
+                the loss is a single block. But with several loss blocks,
+                leaving only one regularizer block may need many more
+                iterations, so this is not done by default. The solution and
+                the regularizers used in objective values are unchanged.
+                Defaults to ``False``.
+
         '''
 
         if self.dataAdded == False:
             raise Exception("Must add data before calling run(). Aborting...")
 
+        fuseRegularizers = ui.checkUserBool(fuseRegularizers,'fuseRegularizers')
+
+        continuationRegs = self.__selectRegularizers(continuation)
+        continuationStart = ui.checkUserInput(continuationStart,float,'float','continuationStart',
+                                              default=100.0,low=1.0,lowAllowed=True)
+        continuationShrink = ui.checkUserInput(continuationShrink,float,'float','continuationShrink',
+                                               default=0.1,low=0.0,high=1.0)
+
         if (blockActivation != "greedy") and (blockActivation != "cyclic") \
             and (blockActivation != "random"):
                 print("Warning: chosen blockActivation is not recognised")
@@ -845,7 +1082,10 @@ class ProjSplitFit(object):
                 blockActivation = "greedy"
 
 
-        numBlocks = self.__setBlocks(nblocks)
+        if self.rowBlocks is None:
+            numBlocks = self.__setBlocks(nblocks)
+        else:
+            numBlocks = len(self.rowBlocks)
 
         if self.runCalled:
             if(self.nDataBlocks != numBlocks):
@@ -865,13 +1105,22 @@ class ProjSplitFit(object):
             print("Setting blocksPerIteartion to 1")
             blocksPerIteration =1
 
-        self.partition = ut.createApartition(self.nrowsOfA,self.nDataBlocks,self.sparseObservationMtx)
+        if self.rowBlocks is None:
+            self.partition = ut.createApartition(self.nrowsOfA,self.nDataBlocks,self.sparseObservationMtx)
+        else:
+            self.partition = list(self.rowBlocks)
 
         self.__createListOfSparseMatrices()
 
-        self.__setUpRegularizers()
+        self.__setUpRegularizers(fuseRegularizers)
+        self.__stackRegularizerOps()
 
-        self.nDataBlockVars = self.ncolsOfA + 1 # extra 1 for the intercept term
+        # extra 1 for the intercept term
+        if self.dataProduct:
+            # the observations are A H
+            self.nDataBlockVars = self.nPrimalVars + 1
+        else:
+            self.nDataBlockVars = self.ncolsOfA + 1
 
 
         resetIterate = ui.checkUserBool(resetIterate,"resetIterate")
@@ -879,6 +1128,10 @@ class ProjSplitFit(object):
         if resetIterate or self.internalResetIterate:
             self.internalResetIterate = False
             self.__initializeVariables()
+        elif self.rowsChanged:
+            # the blocks hold other rows than in the previous run
+            self.process.repartition(self)
+        self.rowsChanged = False
 
         keepHistory = ui.checkUserBool(keepHistory,"keepHistory")
         verbose = ui.checkUserBool(verbose,"verbose")
@@ -894,6 +1147,14 @@ class ProjSplitFit(object):
         primalTol = ui.checkUserInput(primalTol,float,'float','primalTol',default=1e-6,low=0.0,lowAllowed=True)
         dualTol = ui.checkUserInput(dualTol,float,'float','dualTol',default=1e-6,low=0.0,lowAllowed=True)
 
+        # taken after the embedded scaling is divided among the blocks
+        continuationTargets = [reg.getScaling() for reg in continuationRegs]
+        if len(continuationRegs) > 0:
+            multiple = continuationStart
+        else:
+            multiple = 1.0
+        self.__scaleRegularizers(continuationRegs,continuationTargets,multiple)
+
         self.k = 0
         objective = []
         times = [0]
@@ -904,6 +1165,14 @@ class ProjSplitFit(object):
         sumTau = 0.0
         interTime = 0.0
 
+        if self.nResponses > 1:
+            # responses which have converged are frozen: their columns are
+            # removed from the working arrays and written back after the run
+            sumTau = zeros(self.nResponses)
+            self.activeColumns = arange(self.nResponses)
+            self.fullColumnState = None
+            frozenObjective = 0.0
+
         ################################
         # BEGIN MAIN ALGORITHM LOOP
         ################################
@@ -916,39 +1185,86 @@ class ProjSplitFit(object):
             self.__updateRegularizerBlocks()
 
             if verbose and (self.k%100 == 0):
-                print('iteration = {:<5d}  primalViol = {:<11.6g}  dualViol = {:<11.6g}'.format(self.k,self.primalErr,self.dualErr))
+                if self.nResponses > 1:
+                    # the largest violations over the responses still being solved
+                    print('iteration = {:<5d}  primalViol = {:<11.6g}  dualViol = {:<11.6g}  converged responses = {}/{}'.format(
+                        self.k,self.primalErr.max(),self.dualErr.max(),
+                        self.nResponses - len(self.activeColumns),self.nResponses))
+                else:
+                    print('iteration = {:<5d}  primalViol = {:<11.6g}  dualViol = {:<11.6g}'.format(self.k,self.primalErr,self.dualErr))
+
+            if multiple > 1.0:
+                # an intermediate stage of continuation, solved to a
+                # proportionally looser tolerance
+                if ((self.primalErr < multiple*primalTol) & (self.dualErr < multiple*dualTol)).all():
+                    multiple = max(continuationShrink*multiple,1.0)
+                    self.__scaleRegularizers(continuationRegs,continuationTargets,multiple)
+            else:
+                converged = (self.primalErr < primalTol) & (self.dualErr < dualTol)
+                if converged.all():
+                    print("primal and dual tolerance reached, finishing run")
+                    break
 
-            if (self.primalErr < primalTol) & (self.dualErr < dualTol):
-                print("primal and dual tolerance reached, finishing run")
-                break
+                if converged.any():
+                    keep = ~converged
+                    if keepHistory:
+                        frozenObjective += npsum(self.getObjective(ergodic=ergodic)[converged])
+                    self.__freezeColumns(keep)
+                    sumTau = sumTau[keep]
 
             phi,tau = self.__projectToHyperplane() # update (z,w1...wn) from (x1..xn,y1..yn,z,w1..wn)
 
-            if phi == "converged":
+            if isinstance(phi,str) and (multiple > 1.0):
+                # the current stage is solved exactly, move on to the next
+                phi = 0.0
+                multiple = max(continuationShrink*multiple,1.0)
+                self.__scaleRegularizers(continuationRegs,continuationTargets,multiple)
+            elif isinstance(phi,str):
                 print("Gradient of the hyperplane is 0, converged, finishing run")
                 break
 
             self.zbar = (self.k/(self.k+1.0))*self.zbar + (1.0/(self.k+1))*self.z
 
-            if tau > 0:
-                self.zbarWeighted = (sumTau/(sumTau+tau))*self.zbarWeighted + (tau/(sumTau+tau))*self.z
-                sumTau += tau
+            if self.nResponses == 1:
+                if tau > 0:
+                    self.zbarWeighted = (sumTau/(sumTau+tau))*self.zbarWeighted + (tau/(sumTau+tau))*self.z
+                    sumTau += tau
+            else:
+                newSumTau = sumTau + tau
+                weight = where(tau > 0,tau/where(newSumTau > 0,newSumTau,1.0),0.0)
+                self.zbarWeighted = (1.0 - weight)*self.zbarWeighted + weight*self.z
+                sumTau = newSumTau
 
             t1 = time()
             interTime += t1-t0
 
             if keepHistory and (self.k % historyFreq == 0):
-                objective.append(self.getObjective(ergodic=ergodic))
+                if self.nResponses == 1:
+                    objective.append(self.getObjective(ergodic=ergodic))
+                    primalErrs.append(self.primalErr)
+                    dualErrs.append(self.dualErr)
+                    phis.append(phi)
+                else:
+                    # totals over the responses, and worst violations
+                    objective.append(frozenObjective + npsum(self.getObjective(ergodic=ergodic)))
+                    primalErrs.append(self.primalErr.max())
+                    dualErrs.append(self.dualErr.max())
+                    phis.append(npsum(phi))
                 times.append(times[-1]+interTime)
                 interTime = 0.0
-                primalErrs.append(self.primalErr)
-                dualErrs.append(self.dualErr)
-                phis.append(phi)
 
 
             self.k += 1
 
 
+        if self.nResponses > 1:
+            self.__restoreColumns()
+
+        if multiple > 1.0:
+            print("Warning: maxIterations reached before the end of continuation,")
+            print("the solution is for larger scalings of the continuation regularizers")
+            self.__scaleRegularizers(continuationRegs,continuationTargets,1.0)
+
         if keepHistory:
             self.historyArray = [objective]
             self.historyArray.append(times[1:])
@@ -967,6 +1283,414 @@ class ProjSplitFit(object):
             self.embedded.setScaling(self.embeddedScaling)
 
 
+    def fitPath(self,scalings,regularizer=None,computeObjectives=True,**runArgs):
+        r'''
+        Solve the problem for each of a sequence of values of a regularizer
+        scaling :math:`\nu_j`, warm-starting each solve from the previous one.
+
+        For each entry of ``scalings`` in turn, the scaling of the regularizer
+        is set with ``Regularizer.setScaling`` and ``run`` is called. The
+        iterates and the loss processor stepsizes carry over from one solve to
+        the next, which typically needs far fewer iterations than a cold
+        start when the scalings decrease gradually, as in a regularization
+        path. The solves are carried out in the order given, so ``scalings``
+        should usually be decreasing.
+
+        The number of iterations of each solve is stored in the attribute
+        ``pathIterations``.
+
+        Parameters
+        ----------
+            scalings : iterable of :obj:`float`
+                The values of :math:`\nu_j` to solve for, each positive and finite.
+
+            regularizer : :obj:`regularizers.Regularizer`, optional
+                The regularizer whose scaling varies along the path. It must
+                already have been introduced with ``addRegularizer`` or as the
+                ``embed`` argument of ``addData``. Defaults to ``None``, which
+                selects the regularizer of the problem if there is exactly one,
+                and raises an exception otherwise.
+
+            computeObjectives : :obj:`bool`, optional
+                Whether to compute the objective value at the end of each
+                solve. Requires the loss and regularizers to define their
+                value functions. Defaults to ``True``.
+
+            runArgs : optional
+                Any further keyword arguments are passed to ``run``, for
+                example ``nblocks``, ``primalTol`` or ``maxIterations``.
+
+        Returns
+        -------
+            solutions : :obj:`scipy.sparse.csc_matrix`
+                One column per entry of ``scalings``, holding the solution
+                (including the intercept if the ``intercept`` argument to
+                ``addData`` was ``True``). The solution recorded is the
+                output of the final proximal step of projective splitting,
+                which lies within the primal violation of ``getSolution()``
+                and has exact zeros wherever the regularizer produces them,
+                so only the nonzero coefficients are stored.
+
+            objectives : 1D :obj:`numpy.ndarray`
+                The objective value at the end of each solve, or ``None`` if
+                ``computeObjectives`` is ``False``.
+        '''
+        if self.dataAdded == False:
+            raise Exception("Must add data before calling fitPath(). Aborting...")
+
+        if self.nResponses > 1:
+            raise Exception("fitPath supports a single response only")
+
+        if regularizer is None:
+            candidates = self.__selectRegularizers(True)
+            if len(candidates) != 1:
+                raise Exception("The problem has {} regularizers, specify which one to scale".format(len(candidates)))
+            regularizer = candidates[0]
+        else:
+            regularizer = self.__selectRegularizers(regularizer)[0]
+
+        computeObjectives = ui.checkUserBool(computeObjectives,'computeObjectives')
+
+        solutions = []
+        objectives = []
+        self.pathIterations = []
+        for scaling in scalings:
+            regularizer.setScaling(scaling)
+            self.run(**runArgs)
+            solutions.append(csc_matrix(self.__pathCoefficients()[:,None]))
+            if computeObjectives:
+                objectives.append(self.getObjective())
+            self.pathIterations.append(self.k)
+
+        self.pathIterations = array(self.pathIterations)
+        if computeObjectives:
+            objectives = array(objectives)
+        else:
+            objectives = None
+
+        return csc_matrix(hstack(solutions)),objectives
+
+    def runCoarseToFine(self,initialRows,seed=None,subsetTol=None,**runArgs):
+        r'''
+        Solve the problem on growing random subsets of the observations, each
+        solve starting from the solution of the previous one.
+
+        The observations are shuffled once, and ``run`` is first called on
+        the first ``initialRows`` of them. The number of observations is then
+        doubled, and the subset is split again into blocks of the loss,
+        until the final call to ``run`` on all the observations. The
+        iterates, including :math:`z^k` and the dual iterates
+        :math:`w_i^k`, and the stepsizes of the loss processor carry over
+        from one subset to the next. Since the loss is averaged over the
+        observations, the problems on large enough subsets have solutions
+        close to the full one, so most iterations are spent on cheap
+        subproblems and the solve on all the observations starts close to
+        its solution.
+
+        The number of iterations of each call to ``run`` is stored in the
+        attribute ``stageIterations``.
+
+        Parameters
+        ----------
+            initialRows : :obj:`int`
+                Number of observations in the first subset, at least the
+                number of blocks ``nblocks``.
+
+            seed : :obj:`int`, optional
+                Seed of the shuffling of the observations. Defaults to ``None``.
+
+            subsetTol : :obj:`float`, optional
+                Primal and dual tolerances for the subsets, which need not be
+                solved as accurately as the full problem. Defaults to
+                ``None``, which uses the ``primalTol`` and ``dualTol`` of the
+                final solve.
+
+            runArgs : optional
+                Any further keyword arguments are passed to each call to
+                ``run``. ``resetIterate`` only applies to the first call, and
+                ``maxIterations`` to each call.
+        '''
+        if self.dataAdded == False:
+            raise Exception("Must add data before calling runCoarseToFine(). Aborting...")
+
+        if self.batchMode:
+            raise Exception("runCoarseToFine does not support a batch of problems")
+
+        numBlocks = self.__setBlocks(runArgs.get('nblocks',1))
+        initialRows = ui.checkUserInput(initialRows,int,'int','initialRows',low=1,lowAllowed=True)
+        if initialRows < numBlocks:
+            print("Warning: initialRows must be at least nblocks, setting it to nblocks")
+            initialRows = numBlocks
+
+        subsetArgs = dict(runArgs)
+        if subsetTol is not None:
+            subsetTol = ui.checkUserInput(subsetTol,float,'float','subsetTol',low=0.0,lowAllowed=True)
+            subsetArgs['primalTol'] = subsetTol
+            subsetArgs['dualTol'] = subsetTol
+
+        if self.sparseObservationMtx and isinstance(self.A,list):
+            # run() has sliced the observations into blocks
+            A,y = self.Afull,self.yresponseFull
+        else:
+            A,y = self.A,self.yresponse
+        nrows = self.nrowsOfA
+        order = default_rng(seed).permutation(nrows)
+
+        self.stageIterations = []
+        rows = initialRows
+        try:
+            # the subsets are leading rows of the shuffled observations
+            self.A = A[order]
+            self.yresponse = y[order]
+            self.rowBlockCache = {}
+            while rows < nrows:
+                self.nrowsOfA = rows
+                self.rowBlocks = ut.createApartition(rows,numBlocks,False)
+                self.rowsChanged = True
+                self.run(**subsetArgs)
+                subsetArgs.pop('resetIterate',None)
+                runArgs.pop('resetIterate',None)
+                self.stageIterations.append(self.k)
+                rows *= 2
+        finally:
+            self.A = A
+            self.yresponse = y
+            self.nrowsOfA = nrows
+            self.rowBlocks = None
+            self.rowBlockCache = None
+            self.rowsChanged = True
+
+        self.run(**runArgs)
+        self.stageIterations.append(self.k)
+        self.stageIterations = array(self.stageIterations)
+
+    def crossValidate(self,nFolds=5,scalings=None,regularizer=None,blocksPerFold=1,
+                      shuffle=True,seed=None,nJobs=1,**runArgs):
+        r'''
+        Estimate the prediction loss of the model by :math:`K`-fold cross-validation.
+
+        The observations are split once into ``nFolds`` folds of sizes differing
+        by at most one. For each fold, the problem is solved on the other folds
+        and the average loss :math:`\ell` on the held-out fold is computed.
+        The loss, loss processor and regularizers are those of this object,
+        which must already have been set up with ``addData`` and
+        ``addRegularizer``. This object itself is left unchanged.
+
+        The fold problems do not copy the data. They share the observation
+        matrix of this object, so the normalization applied by ``addData`` is
+        computed once from all the observations and reused by every fold. The
+        loss of each fold problem is split into blocks along the folds it
+        contains, each fold giving ``blocksPerFold`` blocks, so a block is the
+        same in all the problems it belongs to. Block data is therefore built
+        once for sparse observations, and with the ``BackwardExact`` loss
+        processor the matrix inverses of each block are shared between the
+        fold problems having the same number of observations, with dense and
+        sparse observations alike.
+
+        Parameters
+        ----------
+            nFolds : :obj:`int`, optional
+                Number of folds :math:`K`, at least 2 and at most the number of
+                observations. Defaults to 5.
+
+            scalings : iterable of :obj:`float`, optional
+                If given, each fold problem is solved for this sequence of
+                scalings of ``regularizer``, as in ``fitPath``, and the held-out
+                loss is computed for each of them. Defaults to ``None``, which
+                solves each fold problem once with the current scalings.
+
+            regularizer : :obj:`regularizers.Regularizer`, optional
+                With ``scalings``, the regularizer whose scaling varies, as
+                for ``fitPath``. Defaults to ``None``, which selects the
+                regularizer of the problem if there is exactly one.
+
+            blocksPerFold : :obj:`int`, optional
+                Number of blocks of the loss in each fold, so that the fold
+                problems have ``(nFolds-1)*blocksPerFold`` blocks, which
+                replaces the ``nblocks`` argument of ``run``. Defaults to 1.
+
+            shuffle : :obj:`bool`, optional
+                Whether to assign the observations to folds at random. If
+                ``False``, the folds are contiguous ranges of observations.
+                Shuffling makes one copy of the observation matrix.
+                Defaults to ``True``.
+
+            seed : :obj:`int`, optional
+                Seed of the random assignment to folds. Defaults to ``None``.
+
+            nJobs : :obj:`int`, optional
+                Number of fold problems solved at the same time, each in its
+                own thread. Defaults to 1.
+
+            runArgs : optional
+                Any further keyword arguments are passed to ``run``, except
+                ``nblocks``.
+
+        Returns
+        -------
+            heldOutLoss : :obj:`numpy.ndarray`
+                The average held-out loss of each fold, as a 1D array of length
+                ``nFolds``. With ``scalings``, a 2D array with one row per fold
+                and one column per scaling. With several responses, a 2D array
+                with one row per fold and one column per response.
+        '''
+        if self.dataAdded == False:
+            raise Exception("Must add data before calling crossValidate(). Aborting...")
+
+        if self.batchMode:
+            raise Exception("crossValidate does not support a batch of problems")
+
+        if 'nblocks' in runArgs:
+            raise Exception("The fold problems are split into blocks by blocksPerFold, not nblocks")
+
+        nFolds = ui.checkUserInput(nFolds,int,'int','nFolds',low=2,lowAllowed=True,
+                                   high=self.nrowsOfA,highAllowed=True)
+        minFoldSize = self.nrowsOfA//nFolds
+        blocksPerFold = ui.checkUserInput(blocksPerFold,int,'int','blocksPerFold',low=1,lowAllowed=True,
+                                          high=minFoldSize,highAllowed=True)
+        nJobs = ui.checkUserInput(nJobs,int,'int','nJobs',default=1,low=1,lowAllowed=True)
+        shuffle = ui.checkUserBool(shuffle,'shuffle')
+
+        if scalings is not None:
+            scalings = list(scalings)
+            if regularizer is not None:
+                if self.embeddedRegInUse and (regularizer is self.embedded):
+                    regIndex = None
+                else:
+                    regIndex = [i for i,reg in enumerate(self.allRegularizers) if reg is regularizer]
+                    if len(regIndex) == 0:
+                        raise Exception("regularizer must be one already added to the problem")
+                    regIndex = regIndex[0]
+
+        if self.sparseObservationMtx and isinstance(self.A,list):
+            # run() has sliced the observations into blocks
+            A,y = self.Afull,self.yresponseFull
+        else:
+            A,y = self.A,self.yresponse
+        if shuffle:
+            order = default_rng(seed).permutation(self.nrowsOfA)
+            A = A[order]
+            y = y[order]
+
+        folds = ut.createApartition(self.nrowsOfA,nFolds,False)
+        foldBlocks = [[range(fold.start+part.start,fold.start+part.stop)
+                       for part in ut.createApartition(len(fold),blocksPerFold,False)]
+                      for fold in folds]
+        rowBlockCache = {}
+        factorCache = {}
+
+        def fitFold(k):
+            fold = self.__foldProblem(A,y,[block for j in range(nFolds) if j != k
+                                           for block in foldBlocks[j]],
+                                      rowBlockCache,factorCache)
+            if scalings is None:
+                fold.run(**runArgs)
+                Z = fold.z
+            else:
+                if regularizer is None:
+                    foldRegularizer = None
+                elif regIndex is None:
+                    foldRegularizer = fold.embedded
+                else:
+                    foldRegularizer = fold.allRegularizers[regIndex]
+                Z,_ = fold.fitPath(scalings,foldRegularizer,computeObjectives=False,**runArgs)
+                Z = Z.toarray()
+                if self.intercept == False:
+                    Z = self.__padIntercept(Z)
+            return self.__heldOutLoss(A,y,folds[k],Z)
+
+        if nJobs == 1:
+            heldOutLoss = [fitFold(k) for k in range(nFolds)]
+        else:
+            # the products with the observations release the GIL, so threads
+            # solve the folds concurrently without copying the data
+            with ThreadPoolExecutor(max_workers=nJobs) as pool:
+                heldOutLoss = list(pool.map(fitFold,range(nFolds)))
+
+        return array(heldOutLoss)
+
+    def __foldProblem(self,A,y,rowBlocks,rowBlockCache,factorCache):
+        # a problem on the rows in rowBlocks of A, sharing the data, loss and
+        # linear operators of this one and with its own regularizers and
+        # loss processor, since these hold the state of the solver
+        fold = ProjSplitFit(self.gamma)
+        fold.A = A
+        fold.yresponse = y
+        fold.nrowsOfA = sum(len(block) for block in rowBlocks)
+        fold.ncolsOfA = self.ncolsOfA
+        fold.rowBlocks = rowBlocks
+        fold.rowBlockCache = rowBlockCache
+        fold.sparseObservationMtx = self.sparseObservationMtx
+        fold.nResponses = self.nResponses
+        fold.batchMode = False
+        fold.loss = self.loss
+        fold.process = deepcopy(self.process)
+        if isinstance(fold.process,lp.BackwardExact):
+            fold.process.factorCache = factorCache
+        fold.dataLinOp = self.dataLinOp
+        fold.nPrimalVars = self.nPrimalVars
+        fold.linOpUsedWithLoss = self.linOpUsedWithLoss
+        fold.dataProduct = self.dataProduct
+        fold.embeddedRegInUse = self.embeddedRegInUse
+        if self.embeddedRegInUse:
+            fold.embedded = copy(self.embedded)
+        fold.allRegularizers = [copy(reg) for reg in self.allRegularizers]
+        fold.numRegs = self.numRegs
+        fold.normalize = self.normalize
+        if self.normalize:
+            fold.scaling = self.scaling
+        fold.intercept = self.intercept
+        fold.dataAdded = True
+        fold.internalResetIterate = True
+        return fold
+
+    def __heldOutLoss(self,A,y,rows,Z):
+        # average loss on rows for each column of Z, with a single product
+        Atest = A[rows.start:rows.stop]
+        yTest = y[rows.start:rows.stop]
+        if (Z.ndim == 2) and (yTest.ndim == 1):
+            yTest = yTest[:,None]
+        vals = self.loss.value(Atest.dot(self.dataLinOp.matvec(Z)),yTest)
+        if vals is None:
+            raise Exception("Losses value function is not implemented. Cannot compute held-out losses.")
+        return npsum(vals,axis=0)/len(rows)
+
+    def __selectRegularizers(self,selection):
+        # the regularizers of the problem given by selection: None or False for
+        # none, True for all, or a regularizer or list of regularizers
+        candidates = [reg for reg in self.allRegularizers
+                      if not getattr(reg,'passThrough',False)]
+        if self.embeddedRegInUse:
+            candidates.append(self.embedded)
+
+        if (selection is None) or (selection is False):
+            return []
+        if selection is True:
+            return candidates
+        if isinstance(selection,Regularizer):
+            selection = [selection]
+        for reg in selection:
+            if not any(reg is cand for cand in candidates):
+                raise Exception("regularizer must be one already added to the problem")
+        return list(selection)
+
+    @staticmethod
+    def __scaleRegularizers(regs,targets,multiple):
+        for reg,target in zip(regs,targets):
+            reg.setScaling(multiple*target)
+
+    def __pathCoefficients(self):
+        # The final regularizer block holds the prox output, which has the
+        # exact zeros of the regularizer. Without ordinary regularizers,
+        # fall back on z.
+        if self.numRegs > 0:
+            out = npcopy(self.xreg[-1])
+        else:
+            out = npcopy(self.z)
+        if self.intercept == False:
+            out = out[1:]
+        return out
+
     def __equalizeStepsizes(self,equalizeStepsizes):
         if equalizeStepsizes:
             steps = getattr(self.process,"steps",None)
@@ -974,7 +1698,7 @@ class ProjSplitFit(object):
                 averageStep = sum(steps)/len(steps)
                 # set all regularizers new stepsize equal to averageStep, except
                 # the embedded regularizer (if any).
-                for reg in self.allRegularizers:
+                for reg in self.allRegularizers + self.regBlocks:
                     reg.setStep(averageStep)
 
 
@@ -984,48 +1708,74 @@ class ProjSplitFit(object):
         # To make this backwards compatible, we need to replace partition with just range(nblocks)
         # so that calls like thisSlice = partition[block] just return the block.
         if self.sparseObservationMtx:
+            if isinstance(self.A,list):
+                # already sliced by an earlier call to run()
+                self.A = self.Afull
+                self.yresponse = self.yresponseFull
             self.Afull = self.A
             self.yresponseFull = self.yresponse
             self.A = []
             self.yresponse = []
             for part in self.partition:
-                self.A.append(self.Afull[part])
+                if self.rowBlocks is None:
+                    self.A.append(self.Afull[part])
+                else:
+                    # the folds of crossValidate share the slices of their common blocks
+                    key = (part.start,part.stop)
+                    if key not in self.rowBlockCache:
+                        self.rowBlockCache[key] = self.Afull[part.start:part.stop]
+                    self.A.append(self.rowBlockCache[key])
                 self.yresponse.append(self.yresponseFull[part])
             self.partition = range(len(self.partition))
 
 
     @staticmethod
     def __addLinear(regObj,linearOp=None):
+        regObj.linearOpMatrix = None
         if linearOp is None:
-            regObj.linearOp = ut.MyLinearOperator(matvec=lambda x:x,rmatvec=lambda x:x)
+            regObj.linearOp = ut.IdentityOperator()
             regObj.linearOpUsed = False
+        elif isinstance(linearOp,ut.StructuredOperator):
+            # applied directly, writing into preallocated buffers
+            regObj.linearOp = linearOp
+            regObj.linearOpUsed = True
         else:
             try:
                 if not issparse(linearOp):
-                    regObj.linearOp = aslinearoperator(linearOp)
+                    regObj.linearOp = ut.MyDenseLinearOperator(linearOp)
                 else:
                     regObj.linearOp = ut.MySparseLinearOperator(linearOp)
                 regObj.linearOpUsed = True
+                # matrices may be stacked with those of other regularizers
+                if issparse(linearOp):
+                    regObj.linearOpMatrix = csr_matrix(linearOp)
+                elif isinstance(linearOp,ndarray) and (linearOp.ndim == 2):
+                    regObj.linearOpMatrix = linearOp
             except:
                 raise Exception("linearOp invalid. Use scipy.sparse.linalg.aslinearoperator or a scipy sparse matrix format")
 
     def __initializeVariables(self):
-        self.z = zeros(self.nPrimalVars+1)
-        self.zbar = zeros(self.nPrimalVars+1)
-        self.zbarWeighted = zeros(self.nPrimalVars+1)
-        self.Hz = zeros(self.nDataBlockVars)
-        self.xdata = zeros((self.nDataBlocks,self.nDataBlockVars))
-        self.ydata = zeros((self.nDataBlocks,self.nDataBlockVars))
-        self.wdata = zeros((self.nDataBlocks,self.nDataBlockVars))
+        # with several responses, every variable gets one column per response
+        if self.nResponses > 1:
+            cols = (self.nResponses,)
+        else:
+            cols = ()
+        self.z = zeros((self.nPrimalVars+1,)+cols)
+        self.zbar = zeros((self.nPrimalVars+1,)+cols)
+        self.zbarWeighted = zeros((self.nPrimalVars+1,)+cols)
+        self.Hz = zeros((self.nDataBlockVars,)+cols)
+        self.xdata = zeros((self.nDataBlocks,self.nDataBlockVars)+cols)
+        self.ydata = zeros((self.nDataBlocks,self.nDataBlockVars)+cols)
+        self.wdata = zeros((self.nDataBlocks,self.nDataBlockVars)+cols)
 
         # initialize the loss processor auxiliary data structures
         # if it has any
         self.process.initialize(self)
 
         if self.numRegs > 0:
-            self.udata = zeros((self.nDataBlocks,self.nDataBlockVars))
+            self.udata = zeros((self.nDataBlocks,self.nDataBlockVars)+cols)
         else:
-            self.udata = zeros((self.nDataBlocks - 1,self.nDataBlockVars))
+            self.udata = zeros((self.nDataBlocks - 1,self.nDataBlockVars)+cols)
 
         self.xreg = []
         self.yreg = []
@@ -1033,7 +1783,7 @@ class ProjSplitFit(object):
         self.ureg = []
 
         i = 0
-        for reg in self.allRegularizers:
+        for reg in self.regBlocks:
             if i == self.numRegs - 1:
                     nRegularizerVars = self.nPrimalVars + 1 # extra 1 for intercept ONLY for last block
             elif reg.linearOpUsed:
@@ -1041,12 +1791,66 @@ class ProjSplitFit(object):
             else:
                 nRegularizerVars = self.nPrimalVars
 
-            self.xreg.append(zeros(nRegularizerVars))
-            self.yreg.append(zeros(nRegularizerVars))
-            self.wreg.append(zeros(nRegularizerVars))
+            self.xreg.append(zeros((nRegularizerVars,)+cols))
+            self.yreg.append(zeros((nRegularizerVars,)+cols))
+            self.wreg.append(zeros((nRegularizerVars,)+cols))
             i += 1
             if i != self.numRegs:
-                self.ureg.append(zeros(nRegularizerVars))
+                self.ureg.append(zeros((nRegularizerVars,)+cols))
+
+    def __getColumnState(self):
+        # all arrays with one column (last axis) per response
+        state = [self.z,self.zbar,self.zbarWeighted,self.Hz,self.xdata,self.ydata,
+                 self.wdata,self.udata,self.primalErr,self.dualErr]
+        state += self.xreg + self.yreg + self.wreg + self.ureg
+        if self.sparseObservationMtx:
+            state += self.yresponse + [self.yresponseFull]
+        else:
+            state.append(self.yresponse)
+        return state + self.process.getColumnState()
+
+    def __setColumnState(self,state):
+        (self.z,self.zbar,self.zbarWeighted,self.Hz,self.xdata,self.ydata,
+         self.wdata,self.udata,self.primalErr,self.dualErr) = state[:10]
+        i = 10
+        for regVars in [self.xreg,self.yreg,self.wreg,self.ureg]:
+            regVars[:] = state[i:i+len(regVars)]
+            i += len(regVars)
+        if self.sparseObservationMtx:
+            self.yresponse = state[i:i+self.nDataBlocks]
+            self.yresponseFull = state[i+self.nDataBlocks]
+            i += self.nDataBlocks + 1
+        else:
+            self.yresponse = state[i]
+            i += 1
+        self.process.setColumnState(state[i:])
+
+    def __freezeColumns(self,keep):
+        # stop iterating the responses whose entries of keep are False.
+        # The full arrays are set aside on the first call; later calls write
+        # the frozen columns back into them.
+        state = self.__getColumnState()
+        if self.fullColumnState is None:
+            self.fullColumnState = state
+        else:
+            frozen = self.activeColumns[~keep]
+            for full,work in zip(self.fullColumnState,state):
+                full[...,frozen] = work[...,~keep]
+        self.__setColumnState([work[...,keep] for work in state])
+        self.activeColumns = self.activeColumns[keep]
+        if isinstance(self.A,ut.BatchedMatrix):
+            self.A = self.Abatch.selectProblems(self.activeColumns)
+
+    def __restoreColumns(self):
+        # write the responses still being iterated back into the full arrays
+        if self.fullColumnState is None:
+            return
+        for full,work in zip(self.fullColumnState,self.__getColumnState()):
+            full[...,self.activeColumns] = work
+        self.__setColumnState(self.fullColumnState)
+        self.fullColumnState = None
+        if isinstance(self.A,ut.BatchedMatrix):
+            self.A = self.Abatch
 
     def __setBlocks(self,nblocks):
         try:
@@ -1064,12 +1868,13 @@ class ProjSplitFit(object):
             numBlocks = 1
         return numBlocks
 
-    def __setUpRegularizers(self):
+    def __setUpRegularizers(self,fuse=False):
 
         if self.embeddedRegInUse == False:
             # if no embedded reg added, create an artificial embedded reg
             # with a "pass-through" prox
-            self.embedded = Regularizer(lambda x,scale:x,lambda x:0)
+            self.embedded = Regularizer(lambda x,scale:x,lambda x:0,vectorized=True)
+            self.embedded.passThrough = True
         else:
             if self.embedded.getStep() != self.process.getStep():
                 print("WARNING: embedded regularizer must use the same stepsize as the Loss update process")
@@ -1081,6 +1886,11 @@ class ProjSplitFit(object):
             self.embeddedScaling = self.embedded.getScaling()
             self.embedded.setScaling(self.embeddedScaling/self.nDataBlocks)
 
+        # undo any fusing of regularizers by an earlier call
+        previousBlocks = len(self.regBlocks)
+        self.numRegs = len(self.allRegularizers)
+        self.regBlocks = list(self.allRegularizers)
+
         if self.numRegs == 0:
             if self.linOpUsedWithLoss == False:
                 self.numPSblocks = self.nDataBlocks
@@ -1088,7 +1898,9 @@ class ProjSplitFit(object):
                 # if there are no regularizers and the data term is composed
                 # with a linear operator, we must add a dummy regularizer
                 # which has a pass-through prox and 0 value
-                self.addRegularizer(Regularizer(lambda x,scale: x, lambda x: 0))
+                passThrough = Regularizer(lambda x,scale: x, lambda x: 0,vectorized=True)
+                passThrough.passThrough = True
+                self.addRegularizer(passThrough)
 
         if self.numRegs != 0:
             # if all nonembedded regularizers have a linear op
@@ -1113,17 +1925,42 @@ class ProjSplitFit(object):
                     step = self.allRegularizers[0].getStep()
                 else:
                     step = 1.0
-                self.addRegularizer(Regularizer(lambda x,scale: x, lambda x: 0,step=step))
+                passThrough = Regularizer(lambda x,scale: x, lambda x: 0,step=step,
+                                          vectorized=True)
+                passThrough.passThrough = True
+                self.addRegularizer(passThrough)
+
+            # if fusing, the regularizers without linear operators go into as
+            # few blocks as their proxes allow, the last block being one of them
+            identityRegs = [reg for reg in self.allRegularizers if not reg.linearOpUsed]
+            fused = fuseRegularizerList(identityRegs,self.nPrimalVars) if fuse else identityRegs
+            if len(fused) < len(identityRegs):
+                for reg in fused:
+                    if hasattr(reg,'parts'):
+                        self.__addLinear(reg)
+                self.regBlocks = [reg for reg in self.allRegularizers if reg.linearOpUsed] + fused
+            else:
+                self.regBlocks = list(self.allRegularizers)
+            if previousBlocks != len(self.regBlocks):
+                # the blocks differ from those of the previous run
+                self.internalResetIterate = True
+            self.numRegs = len(self.regBlocks)
 
             self.numPSblocks = self.nDataBlocks + self.numRegs
 
 
     def __updateLossBlocks(self,blockActivation,blocksPerIteration):
 
-        self.Hz = self.dataLinOp.matvec(self.z)
+        if not self.linOpUsedWithLoss:
+            self.Hz = self.z
+        elif self.Hz.shape == (self.nDataBlockVars,) + self.z.shape[1:]:
+            self.dataLinOp.matvec(self.z,out=self.Hz)
+        else:
+            self.Hz = self.dataLinOp.matvec(self.z)
 
         if blockActivation == "greedy":
-            phis = npsum((self.Hz - self.xdata)*(self.ydata - self.wdata),axis=1)
+            phis = npsum(((self.Hz - self.xdata)*(self.ydata - self.wdata)).reshape(self.nDataBlocks,-1),
+                         axis=1)
 
             if phis.min() >= 0:
                 activeBlocks = choice(range(self.nDataBlocks),blocksPerIteration,replace=False)
@@ -1149,41 +1986,39 @@ class ProjSplitFit(object):
         for i in activeBlocks:
             self.process.update(self,i)
 
-        self.primalErr = norm(self.Hz - self.xdata,ord=2,axis=1).max()
-        self.dualErr =   norm(self.ydata - self.wdata,ord=2,axis=1).max()
+        # one value per response if there are several
+        self.primalErr = norm(self.Hz - self.xdata,ord=2,axis=1).max(axis=0)
+        self.dualErr =   norm(self.ydata - self.wdata,ord=2,axis=1).max(axis=0)
 
     def __updateRegularizerBlocks(self):
 
+        Gz = self.__regProducts(self.z[1:])
         for i in range(self.numRegs-1):
-            reg = self.allRegularizers[i]
-            Giz = reg.linearOp.matvec(self.z[1:])
+            reg = self.regBlocks[i]
+            Giz = Gz[i]
             t = Giz + reg.step*self.wreg[i]
             self.xreg[i] = reg.getProx(t)
             self.yreg[i] = reg.step**(-1)*(t - self.xreg[i])
-            primal_err_i = norm(Giz - self.xreg[i],2)
-            if self.primalErr<primal_err_i:
-                self.primalErr = primal_err_i
-            dual_err_i = norm(self.wreg[i] - self.yreg[i],2)
-            if self.dualErr<dual_err_i:
-                self.dualErr = dual_err_i
+            primal_err_i = norm(Giz - self.xreg[i],2,axis=0)
+            self.primalErr = maximum(self.primalErr,primal_err_i)
+            dual_err_i = norm(self.wreg[i] - self.yreg[i],2,axis=0)
+            self.dualErr = maximum(self.dualErr,dual_err_i)
 
 
         # update coefficients corresponding to the last block
         # including the intercept term
         if self.numRegs > 0:
-            reg = self.allRegularizers[-1]
+            reg = self.regBlocks[-1]
             t = self.z + reg.step*self.wreg[-1]
             self.xreg[-1][1:] = reg.getProx(t[1:])
             self.xreg[-1][0] = t[0]
             self.yreg[-1] = reg.step**(-1)*(t - self.xreg[-1])
 
-            primal_err_i = norm(self.xreg[-1]-self.z,2)
-            if self.primalErr<primal_err_i:
-                self.primalErr = primal_err_i
+            primal_err_i = norm(self.xreg[-1]-self.z,2,axis=0)
+            self.primalErr = maximum(self.primalErr,primal_err_i)
 
-            dual_err_i = norm(self.yreg[-1]-self.wreg[-1],2)
-            if self.dualErr<dual_err_i:
-                self.dualErr = dual_err_i
+            dual_err_i = norm(self.yreg[-1]-self.wreg[-1],2,axis=0)
+            self.dualErr = maximum(self.dualErr,dual_err_i)
 
 
 
@@ -1191,35 +2026,49 @@ class ProjSplitFit(object):
 
         # compute u and v for data blocks
         if self.numRegs > 0:
-            self.udata = self.xdata - self.dataLinOp.matvec(self.xreg[-1])
+            self.udata = self.xdata - self.__applyDataOp(self.xreg[-1])
         else:
             # if there are no regularizers, the last block corresponds to the
             # last data block. Further, dataLinOp must be the identity
             self.udata = self.xdata[:-1] - self.xdata[-1]
 
-        vin = sum(self.ydata)
-        v = self.dataLinOp.rmatvec(vin)
+        # v is updated in place below, so the adjoint gets a fresh array
+        v = sum(self.ydata)
+        if self.linOpUsedWithLoss:
+            v = self.dataLinOp.rmatvec(v)
 
         # compute u and v for regularizer blocks except the final regularizer
-        for i in range(self.numRegs - 1):
-            Gxn = self.allRegularizers[i].linearOp.matvec(self.xreg[-1][1:])
-            self.ureg[i] = self.xreg[i] - Gxn
-            Gstary = self.allRegularizers[i].linearOp.rmatvec(self.yreg[i])
-            v += concatenate((array([0.0]),Gstary))
+        if self.numRegs > 1:
+            Gxn = self.__regProducts(self.xreg[-1][1:])
+            for i in range(self.numRegs - 1):
+                self.ureg[i] = self.xreg[i] - Gxn[i]
+            # the intercept entry of v gets nothing from the regularizers
+            v[1:] += self.__regAdjointSum(self.yreg[:-1])
 
         # compute v for final regularizer block
         if self.numRegs>0:
             v += self.yreg[-1]
 
-        # compute pi
-        pi = norm(self.udata,'fro')**2 + self.gamma**(-1)*norm(v,2)**2
+        # compute pi. Sums run over all axes but the last one when there
+        # are several responses, giving one pi, phi and tau per response
+        pi = npsum(self.udata**2,axis=(0,1)) + self.gamma**(-1)*npsum(v**2,axis=0)
         for i in range(self.numRegs - 1):
-            pi += norm(self.ureg[i],2)**2
+            pi += npsum(self.ureg[i]**2,axis=0)
 
         # compute phi
         tau = 0.0
 
-        if pi > 0:
+        if self.nResponses > 1:
+            if (pi > 0).any():
+                phi = self.__getPhi(v)
+                tau = where((pi > 0) & (phi > 0),phi/where(pi > 0,pi,1.0),0.0)
+                self.z = self.z - self.gamma**(-1)*tau*v
+                if len(self.wdata) + len(self.wreg) > 1:
+                    self.__updatew(tau)
+            else:
+                phi = "converged"
+
+        elif pi > 0:
             phi = self.__getPhi(v)
 
 
@@ -1239,30 +2088,123 @@ class ProjSplitFit(object):
 
         return phi,tau
 
+    def __applyRegOp(self,i,x,adjoint=False):
+        # G_i x, or G_i^* x if adjoint, for the i-th regularizer. Structured
+        # operators write into a buffer kept from one iteration to the next,
+        # so the result must be used before the next call for the same
+        # regularizer and direction.
+        if not self.regBlocks[i].linearOpUsed:
+            return x
+        linearOp = self.regBlocks[i].linearOp
+        if not isinstance(linearOp,ut.StructuredOperator):
+            if adjoint:
+                return linearOp.rmatvec(x)
+            return linearOp.matvec(x)
+
+        outShape = (linearOp.shape[0 if not adjoint else 1],) + x.shape[1:]
+        out = self.opBuffers.get((i,adjoint))
+        if (out is None) or (out.shape != outShape):
+            out = zeros(outShape)
+            self.opBuffers[(i,adjoint)] = out
+        if adjoint:
+            return linearOp.rmatvec(x,out=out)
+        return linearOp.matvec(x,out=out)
+
+    def __stackRegularizerOps(self):
+        # The regularizers other than the last whose linearOp is a matrix are
+        # applied together through their matrices stacked one above the
+        # other, with a transposed copy in CSR format for the adjoint, so that
+        # each product with all of them is one pass over one matrix.
+        self.stackedRegs = [i for i in range(self.numRegs - 1)
+                            if self.regBlocks[i].linearOpUsed
+                            and (getattr(self.regBlocks[i],'linearOpMatrix',None) is not None)]
+        if len(self.stackedRegs) == 0:
+            self.stackedOp = None
+            return
+        matrices = [self.regBlocks[i].linearOpMatrix for i in self.stackedRegs]
+        self.stackOffsets = cumsum([0] + [M.shape[0] for M in matrices])
+        if any(issparse(M) for M in matrices):
+            G = csr_matrix(vstack(matrices))
+            self.stackedOp = (G,csr_matrix(G.T))
+        else:
+            G = npvstack(matrices)
+            self.stackedOp = (G,G.T)
+
+    def __regProducts(self,x):
+        # G_i x for each regularizer but the last
+        products = [None]*(self.numRegs - 1)
+        if self.stackedOp is not None:
+            Gx = self.stackedOp[0].dot(x)
+            for j,i in enumerate(self.stackedRegs):
+                products[i] = Gx[self.stackOffsets[j]:self.stackOffsets[j+1]]
+        for i in range(self.numRegs - 1):
+            if products[i] is None:
+                products[i] = self.__applyRegOp(i,x)
+        return products
+
+    def __regAdjointSum(self,vectors):
+        # the sum of G_i^* vectors[i] over the regularizers but the last
+        if self.stackedOp is not None:
+            out = self.stackedOp[1].dot(concatenate([vectors[i] for i in self.stackedRegs]))
+        else:
+            out = zeros((self.nPrimalVars,) + vectors[0].shape[1:])
+        for i in range(self.numRegs - 1):
+            if (self.stackedOp is None) or (i not in self.stackedRegs):
+                out += self.__applyRegOp(i,vectors[i],adjoint=True)
+        return out
+
+    def __applyDataOp(self,x):
+        # H x for the data operator, into a buffer used only here; the
+        # identity is skipped
+        if not self.linOpUsedWithLoss:
+            return x
+        outShape = (self.nDataBlockVars,) + x.shape[1:]
+        out = self.opBuffers.get('data')
+        if (out is None) or (out.shape != outShape):
+            out = zeros(outShape)
+            self.opBuffers['data'] = out
+        return self.dataLinOp.matvec(x,out=out)
+
+    @staticmethod
+    def __padIntercept(x):
+        # prepend a zero intercept entry (a row of zeros for several responses)
+        return concatenate((zeros((1,)+x.shape[1:]),x))
+
 
 
     def __getPhi(self,v):
-        phi = self.z.dot(v)
+        phi = npsum(self.z*v,axis=0)
 
         if len(self.wdata) + len(self.wreg) > 1:
             if len(self.wreg) == 0:
-                phi += npsum(self.udata*self.wdata[0:(self.numPSblocks-1)])
+                phi += npsum(self.udata*self.wdata[0:(self.numPSblocks-1)],axis=(0,1))
             else:
-                phi += npsum(self.udata*self.wdata)
+                phi += npsum(self.udata*self.wdata,axis=(0,1))
 
             for i in range(self.numRegs - 1):
-                phi += self.ureg[i].dot(self.wreg[i])
+                phi += npsum(self.ureg[i]*self.wreg[i],axis=0)
 
-        phi -= npsum(self.xdata*self.ydata)
+        phi -= npsum(self.xdata*self.ydata,axis=(0,1))
 
         for i in range(self.numRegs):
-            phi -= self.xreg[i].dot(self.yreg[i])
+            phi -= npsum(self.xreg[i]*self.yreg[i],axis=0)
 
         return phi
 
     def __getLoss(self,z):
-        Hz = self.dataLinOp.matvec(z)
-        if self.sparseObservationMtx:
+        if self.linOpUsedWithLoss:
+            Hz = self.dataLinOp.matvec(z)
+        else:
+            Hz = z
+        if self.rowBlocks is not None:
+            # only the rows in the blocks are part of the problem
+            getVal = [self.loss.value(self.A[part].dot(Hz),self.yresponse[part])
+                      for part in self.partition]
+            if getVal[0] is None:
+                getVal = None
+            else:
+                getVal = concatenate(getVal)
+        elif self.sparseObservationMtx:
             AHz = self.Afull.dot(Hz)
 
             getVal = self.loss.value(AHz,self.yresponseFull)
@@ -1273,7 +2215,7 @@ class ProjSplitFit(object):
             print("ERROR: If you don't implement a losses value func, set getHistory to")
             print("False and do not compute objective values")
             raise Exception("Losses value function is not implemented. Cannot compute objective values.")
-        currentLoss = (1.0/self.nrowsOfA)*sum(getVal)
+        currentLoss = (1.0/self.nrowsOfA)*npsum(getVal,axis=0)
         return currentLoss,Hz
 
     def __updatew(self,tau):
@@ -1284,11 +2226,12 @@ class ProjSplitFit(object):
                 self.wdata[-1] = -npsum(self.wdata[0:(self.nDataBlocks-1)],axis=0)
             else:
                 self.wdata = self.wdata - tau*self.udata
-                negsumw = -npsum(self.wdata,axis=0)
-                GstarNegSumw = self.dataLinOp.rmatvec(negsumw)
+                GstarNegSumw = -npsum(self.wdata,axis=0)
+                if self.linOpUsedWithLoss:
+                    GstarNegSumw = self.dataLinOp.rmatvec(GstarNegSumw)
                 for i in range(self.numRegs - 1):
                     self.wreg[i] = self.wreg[i] - tau*self.ureg[i]
-                    Gstarw = self.allRegularizers[i].linearOp.rmatvec(self.wreg[i])
-                    GstarNegSumw -= concatenate((array([0.0]),Gstarw))
+                if self.numRegs > 1:
+                    GstarNegSumw[1:] -= self.__regAdjointSum(self.wreg[:-1])
 
                 self.wreg[-1] = GstarNegSumw
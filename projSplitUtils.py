@@ -8,18 +8,259 @@ Utilities Methods
 #-----------------------------------------------------------------------------
 #Miscelaneous utilities
 
-from numpy import concatenate
 from numpy import array
+from numpy import matmul
+from numpy import zeros
+from numpy import subtract
+from numpy import take
+from numpy import unique
+from numpy import ndarray
+from numpy import dot
+from numpy import ascontiguousarray
+from numpy import arange
+
+from abc import ABCMeta
+from abc import abstractmethod
+
+from scipy.sparse.linalg import LinearOperator
 
 from scipy.sparse.linalg import aslinearoperator
 from scipy.sparse import issparse
 from scipy.sparse import csr_matrix
         
 def totalVariation1d(n):
-    pass
+    # Kept for compatibility: the (n-1) x n first difference operator
+    # Difference1d(n) below. Composing L1 with it gives the 1D total variation
+    # (fused lasso) penalty; regularizers.TV1d computes the same penalty with
+    # an exact prox and no extra block.
+    return Difference1d(n)
 
 def dropFirst(n):
-    pass
+    # Kept for compatibility: Subset(n,slice(1,n)) below, which discards the
+    # first entry of a vector, for example to leave one coefficient
+    # unregularized.
+    return Subset(n,slice(1,n))
+
+#-----------------------------------------------------------------------------
+# Structured linear operators
+#
+# Matrix-free operators for common regularizer compositions. They are scipy
+# LinearOperators, so they may be used anywhere one is accepted, but their
+# matvec and rmatvec also take an optional preallocated output array "out",
+# which ProjSplitFit uses to apply them without allocating on every
+# iteration. 2D arrays are treated as one column per response.
+
+class StructuredOperator(LinearOperator,metaclass=ABCMeta):
+    # Subclasses must implement _apply and _applyAdjoint; a subclass missing
+    # either cannot be instantiated.
+    def __init__(self,shape):
+        super().__init__(dtype=float,shape=shape)
+
+    @abstractmethod
+    def _apply(self,x,out):
+        # write the product with x into out
+        pass
+
+    @abstractmethod
+    def _applyAdjoint(self,u,out):
+        # write the product of the adjoint with u into out
+        pass
+
+    def matvec(self,x,out=None):
+        if (out is None) or not out.flags.c_contiguous:
+            result = zeros((self.shape[0],) + x.shape[1:])
+            self._apply(x,result)
+            if out is None:
+                return result
+            out[:] = result
+            return out
+        self._apply(x,out)
+        return out
+
+    def rmatvec(self,u,out=None):
+        if (out is None) or not out.flags.c_contiguous:
+            result = zeros((self.shape[1],) + u.shape[1:])
+            self._applyAdjoint(u,result)
+            if out is None:
+                return result
+            out[:] = result
+            return out
+        self._applyAdjoint(u,out)
+        return out
+
+    def _matvec(self,x):
+        return self.matvec(x)
+
+    def _rmatvec(self,u):
+        return self.rmatvec(u)
+
+    def _matmat(self,X):
+        return self.matvec(X)
+
+    def _rmatmat(self,U):
+        return self.rmatvec(U)
+
+
+class Difference1d(StructuredOperator):
+    # (n-1) x n first differences, (Dx)_i = x_i - x_{i+1}
+    def __init__(self,n):
+        super().__init__((n-1,n))
+
+    def _apply(self,x,out):
+        subtract(x[:-1],x[1:],out=out)
+
+    def _applyAdjoint(self,u,out):
+        out[:-1] = u
+        out[-1] = 0.0
+        out[1:] -= u
+
+
+class Difference2d(StructuredOperator):
+    # First differences of an nrows x ncols image stored row by row in a
+    # vector: the differences down the columns, x[i,j] - x[i+1,j], followed by
+    # those along the rows, x[i,j] - x[i,j+1]. Composed with L1 this is the
+    # anisotropic total variation.
+    def __init__(self,nrows,ncols):
+        self.imageShape = (nrows,ncols)
+        self.nVertical = (nrows-1)*ncols
+        super().__init__((self.nVertical + nrows*(ncols-1),nrows*ncols))
+
+    def _apply(self,x,out):
+        nrows,ncols = self.imageShape
+        rest = x.shape[1:]
+        X = x.reshape(self.imageShape + rest)
+        subtract(X[:-1],X[1:],out=out[:self.nVertical].reshape((nrows-1,ncols) + rest))
+        subtract(X[:,:-1],X[:,1:],out=out[self.nVertical:].reshape((nrows,ncols-1) + rest))
+
+    def _applyAdjoint(self,u,out):
+        nrows,ncols = self.imageShape
+        rest = u.shape[1:]
+        vertical = u[:self.nVertical].reshape((nrows-1,ncols) + rest)
+        horizontal = u[self.nVertical:].reshape((nrows,ncols-1) + rest)
+        X = out.reshape(self.imageShape + rest)
+        X[:] = 0.0
+        X[:-1] += vertical
+        X[1:] -= vertical
+        X[:,:-1] += horizontal
+        X[:,1:] -= horizontal
+
+
+class Subset(StructuredOperator):
+    # Selects the entries of a vector of length n listed in indices (a slice
+    # or distinct integers); applied to z, this is a subset of the columns of
+    # the data matrix. Slices are applied without any indexing arrays.
+    def __init__(self,n,indices):
+        if isinstance(indices,range) and (indices.step == 1):
+            indices = slice(indices.start,indices.stop)
+        if isinstance(indices,slice):
+            nSelected = len(range(*indices.indices(n)))
+        else:
+            indices = array(indices,dtype=int).ravel()
+            if (len(indices) > 0) and ((indices.min() < 0) or (indices.max() >= n)):
+                raise Exception("Subset: index outside expected range")
+            if len(unique(indices)) != len(indices):
+                raise Exception("Subset: indices must be distinct")
+            nSelected = len(indices)
+        self.indices = indices
+        super().__init__((nSelected,n))
+
+    def _apply(self,x,out):
+        if isinstance(self.indices,slice):
+            out[:] = x[self.indices]
+        else:
+            take(x,self.indices,axis=0,out=out)
+
+    def _applyAdjoint(self,u,out):
+        out[:] = 0.0
+        out[self.indices] = u
+
+
+class BlockDiagonal(StructuredOperator):
+    # diag(G_1,...,G_p): G_k acts on the k-th consecutive piece of the input.
+    # The G_k may be structured operators, 2D arrays, sparse matrices or
+    # scipy LinearOperators.
+    def __init__(self,operators):
+        self.operators = [_asOperand(G) for G in operators]
+        rows = [0]
+        cols = [0]
+        for G in self.operators:
+            rows.append(rows[-1] + G.shape[0])
+            cols.append(cols[-1] + G.shape[1])
+        self.rows = rows
+        self.cols = cols
+        super().__init__((rows[-1],cols[-1]))
+
+    def _apply(self,x,out):
+        for k,G in enumerate(self.operators):
+            outk = out[self.rows[k]:self.rows[k+1]]
+            xk = x[self.cols[k]:self.cols[k+1]]
+            if isinstance(G,StructuredOperator):
+                G._apply(xk,outk)
+            else:
+                outk[:] = G.dot(xk)
+
+    def _applyAdjoint(self,u,out):
+        for k,G in enumerate(self.operators):
+            outk = out[self.cols[k]:self.cols[k+1]]
+            uk = u[self.rows[k]:self.rows[k+1]]
+            if isinstance(G,StructuredOperator):
+                G._applyAdjoint(uk,outk)
+            else:
+                outk[:] = G.T.dot(uk)
+
+
+class Kronecker(StructuredOperator):
+    # The Kronecker product B (x) C, applied as x -> vec(B X C^T) where X is x
+    # reshaped row by row to B.shape[1] x C.shape[1], so that neither the
+    # product nor anything larger than X is formed. B and C may be 2D arrays,
+    # sparse matrices or LinearOperators.
+    def __init__(self,B,C):
+        self.B = _asOperand(B)
+        self.C = _asOperand(C)
+        super().__init__((self.B.shape[0]*self.C.shape[0],
+                          self.B.shape[1]*self.C.shape[1]))
+
+    @staticmethod
+    def _product(B,C,x,out):
+        if x.ndim == 2:
+            # one column per response
+            for j in range(x.shape[1]):
+                out[:,j] = B.dot(C.dot(x[:,j].reshape(B.shape[1],C.shape[1]).T).T).ravel()
+        else:
+            out[:] = B.dot(C.dot(x.reshape(B.shape[1],C.shape[1]).T).T).ravel()
+
+    def _apply(self,x,out):
+        self._product(self.B,self.C,x,out)
+
+    def _applyAdjoint(self,u,out):
+        self._product(self.B.T,self.C.T,u,out)
+
+
+def _productInto(G,x,out,adjoint=False):
+    # out[:] = G x, or G^T x if adjoint, for G from _asOperand, without a
+    # temporary when G is structured or a dense array
+    if isinstance(G,StructuredOperator):
+        if adjoint:
+            G.rmatvec(x,out=out)
+        else:
+            G.matvec(x,out=out)
+    elif isinstance(G,ndarray) and out.flags.c_contiguous:
+        dot(G.T if adjoint else G,x,out=out)
+    elif adjoint:
+        out[:] = G.T.dot(x)
+    else:
+        out[:] = G.dot(x)
+
+def _asOperand(G):
+    # structured operators, dense arrays and sparse matrices (in CSR format)
+    # are used as they are, anything else through scipy's aslinearoperator
+    if isinstance(G,StructuredOperator):
+        return G
+    if issparse(G):
+        return csr_matrix(G)
+    if isinstance(G,ndarray):
+        return G
+    return aslinearoperator(G)
 
 class MyLinearOperator():
     # MyLinearOperator allows us to define "pass through" identity operators
@@ -32,17 +273,50 @@ class MyLinearOperator():
         self.rmatvec=rmatvec
         self.shape = shape
         
-def expandOperator(linearOp):
-    if not issparse(linearOp):
-        linearOp = aslinearoperator(linearOp)
-        expandMatVec = lambda x: concatenate((array([x[0]]),linearOp.matvec(x[1:])))
-        expandrMatVec = lambda x: concatenate((array([x[0]]),linearOp.rmatvec(x[1:])))
-    else:
-        linearOp = csr_matrix(linearOp)
-        expandMatVec = lambda x: concatenate((array([x[0]]), linearOp.dot(x[1:])))
-        expandrMatVec = lambda x: concatenate((array([x[0]]), linearOp.T.dot(x[1:])))
+class IdentityOperator(MyLinearOperator):
+    # The identity, of whatever size. ProjSplitFit recognizes it and skips it
+    # altogether rather than calling matvec and rmatvec, which return their
+    # input itself.
+    def __init__(self):
+        super().__init__(self._identity,self._identity)
+
+    @staticmethod
+    def _identity(x,out=None):
+        if out is None:
+            return x
+        out[:] = x
+        return out
 
-    return expandMatVec,expandrMatVec
+class InterceptOperator(object):
+    # The data operator z -> (z[0], H z[1:]) for a linearOp H composed with
+    # the data: the intercept z[0] passes through. Slicing rather than
+    # indexing keeps 2D arrays with one column per response working. matvec
+    # and rmatvec write into out if it is given, and otherwise allocate the
+    # output once, without concatenating.
+    def __init__(self,linearOp):
+        self.H = _asOperand(linearOp)
+        self.shape = (self.H.shape[0]+1,self.H.shape[1]+1)
+
+    def matvec(self,x,out=None):
+        if out is None:
+            out = zeros((self.shape[0],) + x.shape[1:])
+        out[0] = x[0]
+        _productInto(self.H,x[1:],out[1:])
+        return out
+
+    def rmatvec(self,u,out=None):
+        if out is None:
+            out = zeros((self.shape[1],) + u.shape[1:])
+        out[0] = u[0]
+        _productInto(self.H,u[1:],out[1:],adjoint=True)
+        return out
+
+def MyDenseLinearOperator(linearOp):
+    # LinearOperator.dot applies matvec to vectors and matmat to 2D arrays
+    # with one column per response
+    linearOp = aslinearoperator(linearOp)
+    adjoint = linearOp.H
+    return MyLinearOperator(linearOp.dot,adjoint.dot,linearOp.shape)
 
 def MySparseLinearOperator(linearOp):
     linearOp = csr_matrix(linearOp)
@@ -51,6 +325,39 @@ def MySparseLinearOperator(linearOp):
     shape = linearOp.shape
     return MyLinearOperator(matvec,rmatvec,shape)
 
+def composeMatrices(A,H):
+    # The product A H of a data matrix and the linearOp composed with it. H
+    # may be a 2D array, a sparse matrix or a LinearOperator; the product is
+    # sparse (CSR) only if both A and H are.
+    if issparse(A) and issparse(H):
+        return csr_matrix(A.dot(H))
+    if not (issparse(H) or isinstance(H,ndarray)):
+        # a LinearOperator, applied to the rows of A through its adjoint
+        H = aslinearoperator(H)
+        At = A.T.toarray() if issparse(A) else A.T
+        return ascontiguousarray(H.H.dot(At).T)
+    if issparse(H):
+        return ascontiguousarray(H.T.dot(A.T).T)
+    return ascontiguousarray(A.dot(H))
+
+def productIsCheaper(A,H):
+    # Whether multiplying by A H formed once costs no more than multiplying
+    # by H and then A, counting nonzeros (all entries of dense arrays). For
+    # sparse A and H, nnz(A H) is bounded by sum_k nnz(A[:,k]) nnz(H[k,:]).
+    if not (issparse(H) or isinstance(H,ndarray)):
+        return False
+    def cost(M):
+        return M.nnz if issparse(M) else M.size
+    nrows = A.shape[0]
+    ncols = H.shape[1]
+    if issparse(A) and issparse(H):
+        colCounts = csr_matrix(A).getnnz(axis=0)
+        rowCounts = csr_matrix(H).getnnz(axis=1)
+        productCost = min(nrows*ncols,int(colCounts.dot(rowCounts)))
+    else:
+        productCost = nrows*ncols
+    return productCost <= cost(A) + cost(H)
+
 def createApartition(nrows,n_partitions,sparseMtx):
     
     if nrows%n_partitions == 0:
@@ -86,3 +393,138 @@ def createApartition(nrows,n_partitions,sparseMtx):
 
 
 
+
+
+class BatchedMatrix(object):
+    # A stack of equally shaped dense matrices, one per independent problem,
+    # held as an array of shape (nproblems,nrows,ncols). Products are taken
+    # with arrays holding one column per problem, so that
+    # BatchedMatrix(M).dot(X)[:,j] == M[j].dot(X[:,j]).
+    def __init__(self,M):
+        self.M = M
+        self.shape = M.shape[1:]
+
+    def __getitem__(self,rows):
+        if isinstance(rows,range) and (rows.step == 1):
+            # basic slicing avoids copying the rows
+            rows = slice(rows.start,rows.stop)
+        return BatchedMatrix(self.M[:,rows,:])
+
+    def dot(self,X):
+        if X.ndim == 1:
+            # the same vector for every problem
+            return matmul(self.M,X).T
+        return matmul(self.M,X.T[:,:,None])[:,:,0].T
+
+    def selectProblems(self,keep):
+        return BatchedMatrix(self.M[keep])
+
+    @property
+    def T(self):
+        return _BatchedTranspose(self.M)
+
+
+class _BatchedTranspose(object):
+    def __init__(self,M):
+        self.M = M
+
+    def dot(self,Y):
+        return matmul(Y.T[:,None,:],self.M)[:,0,:].T
+
+
+#-----------------------------------------------------------------------------
+# Matrix-free observations
+#
+# An ObservationOperator stands in for the observation matrix passed to
+# addData when it is too large, or too structured, to be stored. Subclasses
+# implement products of a block of rows with a vector; rows is either a
+# slice or a 1D array of row indices. With several responses, x and u are 2D
+# arrays with one column per response.
+
+class ObservationOperator(metaclass=ABCMeta):
+    # Subclasses must implement blockMatvec and blockRmatvec; a subclass
+    # missing either cannot be instantiated.
+    def __init__(self,shape):
+        self.shape = shape
+
+    @abstractmethod
+    def blockMatvec(self,rows,x):
+        # A[rows] x
+        pass
+
+    @abstractmethod
+    def blockRmatvec(self,rows,u):
+        # A[rows]^T u
+        pass
+
+    def rowNorms(self,rows):
+        # the 2-norms of the rows of A[rows], or None if not available
+        return None
+
+    def columnNorms(self):
+        # the 2-norms of the columns of A, or None if not available.
+        # Needed to normalize the observations.
+        return None
+
+
+class ObservationMatrix(object):
+    # The matrix ProjSplitFit works with for an ObservationOperator: the
+    # intercept column followed by the columns of the operator, each
+    # multiplied by colScale (the normalization) if it is not None. Indexing
+    # rows, as with a matrix, returns the same matrix restricted to them
+    # without any products being taken.
+    def __init__(self,op,intercept,colScale=None,rows=None):
+        self.op = op
+        self.intercept = intercept
+        self.colScale = colScale
+        self.rows = slice(0,op.shape[0]) if rows is None else rows
+        nrows = len(self.rows) if isinstance(self.rows,ndarray) else \
+            len(range(op.shape[0])[self.rows])
+        self.shape = (nrows,op.shape[1]+1)
+
+    def __getitem__(self,rows):
+        if isinstance(rows,range) and (rows.step == 1):
+            rows = slice(rows.start,rows.stop)
+        elif not isinstance(rows,slice):
+            rows = array(rows,dtype=int)
+        if isinstance(self.rows,slice) and isinstance(rows,slice) and (rows.step in [None,1]):
+            start,stop,_ = rows.indices(self.shape[0])
+            rows = slice(self.rows.start+start,self.rows.start+stop)
+        else:
+            rows = arange(self.op.shape[0])[self.rows][rows]
+        return ObservationMatrix(self.op,self.intercept,self.colScale,rows)
+
+    def dot(self,x):
+        v = x[1:]
+        if self.colScale is not None:
+            v = v*self.colScale.reshape((-1,) + (1,)*(x.ndim-1))
+        out = self.op.blockMatvec(self.rows,v)
+        if self.intercept:
+            out = out + x[0]
+        return out
+
+    @property
+    def T(self):
+        return _ObservationTranspose(self)
+
+    def squaredNorm(self):
+        # the squared Frobenius norm, from the row norms of the operator
+        rowNorms = self.op.rowNorms(self.rows)
+        if (rowNorms is None) or (self.colScale is not None):
+            # row norms are not preserved by the normalization
+            return None
+        return self.intercept*self.shape[0] + (rowNorms**2).sum()
+
+
+class _ObservationTranspose(object):
+    def __init__(self,A):
+        self.A = A
+
+    def dot(self,u):
+        out = zeros((self.A.shape[1],) + u.shape[1:])
+        if self.A.intercept:
+            out[0] = u.sum(axis=0)
+        out[1:] = self.A.op.blockRmatvec(self.A.rows,u)
+        if self.A.colScale is not None:
+            out[1:] *= self.A.colScale.reshape((-1,) + (1,)*(u.ndim-1))
+        return out
@@ -5,10 +5,37 @@ Created on Wed Jul  1 15:47:47 2020
 @author: pjohn
 """
 from numpy.linalg import norm
+from numpy.linalg import svd as npsvd
+from numpy.linalg import qr as npqr
 import userInputVal as ui
 from numpy import ones
 from numpy import zeros
 from numpy import array
+from numpy import where
+from numpy import sum as npsum
+from numpy import sqrt
+from numpy import add
+from numpy import bincount
+from numpy import cumsum
+from numpy import repeat
+from numpy import arange
+from numpy import concatenate
+from numpy import fromiter
+from numpy import integer
+from numpy import diff
+from numpy import maximum
+from numpy import clip
+from numpy import inf
+from numpy import minimum
+from numpy import sign
+from numpy import argsort
+from numpy import reshape
+from numpy import sort as npsort
+from numpy import partition as nppartition
+from numpy import copy as npcopy
+from numpy.random import default_rng
+from itertools import chain
+from copy import copy
 
 
 #-----------------------------------------------------------------------------
@@ -38,7 +65,13 @@ class Regularizer(object):
       also supply a function to compute the regularizer value.
     '''
 
-    def __init__(self,prox,value=None,scaling=1.0,step=1.0,testLength=100):
+    # Properties of the built-in regularizers which let several of them,
+    # without linear operators, be fused into one block (see fuseRegularizers)
+    quadratic = False # True for (1/2)||x||^2, as in L2sq
+    bounds = None     # (lower,upper) for the indicator of a box, as in nonnegative
+
+    def __init__(self,prox,value=None,scaling=1.0,step=1.0,testLength=100,
+                 vectorized=False,separable=False):
         r''' It is only necessary to define *value* if you wish to compute
             objective function values, either by calling ``getObjective`` or
             by using the ``keepHistory`` option of the ``ProjSplitFit.run`` method.
@@ -71,6 +104,22 @@ class Regularizer(object):
                 iteration-by-iteration basis if the ``equalizeStepsizes``
                 option is enabled in the ``run`` method of ``ProjSplitFit``.
 
+            vectorized : :obj:`bool`, optional
+                set to ``True`` if *prox* and *value* also accept a 2D array
+                and act on each of its columns independently, with *value*
+                returning one value per column. When fitting several
+                responses at once (see ``ProjSplitFit.addData``), the prox is
+                then applied to all columns in a single call; otherwise it is
+                applied one column at a time. Defaults to ``False``.
+
+            separable : :obj:`bool`, optional
+                set to ``True`` if :math:`h_j` is a sum of functions of the
+                individual entries of its argument, as for ``L1``. The prox of
+                a separable regularizer followed by a projection onto a box
+                is the prox of their sum, so a separable regularizer may be
+                fused with constraints into a single block of projective
+                splitting (see ``fuseRegularizers``). Defaults to ``False``.
+
         '''
         try:
             test = ones(testLength)
@@ -92,6 +141,8 @@ class Regularizer(object):
 
         self.value = value
         self.prox = prox
+        self.vectorized = ui.checkUserBool(vectorized,'vectorized')
+        self.separable = ui.checkUserBool(separable,'separable')
 
         self.nu = ui.checkUserInput(scaling,float,'float','scaling',default=1.0,low=0.0,lowAllowed=True)
         self.step = ui.checkUserInput(step,float,'float','step',default=1.0,low=0.0)
@@ -149,11 +200,32 @@ class Regularizer(object):
     def evaluate(self,x):
         if self.value is None:
             return None
+        elif (x.ndim == 2) and not self.vectorized:
+            # one column per response
+            return self.nu*array([self.value(x[:,j]) for j in range(x.shape[1])])
         else:
             return self.nu*self.value(x)
 
 
+    def __copy__(self):
+        # A prox which keeps state between calls, such as the warm start of
+        # nuclearNorm, is an object defining __copy__, so that copies of the
+        # regularizer, as made for the folds of ProjSplitFit.crossValidate,
+        # each get their own state.
+        out = object.__new__(type(self))
+        out.__dict__.update(self.__dict__)
+        if hasattr(type(self.prox),'__copy__'):
+            out.prox = copy(self.prox)
+        return out
+
+
     def getProx(self,x):
+        if (x.ndim == 2) and not self.vectorized:
+            # one column per response
+            out = zeros(x.shape)
+            for j in range(x.shape[1]):
+                out[:,j] = self.prox(x[:,j],self.nu*self.step)
+            return out
         return self.prox(x,self.nu*self.step)
 
 
@@ -187,14 +259,14 @@ def L1(scaling=1.0,step=1.0):
     regObj : :obj:`regularizers.Regularizer` object
     '''
     def L1val(x):
-        return norm(x,1)
+        return npsum(abs(x),axis=0)
 
     def L1prox(x,scale):
         out = (x> scale)*(x-scale)
         out+= (x<-scale)*(x+scale)
         return out
 
-    out = Regularizer(L1prox,L1val,scaling,step)
+    out = Regularizer(L1prox,L1val,scaling,step,vectorized=True,separable=True)
     return out
 
 
@@ -224,12 +296,13 @@ def L2sq(scaling=1.0,step=1.0):
     regObj : :obj:`regularizers.Regularizer` object
     '''
     def val(x):
-        return 0.5*norm(x,2)**2
+        return 0.5*npsum(x**2,axis=0)
 
     def prox(x,scale):
         return(1+scale)**(-1)*x
 
-    out = Regularizer(prox,val,scaling,step)
+    out = Regularizer(prox,val,scaling,step,vectorized=True,separable=True)
+    out.quadratic = True
     return out
 
 
@@ -261,16 +334,15 @@ def L2(scaling=1.0,step=1.0):
     regObj : :obj:`regularizers.Regularizer` object
     '''
     def val(x):
-        return norm(x,2)
+        return norm(x,2,axis=0)
 
     def prox(x,scale):
-        normx = norm(x,2)
-        if normx <= scale:
-            return 0*x
-        else:
-            return (normx - scale)*x/normx
+        # column-wise for 2D input
+        normx = norm(x,2,axis=0)
+        shrink = where(normx <= scale,0.0,1.0 - scale/where(normx <= scale,1.0,normx))
+        return shrink*x
 
-    out = Regularizer(prox,val,scaling,step)
+    out = Regularizer(prox,val,scaling,step,vectorized=True)
     return out
 
 
@@ -294,6 +366,10 @@ def groupL2(dimension, groups, scaling=1.0, step=1.0):
     :math:`G` may not overlap.  A simple complete usage example
     may be found in ``examples/GroupL2.py``.
 
+    The groups are compiled once into flat arrays of indices, so the
+    regularizer and its prox are evaluated with a few array operations
+    whatever the number of groups.
+
     *dimension* is the size of vectors that will be passed to
     the regularizer in future.
 
@@ -330,36 +406,807 @@ def groupL2(dimension, groups, scaling=1.0, step=1.0):
     regObj : :obj:`regularizers.Regularizer` object
     '''
 
-    appearCount = zeros(dimension)
-    for group in groups:
-        for i in group:
-            if not isinstance(i,int):
-                raise Exception("groupL2: group contains non-integer data '" + str(i) + "'")
-            elif i < 0 or i >= dimension:
-                raise Exception("groupL2: group contains index " + str(i) + " outside expected range")
-            else:
-                appearCount[i] += 1
-    if max(appearCount) > 1:
-        badIndices = [i for i in range(dimension) if appearCount[i] > 1]
+    # Compile the groups into one flat array of indices, ordered by group,
+    # and the offset of each group in it, so that the norms and the prox are
+    # computed with segment reductions rather than a loop over the groups.
+    groups = [group if hasattr(group,'__len__') else list(group) for group in groups]
+    groups = [group for group in groups if len(group) > 0]
+    lengths = fromiter(map(len,groups),dtype=int,count=len(groups))
+    flat = array(list(chain.from_iterable(groups)))
+    if (len(flat) > 0) and (flat.dtype.kind not in 'biu'):
+        bad = next(i for i in chain.from_iterable(groups) if not isinstance(i,(int,integer)))
+        raise Exception("groupL2: group contains non-integer data '" + str(bad) + "'")
+    indices = flat.astype(int)
+
+    outside = (indices < 0) | (indices >= dimension)
+    if outside.any():
+        raise Exception("groupL2: group contains index " + str(indices[outside][0]) + " outside expected range")
+    appearCount = bincount(indices,minlength=dimension)
+    if (appearCount > 1).any():
+        badIndices = list(where(appearCount > 1)[0])
         raise Exception("groupL2: these indices are in multiple groups " + str(badIndices))
-    leftOut = array([i for i in range(dimension) if appearCount[i] == 0],dtype=int)
+
+    offsets = concatenate(([0],cumsum(lengths)[:-1])).astype(int)
+    groupOf = repeat(arange(len(groups)),lengths)
 
     def val(x):
-        regVal = 0.0
-        for group in groups:
-            regVal += norm(x[group],2)
-        return regVal
+        if len(indices) == 0:
+            return 0.0*npsum(x,axis=0)
+        # columnwise for 2D input
+        return npsum(sqrt(add.reduceat(x[indices]**2,offsets,axis=0)),axis=0)
 
     def prox(x,scale):
-        v = zeros(dimension)
-        v[leftOut] = x[leftOut]
-        for group in groups:
-            groupNorm = norm(x[group],2)
-            if groupNorm > scale:
-                v[group] = (groupNorm - scale)*x[group]/groupNorm
+        v = array(x,dtype=float)
+        if len(indices) > 0:
+            xGroups = v[indices]
+            norms = sqrt(add.reduceat(xGroups**2,offsets,axis=0))
+            shrink = where(norms > scale,1.0 - scale/where(norms > scale,norms,1.0),0.0)
+            v[indices] = shrink[groupOf]*xGroups
         return v
 
-    out = Regularizer(prox,val,scaling,step,testLength=dimension)
+    out = Regularizer(prox,val,scaling,step,testLength=dimension,vectorized=True)
+    return out
+
+
+
+
+def TV1d(scaling=1.0,step=1.0):
+    r'''
+    Create a one-dimensional total variation (fused lasso) regularizer.
+
+    The output is an object of class ``regularizers.Regularizer``,
+    which may be passed to ``ProjSplitFit.addRegularizer``.
+
+    The regularizer takes the form
+
+    .. math::
+        h(z) = \nu_j \sum_{i=1}^{d-1} |z_{i+1} - z_i|.
+
+    The same penalty may be formed by composing ``L1`` with the difference
+    operator ``projSplitUtils.Difference1d`` through the *linearOp*
+    argument of ``addRegularizer``. Here, however, the prox of the penalty
+    is computed exactly, in linear time, by the direct algorithm of
+    Condat (2013), so that no linear operator, and hence no extra block of
+    projective splitting, is needed. This generally means many fewer
+    iterations.
+
+    The older ``projSplitUtils.totalVariation1d`` and
+    ``projSplitUtils.dropFirst`` are kept for compatibility, and return a
+    ``Difference1d`` and a ``Subset`` operator.
+
+    *scaling* is the coefficient :math:`\nu_j` that will
+    be applied to the function in the objective.
+
+    *step* is the stepsize :math:`\eta` that projective splitting will use in
+    proximal steps with respect to this regularizer.
+
+    Parameters
+    -----------
+
+    scaling : :obj:`float`, optional
+        Defaults to 1.0.  Must be positive and finite.
+    step : :obj:`float`, optional
+        Defaluts to 1.0.  Must be positive and finite.
+
+    Returns
+    --------
+    regObj : :obj:`regularizers.Regularizer` object
+    '''
+    def val(x):
+        return npsum(abs(diff(x,axis=0)),axis=0)
+
+    def prox(x,scale):
+        # Condat's direct algorithm. The output is built up as runs of equal
+        # values: k0 is the start of the current run, vmin/vmax bound its
+        # value, and umin/umax track the corresponding dual variables as the
+        # run is extended to k. Runs are written out with slice assignments.
+        y = [float(xi) for xi in x]
+        width = len(y)
+        out = zeros(width)
+        if (width < 2) or (scale == 0.0):
+            out[:] = y
+            return out
+        lam = scale
+        k = k0 = kminus = kplus = 0
+        umin = lam
+        umax = -lam
+        vmin = y[0] - lam
+        vmax = y[0] + lam
+        while True:
+            while k == width - 1:
+                if umin < 0.0:
+                    out[k0:kminus+1] = vmin
+                    k0 = k = kminus = kminus + 1
+                    vmin = y[k]
+                    umin = lam
+                    umax = vmin + lam - vmax
+                elif umax > 0.0:
+                    out[k0:kplus+1] = vmax
+                    k0 = k = kplus = kplus + 1
+                    vmax = y[k]
+                    umax = -lam
+                    umin = vmax - lam - vmin
+                else:
+                    out[k0:] = vmin + umin/(k - k0 + 1)
+                    return out
+            umin += y[k+1] - vmin
+            if umin < -lam:
+                out[k0:kminus+1] = vmin
+                k0 = k = kminus = kplus = kminus + 1
+                vmin = y[k]
+                vmax = vmin + 2.0*lam
+                umin = lam
+                umax = -lam
+                continue
+            umax += y[k+1] - vmax
+            if umax > lam:
+                out[k0:kplus+1] = vmax
+                k0 = k = kminus = kplus = kplus + 1
+                vmax = y[k]
+                vmin = vmax - 2.0*lam
+                umin = lam
+                umax = -lam
+            else:
+                k += 1
+                if umin >= lam:
+                    kminus = k
+                    vmin += (umin - lam)/(k - k0 + 1)
+                    umin = lam
+                if umax <= -lam:
+                    kplus = k
+                    vmax += (umax + lam)/(k - k0 + 1)
+                    umax = -lam
+
+    out = Regularizer(prox,val,scaling,step)
+    return out
+
+
+def box(lower,upper,step=1.0):
+    r'''
+    Create a box constraint, the indicator function of
+    :math:`\{z : l \leq z \leq u\}`, whose prox is the projection
+    :math:`\min(\max(z,l),u)` taken entrywise.
+
+    The output is an object of class ``regularizers.Regularizer``,
+    which may be passed to ``ProjSplitFit.addRegularizer``. Its value is
+    taken to be zero, so that objective values are those of the other terms.
+
+    Added without a linear operator, the constraint may be fused with
+    ``L2sq`` and with one separable regularizer such as ``L1`` into a single
+    block of projective splitting (see ``fuseRegularizers``).
+
+    Parameters
+    -----------
+
+    lower : :obj:`float` or 1D :obj:`numpy.ndarray`
+        The lower bounds :math:`l`, the same for every entry or one per
+        entry. May be ``-numpy.inf``.
+    upper : :obj:`float` or 1D :obj:`numpy.ndarray`
+        The upper bounds :math:`u`, which must be at least the lower bounds.
+        May be ``numpy.inf``.
+    step : :obj:`float`, optional
+        Defaults to 1.0.  Must be positive and finite.
+
+    Returns
+    --------
+    regObj : :obj:`regularizers.Regularizer` object
+    '''
+    lower = array(lower,dtype=float)
+    upper = array(upper,dtype=float)
+    if (lower.ndim > 1) or (upper.ndim > 1):
+        raise Exception("box: lower and upper must be floats or 1D arrays")
+    if (lower > upper).any():
+        raise Exception("box: lower bounds must not exceed upper bounds")
+    testLength = max(lower.size,upper.size) if max(lower.ndim,upper.ndim) == 1 else 100
+    # bounds broadcast over the columns of 2D input
+    lowerCol = lower.reshape(-1,1)
+    upperCol = upper.reshape(-1,1)
+
+    def val(x):
+        return 0.0*npsum(x,axis=0)
+
+    def prox(x,scale):
+        if x.ndim == 2:
+            return clip(x,lowerCol,upperCol)
+        return clip(x,lower,upper)
+
+    out = Regularizer(prox,val,1.0,step,testLength=testLength,vectorized=True,
+                      separable=True)
+    out.bounds = (lower,upper)
+    return out
+
+
+def nonnegative(step=1.0):
+    r'''
+    Create a nonnegativity constraint, the indicator function of
+    :math:`\{z : z \geq 0\}`, whose prox is the projection
+    :math:`\max(z,0)` taken entrywise. This is ``box(0.0,numpy.inf,step)``.
+
+    Parameters
+    -----------
+
+    step : :obj:`float`, optional
+        Defaults to 1.0.  Must be positive and finite.
+
+    Returns
+    --------
+    regObj : :obj:`regularizers.Regularizer` object
+    '''
+    return box(0.0,inf,step)
+
+
+def elasticNet(alpha=0.5,scaling=1.0,step=1.0):
+    r'''
+    Create an elastic net regularizer,
+
+    .. math::
+        h(z) = \nu_j\left(\alpha\|z\|_1 + \frac{1-\alpha}{2}\|z\|_2^2\right),
+
+    whose prox is soft thresholding followed by a shrinkage, so that it takes
+    a single block of projective splitting rather than the two of ``L1``
+    and ``L2sq``.
+
+    The output is an object of class ``regularizers.Regularizer``,
+    which may be passed to ``ProjSplitFit.addRegularizer``.
+
+    Parameters
+    -----------
+
+    alpha : :obj:`float`, optional
+        The weight of the :math:`\ell_1` norm, between 0 and 1. Defaults to 0.5.
+    scaling : :obj:`float`, optional
+        Defaults to 1.0.  Must be positive and finite.
+    step : :obj:`float`, optional
+        Defaults to 1.0.  Must be positive and finite.
+
+    Returns
+    --------
+    regObj : :obj:`regularizers.Regularizer` object
+    '''
+    alpha = ui.checkUserInput(alpha,float,'float','alpha',low=0.0,lowAllowed=True,
+                              high=1.0,highAllowed=True)
+
+    def val(x):
+        return alpha*npsum(abs(x),axis=0) + 0.5*(1.0 - alpha)*npsum(x**2,axis=0)
+
+    def prox(x,scale):
+        out = maximum(abs(x) - alpha*scale,0.0)
+        out *= sign(x)
+        out /= 1.0 + (1.0 - alpha)*scale
+        return out
+
+    out = Regularizer(prox,val,scaling,step,vectorized=True,separable=True)
+    return out
+
+
+def _simplexThreshold(v,radius):
+    # The theta with sum(max(v - theta,0)) == radius for a 1D array v and
+    # radius > 0, by the pivoting of Duchi et al. (2008): each round keeps
+    # the entries on one side of a pivot, without sorting. The pivot is the
+    # median of the candidates, found by numpy.partition in linear time, so
+    # that each round at least halves them and the total number of
+    # operations is linear for every input, with no random state.
+    candidates = v
+    total = 0.0
+    count = 0
+    while len(candidates) > 0:
+        middle = len(candidates)//2
+        pivot = nppartition(candidates,middle)[middle]
+        upper = candidates[candidates >= pivot]
+        upperSum = upper.sum()
+        if (total + upperSum) - (count + len(upper))*pivot < radius:
+            # theta is below the pivot, so all of upper is in the support
+            total += upperSum
+            count += len(upper)
+            candidates = candidates[candidates < pivot]
+        else:
+            candidates = upper[upper > pivot]
+    return (total - radius)/count
+
+
+def _projectSimplex(x,radius):
+    # columnwise for 2D input
+    if x.ndim == 2:
+        return array([_projectSimplex(x[:,j],radius) for j in range(x.shape[1])]).T
+    return maximum(x - _simplexThreshold(x,radius),0.0)
+
+
+def _projectL1ball(x,radius):
+    if x.ndim == 2:
+        return array([_projectL1ball(x[:,j],radius) for j in range(x.shape[1])]).T
+    absx = abs(x)
+    if absx.sum() <= radius:
+        return array(x,dtype=float)
+    out = maximum(absx - _simplexThreshold(absx,radius),0.0)
+    out *= sign(x)
+    return out
+
+
+def simplex(radius=1.0,step=1.0):
+    r'''
+    Create a simplex constraint, the indicator function of
+    :math:`\{z : z \geq 0, \sum_i z_i = r\}`. Its prox, the projection onto
+    the simplex, is computed without sorting in linear time by the pivoting
+    algorithm of Duchi et al. (2008), with median pivots.
+
+    The output is an object of class ``regularizers.Regularizer``,
+    which may be passed to ``ProjSplitFit.addRegularizer``. Its value is
+    taken to be zero, so that objective values are those of the other terms.
+
+    Parameters
+    -----------
+
+    radius : :obj:`float`, optional
+        The sum :math:`r` of the entries. Defaults to 1.0.  Must be positive
+        and finite.
+    step : :obj:`float`, optional
+        Defaults to 1.0.  Must be positive and finite.
+
+    Returns
+    --------
+    regObj : :obj:`regularizers.Regularizer` object
+    '''
+    radius = ui.checkUserInput(radius,float,'float','radius',low=0.0)
+
+    def val(x):
+        return 0.0*npsum(x,axis=0)
+
+    def prox(x,scale):
+        return _projectSimplex(x,radius)
+
+    out = Regularizer(prox,val,1.0,step,vectorized=True)
+    return out
+
+
+def L1ball(radius=1.0,step=1.0):
+    r'''
+    Create an :math:`\ell_1`-ball constraint, the indicator function of
+    :math:`\{z : \|z\|_1 \leq r\}`. Its prox, the projection onto the
+    ball, is computed like that of ``simplex``, in linear time.
+
+    The output is an object of class ``regularizers.Regularizer``,
+    which may be passed to ``ProjSplitFit.addRegularizer``. Its value is
+    taken to be zero, so that objective values are those of the other terms.
+
+    Parameters
+    -----------
+
+    radius : :obj:`float`, optional
+        The radius :math:`r` of the ball. Defaults to 1.0.  Must be positive
+        and finite.
+    step : :obj:`float`, optional
+        Defaults to 1.0.  Must be positive and finite.
+
+    Returns
+    --------
+    regObj : :obj:`regularizers.Regularizer` object
+    '''
+    radius = ui.checkUserInput(radius,float,'float','radius',low=0.0)
+
+    def val(x):
+        return 0.0*npsum(x,axis=0)
+
+    def prox(x,scale):
+        return _projectL1ball(x,radius)
+
+    out = Regularizer(prox,val,1.0,step,vectorized=True)
     return out
 
 
+def Linf(scaling=1.0,step=1.0):
+    r'''
+    Create an :math:`\ell_\infty`-norm regularizer, :math:`\nu_j\max_i |z_i|`.
+    By the Moreau decomposition, its prox is the input minus its projection
+    onto an :math:`\ell_1` ball, computed as for ``L1ball`` in linear time.
+
+    The output is an object of class ``regularizers.Regularizer``,
+    which may be passed to ``ProjSplitFit.addRegularizer``.
+
+    Parameters
+    -----------
+
+    scaling : :obj:`float`, optional
+        Defaults to 1.0.  Must be positive and finite.
+    step : :obj:`float`, optional
+        Defaults to 1.0.  Must be positive and finite.
+
+    Returns
+    --------
+    regObj : :obj:`regularizers.Regularizer` object
+    '''
+    def val(x):
+        return abs(x).max(axis=0)
+
+    def prox(x,scale):
+        if scale == 0.0:
+            return array(x,dtype=float)
+        return x - _projectL1ball(x,scale)
+
+    out = Regularizer(prox,val,scaling,step,vectorized=True)
+    return out
+
+
+def sparseGroupLasso(dimension,groups,alpha=0.5,scaling=1.0,step=1.0):
+    r'''
+    Create a sparse group lasso regularizer,
+
+    .. math::
+        h(z) = \nu_j\left(\alpha\|z\|_1
+               + (1-\alpha)\sum_{G\in\mathcal{G}} \|z_G\|\right),
+
+    for non-overlapping groups :math:`\mathcal{G}`, which selects groups and
+    entries within them. Its prox is soft thresholding followed by the group
+    shrinkage of ``groupL2``, with the groups compiled once in the same way.
+
+    The output is an object of class ``regularizers.Regularizer``,
+    which may be passed to ``ProjSplitFit.addRegularizer``.
+
+    Parameters
+    -----------
+
+    dimension : :obj:`int`
+        The size of the vectors to which the regularizer will be applied.
+    groups : iterable of iterables of :obj:`int`
+        The groups, as for ``groupL2``.
+    alpha : :obj:`float`, optional
+        The weight of the :math:`\ell_1` norm, between 0 and 1. Defaults to 0.5.
+    scaling : :obj:`float`, optional
+        Defaults to 1.0.  Must be positive and finite.
+    step : :obj:`float`, optional
+        Defaults to 1.0.  Must be positive and finite.
+
+    Returns
+    --------
+    regObj : :obj:`regularizers.Regularizer` object
+    '''
+    alpha = ui.checkUserInput(alpha,float,'float','alpha',low=0.0,lowAllowed=True,
+                              high=1.0,highAllowed=True)
+    group = groupL2(dimension,groups)
+
+    def val(x):
+        return alpha*npsum(abs(x),axis=0) + (1.0 - alpha)*group.value(x)
+
+    def prox(x,scale):
+        out = maximum(abs(x) - alpha*scale,0.0)
+        out *= sign(x)
+        return group.prox(out,(1.0 - alpha)*scale)
+
+    out = Regularizer(prox,val,scaling,step,testLength=dimension,vectorized=True)
+    return out
+
+
+def SLOPE(weights,scaling=1.0,step=1.0):
+    r'''
+    Create a SLOPE (sorted L-one penalized estimation) regularizer, also known
+    as the ordered weighted :math:`\ell_1` (OWL) norm,
+
+    .. math::
+        h(z) = \nu_j\sum_{i=1}^d \lambda_i |z|_{(i)},
+
+    where :math:`|z|_{(1)}\geq\dots\geq|z|_{(d)}` are the magnitudes of the
+    entries of :math:`z` in decreasing order and
+    :math:`\lambda_1\geq\dots\geq\lambda_d\geq 0` are the weights. Equal
+    weights give the :math:`\ell_1` norm and weights :math:`(1,0,\dots,0)`
+    the :math:`\ell_\infty` norm. The prox sorts the magnitudes and takes a
+    nonincreasing isotonic regression of them less the weights, by the pool
+    adjacent violators algorithm of ``scipy.optimize.isotonic_regression``,
+    which needs SciPy 1.12 or later.
+
+    The output is an object of class ``regularizers.Regularizer``,
+    which may be passed to ``ProjSplitFit.addRegularizer``.
+
+    Parameters
+    -----------
+
+    weights : 1D :obj:`numpy.ndarray`
+        The weights :math:`\lambda_i`, nonnegative and nonincreasing, one
+        for each entry of the vectors to which the regularizer will be applied.
+    scaling : :obj:`float`, optional
+        Defaults to 1.0.  Must be positive and finite.
+    step : :obj:`float`, optional
+        Defaults to 1.0.  Must be positive and finite.
+
+    Returns
+    --------
+    regObj : :obj:`regularizers.Regularizer` object
+    '''
+    try:
+        # only in SciPy 1.12 or later, so not imported with the module
+        from scipy.optimize import isotonic_regression
+    except ImportError:
+        raise Exception("SLOPE: needs scipy.optimize.isotonic_regression, from SciPy 1.12 or later")
+
+    weights = array(weights,dtype=float)
+    if (weights.ndim != 1) or (len(weights) == 0):
+        raise Exception("SLOPE: weights must be a nonempty 1D array")
+    if (weights < 0).any() or (diff(weights) > 0).any():
+        raise Exception("SLOPE: weights must be nonnegative and nonincreasing")
+    weightCol = weights.reshape(-1,1)
+
+    def val(x):
+        magnitudes = -npsort(-abs(x),axis=0)
+        if x.ndim == 2:
+            return npsum(weightCol*magnitudes,axis=0)
+        return npsum(weights*magnitudes)
+
+    def prox1d(x,scale):
+        absx = abs(x)
+        order = argsort(-absx)
+        fit = isotonic_regression(absx[order] - scale*weights,increasing=False).x
+        out = zeros(len(x))
+        out[order] = maximum(fit,0.0)
+        out *= sign(x)
+        return out
+
+    def prox(x,scale):
+        if x.ndim == 2:
+            return array([prox1d(x[:,j],scale) for j in range(x.shape[1])]).T
+        return prox1d(x,scale)
+
+    out = Regularizer(prox,val,scaling,step,testLength=len(weights),vectorized=True)
+    return out
+
+
+class _SingularValueThreshold(object):
+    # The prox of the nuclear norm of a vector reshaped into a matrix X:
+    # the singular values of X above the threshold are reduced by it and
+    # the others are set to zero. Only the leading singular triplets are
+    # computed, by subspace iteration with a Rayleigh-Ritz step, on a
+    # subspace of dimension k: the right singular vectors kept from the
+    # previous call, which are close to the current ones once the iterates
+    # settle, and random vectors. If all k singular values exceed the
+    # threshold, k is doubled. The cost is then proportional to the rank
+    # found rather than to the dimensions of X, which fall back on a full
+    # SVD once k is a sizeable fraction of them.
+    #
+    # With several responses each column of x is a matrix of its own, with
+    # its own subspace and rank. The subspaces restart when the number of
+    # columns changes, as when converged responses stop being updated.
+    def __init__(self,shape,oversampling,tol,maxIters):
+        self.shape = shape
+        self.oversampling = oversampling
+        self.tol = tol
+        self.maxIters = maxIters
+        self.reset()
+
+    def reset(self):
+        self.rank = None
+        self.V = None
+        self.rng = default_rng(0)
+
+    def __copy__(self):
+        # copies, such as the fold problems of ProjSplitFit.crossValidate,
+        # start from the same subspaces but keep their own from then on, so
+        # they may be used concurrently
+        out = _SingularValueThreshold(self.shape,self.oversampling,self.tol,self.maxIters)
+        out.rank = self.rank if self.rank is None else npcopy(self.rank)
+        if isinstance(self.V,list):
+            out.V = [V if V is None else npcopy(V) for V in self.V]
+        elif self.V is not None:
+            out.V = npcopy(self.V)
+        return out
+
+    def __call__(self,x,scale):
+        if x.ndim == 2:
+            if (not isinstance(self.V,list)) or (len(self.V) != x.shape[1]):
+                self.V = [None]*x.shape[1]
+            out = zeros(x.shape)
+            rank = zeros(x.shape[1],dtype=int)
+            for j in range(x.shape[1]):
+                out[:,j],self.V[j],rank[j] = self._threshold(x[:,j],scale,self.V[j])
+            self.rank = rank
+            return out
+        if isinstance(self.V,list):
+            self.V = None
+        out,self.V,self.rank = self._threshold(x,scale,self.V)
+        return out
+
+    def _threshold(self,x,scale,V):
+        X = x.reshape(self.shape)
+        minDim = min(self.shape)
+        k = self.oversampling if V is None else V.shape[1]
+        while True:
+            if 3*k >= minDim:
+                U,s,Vt = npsvd(X,full_matrices=False)
+                V = Vt.T
+                break
+            if (V is None) or (V.shape[1] < k):
+                # random directions fill the subspace up to k
+                nNew = k if V is None else k - V.shape[1]
+                G = self.rng.standard_normal((self.shape[1],nNew))
+                V = G if V is None else concatenate((V,G),axis=1)
+            V,_ = npqr(V)
+            for iteration in range(self.maxIters):
+                Ub,s,Vbt = npsvd(X.dot(V),full_matrices=False)
+                W = X.T.dot(Ub)
+                # only the singular triplets above the threshold are needed, so
+                # only their residuals X^T u - s v are tested
+                above = s > scale
+                residual = W[:,above] - V.dot(Vbt[above].T)*s[above]
+                if (norm(residual,axis=0).max(initial=0.0) <= self.tol*max(s[0],1.0)) or \
+                   (iteration == self.maxIters - 1):
+                    break
+                V,_ = npqr(W)
+            U = Ub
+            V = V.dot(Vbt.T)
+            if s[-1] <= scale:
+                break
+            k = 2*k
+
+        rank = int(npsum(s > scale))
+        keep = slice(0,rank)
+        out = (U[:,keep]*(s[keep] - scale)).dot(V[:,keep].T)
+        # the subspace for the next call, with room beyond the rank found
+        return out.reshape(-1),V[:,:rank + self.oversampling],rank
+
+
+class _NuclearNormRegularizer(Regularizer):
+    # the Regularizer made by nuclearNorm, whose prox is a _SingularValueThreshold
+    def getRank(self):
+        return self.prox.rank
+
+
+def nuclearNorm(shape,scaling=1.0,step=1.0,oversampling=5,tol=1e-10,maxIters=100):
+    r'''
+    Create a nuclear-norm regularizer for a coefficient vector
+    :math:`z\in\mathbb{R}^{mn}` read as an :math:`m\times n` matrix
+    :math:`Z`, row by row (``z.reshape((m,n))``),
+
+    .. math::
+        h(z) = \nu_j \|Z\|_* = \nu_j \sum_i \sigma_i(Z),
+
+    the sum of the singular values of :math:`Z`, for example for multi-task
+    or matrix-completion fits with low-rank solutions.
+
+    The prox soft-thresholds the singular values. Rather than a full SVD on
+    every iteration, only the singular values above the threshold, and their
+    singular vectors, are computed, by subspace iteration started from the
+    singular vectors found by the previous prox. Near a low-rank solution, a
+    few iterations of cost proportional to the rank then suffice. The rank
+    found by the latest prox is returned by the ``getRank`` method of the
+    returned object. When fitting several responses at once, each response
+    is a matrix :math:`Z` of its own, with its own singular vectors, and
+    ``getRank`` returns an array of ranks, one per response.
+
+    Copies of the regularizer, such as those solving the folds of
+    ``ProjSplitFit.crossValidate``, keep their singular vectors and ranks
+    apart from those of the original.
+
+    The output is an object of class ``regularizers.Regularizer``,
+    which may be passed to ``ProjSplitFit.addRegularizer``. Evaluating the
+    regularizer takes the singular values of :math:`Z` in full.
+
+    Parameters
+    -----------
+
+    shape : :obj:`tuple` of two :obj:`int`
+        The shape :math:`(m,n)` of :math:`Z`.
+    scaling : :obj:`float`, optional
+        Defaults to 1.0.  Must be positive and finite.
+    step : :obj:`float`, optional
+        Defaults to 1.0.  Must be positive and finite.
+    oversampling : :obj:`int`, optional
+        Number of singular vectors computed beyond the rank. Defaults to 5.
+    tol : :obj:`float`, optional
+        The subspace iteration stops once the residuals
+        :math:`\|Z^\top u_i - \sigma_i v_i\|` of the singular triplets above
+        the threshold are below ``tol`` times the largest singular value.
+        Defaults to 1e-10.
+    maxIters : :obj:`int`, optional
+        Maximum number of subspace iterations per prox. Defaults to 100.
+
+    Returns
+    --------
+    regObj : :obj:`regularizers.Regularizer` object
+    '''
+    try:
+        if len(shape) != 2:
+            raise Exception
+        shape = (int(shape[0]),int(shape[1]))
+        if min(shape) < 1:
+            raise Exception
+    except:
+        raise Exception("nuclearNorm: shape must be a pair of positive ints")
+    oversampling = ui.checkUserInput(oversampling,int,'int','oversampling',low=1,lowAllowed=True)
+    tol = ui.checkUserInput(tol,float,'float','tol',low=0.0,lowAllowed=True)
+    maxIters = ui.checkUserInput(maxIters,int,'int','maxIters',low=1,lowAllowed=True)
+
+    threshold = _SingularValueThreshold(shape,oversampling,tol,maxIters)
+
+    def val(x):
+        if x.ndim == 2:
+            return array([val(x[:,j]) for j in range(x.shape[1])])
+        return npsvd(x.reshape(shape),compute_uv=False).sum()
+
+    out = _NuclearNormRegularizer(threshold,val,scaling,step,testLength=shape[0]*shape[1],
+                                  vectorized=True)
+    # forget the test call of Regularizer
+    threshold.reset()
+    return out
+
+
+def fuseRegularizers(regs,dimension):
+    r'''
+    Fuse regularizers whose sum has a prox in closed form into one
+    regularizer. Called with ``fuseRegularizers=True``, ``ProjSplitFit.run``
+    applies this to the regularizers added without a linear operator, so
+    that the fused group takes a single block
+    of projective splitting, with one set of variables and one prox
+    evaluation per iteration, rather than one block per regularizer.
+
+    The fused group consists of every ``L2sq`` regularizer, every box
+    constraint such as ``nonnegative``, and one other regularizer :math:`h`,
+    which must be separable (see ``Regularizer``) if there are constraints.
+    This rests on the identity
+
+    .. math::
+        \text{prox}_{\eta(h + (b/2)\|\cdot\|^2 + \iota_{[l,u]})}(x)
+          = \Pi_{[l,u]}\left(\text{prox}_{\eta h/(1+\eta b)}\left(\frac{x}{1+\eta b}\right)\right),
+
+    so, for example, ``L1`` with ``L2sq`` gives the elastic net, and ``L1``
+    with ``nonnegative`` the nonnegative lasso. The fused regularizer reads
+    the scalings of its parts whenever it is applied, so they may still be
+    changed with ``setScaling``.
+
+    Parameters
+    -----------
+
+    regs : :obj:`list` of :obj:`regularizers.Regularizer`
+        regularizers applied to the same vector, without linear operators
+    dimension : :obj:`int`
+        length of that vector
+
+    Returns
+    --------
+    regs : :obj:`list` of :obj:`regularizers.Regularizer`
+        ``regs`` with the fused group, if it has two or more members,
+        replaced by one regularizer in place of its first member. The fused
+        regularizer lists the group in its ``parts`` attribute.
+    '''
+    regs = list(regs)
+    quadratics = [reg for reg in regs if reg.quadratic]
+    boxes = [reg for reg in regs if reg.bounds is not None]
+    cores = [reg for reg in regs if not (reg.quadratic or (reg.bounds is not None))
+             and (reg.separable or (len(boxes) == 0))]
+    core = cores[0] if len(cores) > 0 else None
+    parts = quadratics + boxes + cores[:1]
+    if len(parts) < 2:
+        return regs
+
+    lower = -inf
+    upper = inf
+    for reg in boxes:
+        lower = maximum(lower,reg.bounds[0])
+        upper = minimum(upper,reg.bounds[1])
+
+    def val(x):
+        vals = [reg.evaluate(x) for reg in parts]
+        if any(v is None for v in vals):
+            return None
+        return sum(vals)
+
+    def prox(x,scale):
+        shrink = 1.0 + scale*sum(reg.getScaling() for reg in quadratics)
+        v = x/shrink
+        if core is not None:
+            coreScale = core.getScaling()*scale/shrink
+            if (v.ndim == 2) and not core.vectorized:
+                v = array([core.prox(v[:,j],coreScale) for j in range(v.shape[1])]).T
+            else:
+                v = core.prox(v,coreScale)
+        if len(boxes) > 0:
+            if v.ndim == 2:
+                v = clip(v,reshape(lower,(-1,1)),reshape(upper,(-1,1)))
+            else:
+                v = clip(v,lower,upper)
+        return v
+
+    step = (core if core is not None else parts[0]).getStep()
+    fused = Regularizer(prox,val,1.0,step,testLength=dimension,vectorized=True,
+                        separable=(core is None) or core.separable)
+    fused.parts = parts
+
+    inGroup = [any(reg is part for part in parts) for reg in regs]
+    first = inGroup.index(True)
+    return [fused if i == first else reg for i,reg in enumerate(regs)
+            if (i == first) or not inGroup[i]]
@@ -0,0 +1,60 @@
+
+import sys
+sys.path.append('../')
+import projSplitFit as ps
+import lossProcessors as lp
+from regularizers import L1
+import numpy as np
+import pytest
+
+nprob = 4
+m = 30
+d = 8
+np.random.seed(3)
+As = [np.random.normal(0,1,[m,d]) for _ in range(nprob)]
+ys = [np.random.normal(0,1,m) for _ in range(nprob)]
+ysLR = [np.sign(A.dot(np.random.normal(0,1,d)) + np.random.normal(0,1,m)) for A in As]
+
+def fit(A,y,loss,process,intercept,normalize):
+    projSplit = ps.ProjSplitFit()
+    projSplit.addData(A,y,loss=loss,process=process(),intercept=intercept,normalize=normalize)
+    projSplit.addRegularizer(L1(scaling=0.05))
+    projSplit.run(nblocks=2,maxIterations=5000,primalTol=1e-8,dualTol=1e-8)
+    return projSplit
+
+processors = [lambda: lp.Forward2Backtrack(),lambda: lp.Forward2Fixed(autoStep=True),
+              lambda: lp.Forward1Fixed(autoStep=True)]
+
+@pytest.mark.parametrize("process",processors)
+@pytest.mark.parametrize("loss,responses",[(2,ys),('logistic',ysLR)])
+@pytest.mark.parametrize("intercept,normalize",[(False,False),(True,True)])
+def test_matches_single(process,loss,responses,intercept,normalize):
+    batch = fit(As,responses,loss,process,intercept,normalize)
+    sols = batch.getSolution()
+    objs = batch.getObjective()
+    assert len(sols) == nprob
+    for j in range(nprob):
+        single = fit(As[j],responses[j],loss,process,intercept,normalize)
+        assert np.abs(single.getSolution() - sols[j]).max() < 1e-6
+        assert abs(single.getObjective() - objs[j]) < 1e-6
+
+
+def test_batch_of_one():
+    batch = fit(As[:1],ys[:1],2,lambda: lp.Forward2Backtrack(),True,False)
+    single = fit(As[0],ys[0],2,lambda: lp.Forward2Backtrack(),True,False)
+    sols = batch.getSolution()
+    assert len(sols) == 1
+    assert np.abs(single.getSolution() - sols[0]).max() < 1e-6
+
+
+def test_bad_batches():
+    projSplit = ps.ProjSplitFit()
+    with pytest.raises(Exception):
+        projSplit.addData([As[0],As[1][:-1]],ys[:2],loss=2)
+    with pytest.raises(Exception):
+        projSplit.addData(As[:2],ys[:3],loss=2)
+    with pytest.raises(Exception):
+        projSplit.addData(As[:2],ys[:2],loss=2,linearOp=np.eye(d))
+
+    projSplit.addData(As,ys,loss=2,process=lp.BackwardExact())
+    assert type(projSplit.process) is lp.Forward2Backtrack
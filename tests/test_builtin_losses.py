@@ -0,0 +1,72 @@
+
+import sys
+sys.path.append('../')
+import projSplitFit as ps
+import losses as ls
+import lossProcessors as lp
+from regularizers import L2sq
+import numpy as np
+import pytest
+from scipy.optimize import minimize
+
+m = 40
+d = 10
+np.random.seed(1)
+A = np.random.normal(0,1,[m,d])
+xtrue = np.random.normal(0,0.5,d)
+yreal = A.dot(xtrue) + np.random.normal(0,1,m)
+ysign = np.sign(A.dot(xtrue) + np.random.normal(0,0.5,m))
+ycount = np.random.poisson(np.exp(0.3*A.dot(xtrue)))
+nu = 0.1
+
+builtIns = [(ls.huber(0.5),yreal),(ls.squaredHinge(),ysign),
+            (ls.poisson(),ycount),(ls.quantile(0.3),yreal)]
+
+
+@pytest.mark.parametrize("lossObj,y",builtIns)
+def test_kernels(lossObj,y):
+    loss = ls.Loss(lossObj)
+    yhat = np.random.normal(0,2,m)
+    eps = 1e-6
+    fd = (loss.value(yhat+eps,y) - loss.value(yhat-eps,y))/(2*eps)
+    assert np.allclose(fd,loss.derivative(yhat,y),atol=1e-4)
+    fd2 = (loss.derivative(yhat+eps,y) - loss.derivative(yhat-eps,y))/(2*eps)
+    assert np.allclose(fd2,loss.secondDerivative(yhat,y),atol=1e-4)
+    vals,derivs = loss.valueAndDerivative(yhat,y)
+    assert np.allclose(vals,loss.value(yhat,y))
+    assert np.allclose(derivs,loss.derivative(yhat,y))
+    if loss.curvatureBound is not None:
+        assert np.all(loss.secondDerivative(yhat,y) <= loss.curvatureBound(y) + 1e-12)
+
+
+processors = [lp.Forward2Backtrack(),lp.Forward2Fixed(autoStep=True),lp.BackwardNewtonCG()]
+
+@pytest.mark.parametrize("lossObj,y",builtIns)
+@pytest.mark.parametrize("processor",processors)
+def test_fit(lossObj,y,processor):
+    if getattr(processor,'autoStep',False) and (lossObj.curvatureBound is None):
+        # no curvature bound from which to choose the stepsize
+        return
+
+    loss = ls.Loss(lossObj)
+    def F(x):
+        return np.sum(loss.value(A.dot(x),y))/m + 0.5*nu*x.dot(x)
+    def gradF(x):
+        return A.T.dot(loss.derivative(A.dot(x),y))/m + nu*x
+    opt = minimize(F,np.zeros(d),jac=gradF,method='L-BFGS-B',
+                   options={'gtol':1e-10,'ftol':1e-14,'maxiter':10000}).fun
+
+    projSplit = ps.ProjSplitFit()
+    projSplit.addData(A,y,loss=lossObj,process=processor,intercept=False,normalize=False)
+    projSplit.addRegularizer(L2sq(scaling=nu))
+    projSplit.run(nblocks=4,maxIterations=3000,keepHistory=False)
+    assert (projSplit.getObjective() - opt)/abs(opt) < 1e-3
+
+
+def test_bad_inputs():
+    for bad in [0.0,-1.0,np.inf,'a']:
+        with pytest.raises(Exception):
+            ls.huber(bad)
+    for tau,h in [(0.0,0.1),(1.0,0.1),(0.5,-1.0)]:
+        with pytest.raises(Exception):
+            ls.quantile(tau,h)
@@ -0,0 +1,71 @@
+import sys
+sys.path.append('../')
+import projSplitFit as ps
+import lossProcessors as lp
+from regularizers import L1
+import numpy as np
+import scipy.sparse as sp
+import pytest
+
+n = 400
+d = 10
+np.random.seed(2)
+A = np.random.normal(0,1,[n,d])
+xtrue = np.random.normal(0,1,d)
+y = A.dot(xtrue) + 0.5*np.random.normal(0,1,n)
+ylogistic = np.sign(0.3*A.dot(xtrue) + np.random.normal(0,1,n))
+runArgs = {'nblocks':4,'primalTol':1e-7,'dualTol':1e-7,'maxIterations':10000}
+
+processes = [lp.Forward2Backtrack(),lp.Forward2Fixed(autoStep=True),
+             lp.Forward1Fixed(autoStep=True),lp.Forward1Backtrack(),
+             lp.BackwardExact(),lp.BackwardCG()]
+
+@pytest.mark.parametrize("process",processes)
+def test_same_solution(process):
+    projSplit = ps.ProjSplitFit()
+    projSplit.addData(A,y,loss=2,process=process)
+    projSplit.addRegularizer(L1(scaling=0.01))
+    projSplit.runCoarseToFine(50,seed=0,**runArgs)
+    # subsets of 50, 100 and 200 rows, then all the rows
+    assert len(projSplit.stageIterations) == 4
+    assert projSplit.nrowsOfA == n
+
+    plain = ps.ProjSplitFit()
+    plain.addData(A,y,loss=2)
+    plain.addRegularizer(L1(scaling=0.01))
+    plain.run(**runArgs)
+    assert abs(projSplit.getObjective() - plain.getObjective()) < 1e-5
+    assert np.abs(projSplit.getSolution() - plain.getSolution()).max() < 1e-3
+
+    # a further run continues from the full problem
+    projSplit.run(**runArgs)
+    assert abs(projSplit.getObjective() - plain.getObjective()) < 1e-5
+
+
+def test_logistic_sparse():
+    Asparse = sp.csr_matrix(A*(np.random.uniform(0,1,[n,d]) < 0.5))
+    projSplit = ps.ProjSplitFit()
+    projSplit.addData(Asparse,ylogistic,loss='logistic')
+    projSplit.addRegularizer(L1(scaling=0.01))
+    projSplit.run(nblocks=4,maxIterations=10)
+    projSplit.runCoarseToFine(60,seed=1,subsetTol=1e-4,**runArgs)
+
+    plain = ps.ProjSplitFit()
+    plain.addData(Asparse,ylogistic,loss='logistic')
+    plain.addRegularizer(L1(scaling=0.01))
+    plain.run(**runArgs)
+    assert abs(projSplit.getObjective() - plain.getObjective()) < 1e-5
+
+
+def test_initial_rows():
+    projSplit = ps.ProjSplitFit()
+    projSplit.addData(A,y,loss=2)
+    projSplit.addRegularizer(L1(scaling=0.01))
+    # at least one row per block
+    projSplit.runCoarseToFine(2,seed=0,**runArgs)
+    assert len(projSplit.stageIterations) == 8
+    # all the rows at once is a plain run
+    projSplit.runCoarseToFine(n,resetIterate=True,**runArgs)
+    assert len(projSplit.stageIterations) == 1
+    with pytest.raises(Exception):
+        projSplit.runCoarseToFine(0)
@@ -0,0 +1,82 @@
+import sys
+sys.path.append('../')
+import projSplitFit as ps
+from regularizers import L1
+from regularizers import L2sq
+import numpy as np
+import pytest
+
+n = 50
+d = 100
+np.random.seed(1)
+A = np.random.normal(0,1,[n,d])
+xtrue = np.zeros(d)
+xtrue[:5] = 1.0
+y = A.dot(xtrue) + 0.1*np.random.normal(0,1,n)
+runArgs = {'nblocks':5,'primalTol':1e-6,'dualTol':1e-6}
+
+def test_weak_l1_fewer_iterations():
+    plain = ps.ProjSplitFit()
+    plain.addData(A,y,loss=2,normalize=False)
+    plain.addRegularizer(L1(scaling=1e-3))
+    plain.run(maxIterations=20000,**runArgs)
+
+    projSplit = ps.ProjSplitFit()
+    projSplit.addData(A,y,loss=2,normalize=False)
+    reg = L1(scaling=1e-3)
+    projSplit.addRegularizer(reg)
+    projSplit.run(maxIterations=20000,continuation=reg,**runArgs)
+    assert projSplit.k < plain.k
+    assert reg.getScaling() == 1e-3
+    assert projSplit.getObjective() < plain.getObjective() + 1e-6
+
+@pytest.mark.parametrize("embed",[False,True])
+def test_same_solution(embed):
+    projSplit = ps.ProjSplitFit()
+    reg = L1(scaling=0.05)
+    if embed:
+        projSplit.addData(A,y,loss=2,normalize=False,embed=reg)
+    else:
+        projSplit.addData(A,y,loss=2,normalize=False)
+        projSplit.addRegularizer(reg)
+    projSplit.addRegularizer(L2sq(scaling=0.01))
+    projSplit.run(continuation=True,continuationStart=20.0,continuationShrink=0.5,**runArgs)
+    assert reg.getScaling() == 0.05
+
+    cold = ps.ProjSplitFit()
+    if embed:
+        cold.addData(A,y,loss=2,normalize=False,embed=L1(scaling=0.05))
+    else:
+        cold.addData(A,y,loss=2,normalize=False)
+        cold.addRegularizer(L1(scaling=0.05))
+    cold.addRegularizer(L2sq(scaling=0.01))
+    cold.run(**runArgs)
+    assert abs(projSplit.getObjective() - cold.getObjective()) < 1e-4
+
+def test_several_responses():
+    Y = np.stack([y,-2*y],axis=1)
+    projSplit = ps.ProjSplitFit()
+    projSplit.addData(A,Y,loss=2,normalize=False)
+    projSplit.addRegularizer(L1(scaling=0.05))
+    projSplit.run(continuation=True,maxIterations=20000,**runArgs)
+    for j in range(2):
+        single = ps.ProjSplitFit()
+        single.addData(A,Y[:,j],loss=2,normalize=False)
+        single.addRegularizer(L1(scaling=0.05))
+        single.run(maxIterations=20000,**runArgs)
+        assert abs(projSplit.getObjective()[j] - single.getObjective()) < 1e-4
+
+def test_unfinished_continuation_restores_scaling():
+    projSplit = ps.ProjSplitFit()
+    projSplit.addData(A,y,loss=2,normalize=False)
+    reg = L1(scaling=1e-3)
+    projSplit.addRegularizer(reg)
+    projSplit.run(continuation=True,maxIterations=10,**runArgs)
+    assert reg.getScaling() == 1e-3
+
+def test_bad_regularizer():
+    projSplit = ps.ProjSplitFit()
+    projSplit.addData(A,y,loss=2,normalize=False)
+    projSplit.addRegularizer(L1())
+    with pytest.raises(Exception):
+        projSplit.run(continuation=L1())
@@ -0,0 +1,107 @@
+import sys
+sys.path.append('../')
+import projSplitFit as ps
+import lossProcessors as lp
+from regularizers import L1
+import numpy as np
+import scipy.sparse as sp
+import pytest
+
+n = 120
+d = 15
+np.random.seed(7)
+A = np.random.normal(0,1,[n,d])
+xtrue = np.zeros(d)
+xtrue[:4] = np.random.normal(0,1,4)
+y = A.dot(xtrue) + 0.1*np.random.normal(0,1,n)
+runArgs = {'primalTol':1e-8,'dualTol':1e-8,'maxIterations':5000}
+
+@pytest.mark.parametrize("process",[lp.Forward2Backtrack(),lp.BackwardExact()])
+def test_matches_separate_fits(process):
+    projSplit = ps.ProjSplitFit()
+    projSplit.addData(A,y,loss=2,process=process)
+    projSplit.addRegularizer(L1(scaling=0.05))
+    nFolds = 4
+    heldOut = projSplit.crossValidate(nFolds,seed=3,blocksPerFold=2,**runArgs)
+    assert heldOut.shape == (nFolds,)
+
+    order = np.random.default_rng(3).permutation(n)
+    Anorm = projSplit.A[order]
+    yperm = y[order]
+    foldSize = n//nFolds
+    for k in range(nFolds):
+        test = np.arange(k*foldSize,(k+1)*foldSize)
+        train = np.setdiff1d(np.arange(n),test)
+        fold = ps.ProjSplitFit()
+        fold.addData(Anorm[train,1:],yperm[train],loss=2,normalize=False)
+        fold.addRegularizer(L1(scaling=0.05))
+        fold.run(**runArgs)
+        z = fold.getSolution()
+        expected = np.mean(0.5*(Anorm[test].dot(z) - yperm[test])**2)
+        assert abs(heldOut[k] - expected) < 1e-6
+
+
+def test_threads_and_path():
+    projSplit = ps.ProjSplitFit()
+    projSplit.addData(A,y,loss=2)
+    projSplit.addRegularizer(L1(scaling=0.05))
+    scalings = [0.5,0.1,0.02]
+    sequential = projSplit.crossValidate(3,scalings=scalings,seed=0,**runArgs)
+    threaded = projSplit.crossValidate(3,scalings=scalings,seed=0,nJobs=3,**runArgs)
+    assert sequential.shape == (3,len(scalings))
+    assert np.abs(sequential - threaded).max() < 1e-6
+    # the fold problems leave this one untouched
+    assert projSplit.allRegularizers[0].getScaling() == 0.05
+    assert projSplit.runCalled == False
+
+
+def test_sparse():
+    Asparse = sp.csr_matrix(A*(np.random.uniform(0,1,[n,d]) < 0.4))
+    projSplit = ps.ProjSplitFit()
+    projSplit.addData(Asparse,y,loss=2)
+    projSplit.addRegularizer(L1(scaling=0.05))
+    # run() may be called repeatedly on sparse data
+    projSplit.run(nblocks=2,maxIterations=100)
+    projSplit.run(nblocks=3,maxIterations=100)
+    sparseLoss = projSplit.crossValidate(3,scalings=[0.2,0.05],seed=1,**runArgs)
+
+    projSplit = ps.ProjSplitFit()
+    projSplit.addData(Asparse.toarray(),y,loss=2)
+    projSplit.addRegularizer(L1(scaling=0.05))
+    denseLoss = projSplit.crossValidate(3,scalings=[0.2,0.05],seed=1,**runArgs)
+    assert np.abs(sparseLoss - denseLoss).max() < 1e-6
+
+
+@pytest.mark.parametrize("sparse",[False,True])
+def test_shared_inverses(sparse,monkeypatch):
+    inversions = []
+    def countedInverse(M):
+        inversions.append(M.shape)
+        return np.linalg.inv(M)
+    monkeypatch.setattr(lp,'npinv',countedInverse)
+    Adata = A*(np.random.default_rng(2).uniform(0,1,[n,d]) < 0.4)
+    projSplit = ps.ProjSplitFit()
+    projSplit.addData(sp.csr_matrix(Adata) if sparse else Adata,y,loss=2,process=lp.BackwardExact())
+    projSplit.addRegularizer(L1(scaling=0.05))
+    heldOut = projSplit.crossValidate(4,seed=3,blocksPerFold=2,**runArgs)
+    # 4 folds of 3x2 blocks, but only 8 distinct blocks of equal size
+    assert len(inversions) == 8
+    if sparse:
+        projSplit = ps.ProjSplitFit()
+        projSplit.addData(Adata,y,loss=2,process=lp.BackwardExact())
+        projSplit.addRegularizer(L1(scaling=0.05))
+        assert np.abs(projSplit.crossValidate(4,seed=3,blocksPerFold=2,**runArgs)
+                      - heldOut).max() < 1e-6
+
+
+def test_bad_input():
+    projSplit = ps.ProjSplitFit()
+    with pytest.raises(Exception):
+        projSplit.crossValidate(3)
+    projSplit.addData(A,y,loss=2)
+    with pytest.raises(Exception):
+        projSplit.crossValidate(1)
+    with pytest.raises(Exception):
+        projSplit.crossValidate(3,nblocks=2)
+    with pytest.raises(Exception):
+        projSplit.crossValidate(3,scalings=[0.1],regularizer=L1())
@@ -0,0 +1,56 @@
+import sys
+sys.path.append('../')
+import projSplitFit as ps
+import projSplitUtils as ut
+import lossProcessors as lp
+from regularizers import L1
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import aslinearoperator
+import pytest
+
+rng = np.random.default_rng(11)
+m = 60
+dObs = 30
+d = 20
+Adense = rng.normal(0,1,[m,dObs])
+Asparse = sp.random(m,dObs,density=0.3,random_state=1,format='csr')
+Hsparse = sp.random(dObs,d,density=0.2,random_state=2,format='csr')
+y = rng.normal(0,1,m)
+runArgs = {'nblocks':3,'blockActivation':'cyclic','primalTol':1e-7,'dualTol':1e-7,
+           'maxIterations':5000}
+
+@pytest.mark.parametrize("A",[Adense,Asparse])
+@pytest.mark.parametrize("H",[Hsparse.toarray(),Hsparse,aslinearoperator(Hsparse)])
+@pytest.mark.parametrize("process",[lp.Forward2Backtrack(),lp.BackwardExact()])
+def test_same_solution(A,H,process):
+    fits = []
+    for formProduct in [False,True]:
+        projSplit = ps.ProjSplitFit()
+        projSplit.addData(A,y,loss=2,process=process,linearOp=H,formProduct=formProduct)
+        projSplit.addRegularizer(L1(scaling=0.02))
+        projSplit.run(**runArgs)
+        fits.append(projSplit)
+    assert fits[1].dataProduct
+    assert fits[1].sparseObservationMtx == (sp.issparse(A) and sp.issparse(H))
+    assert abs(fits[0].getObjective() - fits[1].getObjective()) < 1e-6
+    assert np.abs(fits[0].getSolution() - fits[1].getSolution()).max() < 1e-3
+
+def test_auto():
+    # A H is dense and much wider than A with a sparse H
+    assert ut.productIsCheaper(Asparse,rng.normal(0,1,[dObs,3]))
+    assert not ut.productIsCheaper(Asparse,rng.normal(0,1,[dObs,100]))
+    assert not ut.productIsCheaper(Asparse,aslinearoperator(Hsparse))
+    projSplit = ps.ProjSplitFit()
+    projSplit.addData(Asparse,y,loss=2,linearOp=rng.normal(0,1,[dObs,3]),formProduct='auto')
+    assert projSplit.dataProduct
+    projSplit.addData(Asparse,y,loss=2,linearOp=aslinearoperator(Hsparse),formProduct='auto')
+    assert not projSplit.dataProduct
+
+def test_embed_and_bad_input():
+    projSplit = ps.ProjSplitFit()
+    projSplit.addData(Adense,y,loss=2,linearOp=Hsparse,embed=L1(scaling=0.02),formProduct=True)
+    assert not projSplit.dataProduct
+    assert projSplit.linOpUsedWithLoss
+    with pytest.raises(Exception):
+        projSplit.addData(Adense,y,loss=2,linearOp=Hsparse,formProduct='always')
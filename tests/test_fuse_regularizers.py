@@ -0,0 +1,90 @@
+import sys
+sys.path.append('../')
+import projSplitFit as ps
+import regularizers as rg
+from regularizers import L1, L2sq, nonnegative, fuseRegularizers
+import numpy as np
+import pytest
+
+rng = np.random.default_rng(8)
+n = 60
+d = 30
+A = rng.normal(0,1,[n,d])
+y = A.dot(rng.normal(0,1,d)) + 0.1*rng.normal(0,1,n)
+runArgs = {'nblocks':3,'blockActivation':'cyclic','primalTol':1e-7,'dualTol':1e-7,
+           'maxIterations':20000}
+
+def test_prox():
+    x = rng.normal(0,1,[d,2])
+    step = 0.7
+    l1 = L1(scaling=0.3,step=step)
+    l2 = L2sq(scaling=0.5)
+    fused = fuseRegularizers([l1,l2],d)
+    assert len(fused) == 1 and fused[0].parts == [l2,l1]
+    expected = np.sign(x)*np.maximum(abs(x) - 0.3*step,0)/(1 + 0.5*step)
+    assert np.abs(fused[0].getProx(x) - expected).max() < 1e-14
+    assert abs(fused[0].evaluate(x[:,0]) - l1.evaluate(x[:,0]) - l2.evaluate(x[:,0])) < 1e-12
+
+    fused = fuseRegularizers([nonnegative(step=step),l1],d)
+    assert len(fused) == 1
+    assert np.abs(fused[0].getProx(x) - np.maximum(x - 0.3*step,0)).max() < 1e-14
+
+    # scalings are read when the prox is taken
+    l1.setScaling(0.1)
+    assert np.abs(fused[0].getProx(x) - np.maximum(x - 0.1*step,0)).max() < 1e-14
+
+def test_groups():
+    l1 = L1()
+    group = rg.groupL2(d,[range(0,10),range(10,30)])
+    # the group norm is not separable, so it cannot take the constraint
+    constraint = nonnegative()
+    assert fuseRegularizers([group,constraint],d) == [group,constraint]
+    # only one regularizer besides quadratics and constraints is fused
+    l2 = L2sq()
+    fused = fuseRegularizers([group,l1,l2],d)
+    assert len(fused) == 2
+    assert fused[0].parts == [l2,group] and fused[1] is l1
+    assert fuseRegularizers([group,l1],d) == [group,l1]
+
+@pytest.mark.parametrize("regs",[lambda: [L1(scaling=0.05),L2sq(scaling=0.1)],
+                                 lambda: [nonnegative(),L1(scaling=0.05)],
+                                 lambda: [L1(scaling=0.05),nonnegative(),L2sq(scaling=0.1)]])
+def test_same_solution(regs):
+    fits = []
+    for fuse in [True,False]:
+        projSplit = ps.ProjSplitFit()
+        projSplit.addData(A,y,loss=2,normalize=False)
+        for reg in regs():
+            projSplit.addRegularizer(reg)
+        projSplit.run(fuseRegularizers=fuse,**runArgs)
+        fits.append(projSplit)
+    assert fits[0].numRegs == 1
+    assert fits[1].numRegs == len(regs())
+    assert abs(fits[0].getObjective() - fits[1].getObjective()) < 1e-6
+    assert np.abs(fits[0].getSolution() - fits[1].getSolution()).max() < 1e-4
+
+def test_linear_ops_and_rerun():
+    projSplit = ps.ProjSplitFit()
+    projSplit.addData(A,y,loss=2,normalize=False)
+    l1 = L1(scaling=0.05)
+    projSplit.addRegularizer(L1(scaling=0.01),linearOp=np.eye(d)[:-1] - np.eye(d)[1:])
+    projSplit.addRegularizer(l1)
+    projSplit.addRegularizer(nonnegative())
+    projSplit.run(fuseRegularizers=True,**runArgs)
+    assert projSplit.numRegs == 2
+    assert len(projSplit.allRegularizers) == 3
+    assert projSplit.getSolution()[1:].min() >= -1e-6
+
+    # a further regularizer undoes the earlier fusing
+    projSplit.addRegularizer(L2sq(scaling=0.1))
+    projSplit.run(fuseRegularizers=True,**runArgs)
+    assert projSplit.numRegs == 2
+    assert len(projSplit.regBlocks[-1].parts) == 3
+    # a run without fusing has a block per regularizer, and starts again from zero
+    projSplit.run(maxIterations=1)
+    assert projSplit.numRegs == 4
+    assert len(projSplit.xreg) == 4
+
+    heldOut = projSplit.crossValidate(3,scalings=[0.2,0.05],regularizer=l1,seed=0,
+                                      primalTol=1e-6,dualTol=1e-6,fuseRegularizers=True)
+    assert heldOut.shape == (3,2)
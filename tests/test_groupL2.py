@@ -0,0 +1,51 @@
+import sys
+sys.path.append('../')
+from regularizers import groupL2
+import numpy as np
+import pytest
+
+def loopProx(x,groups,scale):
+    v = np.array(x,dtype=float)
+    for group in groups:
+        groupNorm = np.linalg.norm(x[group],2)
+        if groupNorm > scale:
+            v[group] = (groupNorm - scale)*x[group]/groupNorm
+        else:
+            v[group] = 0.0
+    return v
+
+def test_matches_loop():
+    rng = np.random.default_rng(3)
+    d = 200
+    perm = [int(i) for i in rng.permutation(d)]
+    groups = [perm[0:7],perm[7:8],perm[8:50],[],perm[50:120],range(0,0)]
+    groups += [np.array(perm[120+10*i:130+10*i]) for i in range(5)]
+    reg = groupL2(d,groups,scaling=1.5,step=2.0)
+    scale = 3.0
+    for x in [rng.normal(0,1,d),5*rng.normal(0,1,d)]:
+        assert np.abs(reg.getProx(x) - loopProx(x,groups,scale)).max() < 1e-12
+        value = sum(np.linalg.norm(x[group],2) for group in groups if len(group) > 0)
+        assert abs(reg.evaluate(x) - 1.5*value) < 1e-10
+
+    # one column per response
+    X = rng.normal(0,2,[d,3])
+    proxX = reg.getProx(X)
+    values = reg.evaluate(X)
+    assert values.shape == (3,)
+    for j in range(3):
+        assert np.abs(proxX[:,j] - loopProx(X[:,j],groups,scale)).max() < 1e-12
+        assert abs(values[j] - reg.evaluate(X[:,j])) < 1e-10
+
+def test_other_iterables():
+    reg = groupL2(6,[range(0,3),(i for i in [3,4])])
+    x = np.arange(6.0)
+    assert np.abs(reg.getProx(x) - loopProx(x,[[0,1,2],[3,4]],1.0)).max() < 1e-12
+    reg = groupL2(4,[])
+    assert np.all(reg.getProx(x[:4]) == x[:4])
+    assert reg.evaluate(x[:4]) == 0.0
+
+@pytest.mark.parametrize("groups",[[[0,1],[2,1.5]],[[0,1],[2,'a']],[[0,-1]],[[0,10]],
+                                   [[0,1],[1,2]],[[0,0]]])
+def test_invalid_groups(groups):
+    with pytest.raises(Exception):
+        groupL2(10,groups)
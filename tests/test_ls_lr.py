@@ -32,13 +32,13 @@ else:
 
 
 
-@pytest.mark.parametrize("gf",[(1.0),(1.1),(1.2),(1.5)])
-def test_f1backtrack(gf):
+@pytest.mark.parametrize("gf,batch",[(1.0,1),(1.1,1),(1.2,1),(1.5,1),(1.0,3),(1.5,3)])
+def test_f1backtrack(gf,batch):
 
     projSplit = ps.ProjSplitFit()
     m = 10
     d = 20
-    if getNewOptVals and (gf==1.0):
+    if getNewOptVals and (gf==1.0) and (batch==1):
         A = np.random.normal(0,1,[m,d])
         y = np.random.normal(0,1,m)
         cache['Af1bt']=A
@@ -48,7 +48,7 @@ def test_f1backtrack(gf):
         y=cache['yf1bt']
 
 
-    processor = lp.Forward1Backtrack(growFactor=gf,growFreq=10)
+    processor = lp.Forward1Backtrack(growFactor=gf,growFreq=10,trialBatch=batch)
 
     projSplit.setDualScaling(1e-1)
     projSplit.addData(A,y,2,processor,intercept=True,normalize=True)
@@ -61,7 +61,7 @@ def test_f1backtrack(gf):
                   primalTol=1e-3,dualTol=1e-3,nblocks=5)
     ps_val = projSplit.getObjective()
 
-    if getNewOptVals and (gf==1.0):
+    if getNewOptVals and (gf==1.0) and (batch==1):
         AwithIntercept = np.zeros((m,d+1))
         AwithIntercept[:,0] = np.ones(m)
         AwithIntercept[:,1:(d+1)] = A
@@ -78,13 +78,13 @@ def test_f1backtrack(gf):
     assert ps_val - LSval < 1e-2
 
 
-@pytest.mark.parametrize("gf",[(1.0),(1.1),(1.2),(1.5)])
-def test_f2backtrack(gf):
+@pytest.mark.parametrize("gf,batch",[(1.0,1),(1.1,1),(1.2,1),(1.5,1),(1.0,3),(1.5,3)])
+def test_f2backtrack(gf,batch):
 
     projSplit = ps.ProjSplitFit()
     m = 10
     d = 20
-    if getNewOptVals and (gf==1.0):
+    if getNewOptVals and (gf==1.0) and (batch==1):
         A = np.random.normal(0,1,[m,d])
         y = np.random.normal(0,1,m)
         cache['Af2bt']=A
@@ -93,7 +93,7 @@ def test_f2backtrack(gf):
         A=cache['Af2bt']
         y=cache['yf2bt']
 
-    processor = lp.Forward2Backtrack(growFactor=gf,growFreq=10)
+    processor = lp.Forward2Backtrack(growFactor=gf,growFreq=10,trialBatch=batch)
 
     projSplit.setDualScaling(1e-1)
     projSplit.addData(A,y,2,processor,intercept=True,normalize=True)
@@ -102,7 +102,7 @@ def test_f2backtrack(gf):
     ps_val = projSplit.getObjective()
 
 
-    if getNewOptVals and (gf==1.0):
+    if getNewOptVals and (gf==1.0) and (batch==1):
         AwithIntercept = np.zeros((m,d+1))
         AwithIntercept[:,0] = np.ones(m)
         AwithIntercept[:,1:(d+1)] = A
@@ -116,6 +116,25 @@ def test_f2backtrack(gf):
     assert ps_val - LSval < 1e-2
 
 
+autoProcessors = [lp.Forward2Fixed(autoStep=True),lp.Forward2Backtrack(autoStep=True),
+                  lp.Forward2BB(autoStep=True),lp.Forward1Fixed(autoStep=True),
+                  lp.Forward1Backtrack(autoStep=True)]
+@pytest.mark.parametrize("processor",autoProcessors)
+def test_autoStep(processor):
+    # unnormalized, badly scaled data: stepsizes must come from the
+    # Lipschitz estimates. Scaling A does not change the least-squares value.
+    projSplit = ps.ProjSplitFit()
+    A = 10.0*cache['Af2bt']
+    y = cache['yf2bt']
+
+    projSplit.setDualScaling(1e-2)
+    projSplit.addData(A,y,2,processor,intercept=True,normalize=False)
+    projSplit.run(maxIterations = 20000,primalTol=1e-4,dualTol=1e-4,nblocks=5)
+    ps_val = projSplit.getObjective()
+
+    assert ps_val - cache['optf2bt'] < 1e-2
+
+
 stepsize = 1e-1
 f2fixed = lp.Forward2Fixed(stepsize)
 f2backtrack = lp.Forward2Backtrack()
@@ -312,7 +331,8 @@ f1bt = lp.Forward1Backtrack()
 back_exact = lp.BackwardExact()
 backCG = lp.BackwardCG()
 backLBFGS = lp.BackwardLBFGS()
-@pytest.mark.parametrize("processor",[(backLBFGS),(f2fixed),(f2bt),(f2affine),(f1fixed),(f1bt),(back_exact),(backCG)])
+f2bb = lp.Forward2BB()
+@pytest.mark.parametrize("processor",[(backLBFGS),(f2fixed),(f2bt),(f2affine),(f1fixed),(f1bt),(back_exact),(backCG),(f2bb)])
 def test_ls_blocks(processor):
     processor.setStep(5e-1)
     projSplit = ps.ProjSplitFit()
@@ -380,7 +400,10 @@ f2bt = lp.Forward2Backtrack()
 f1fixed = lp.Forward1Fixed()
 f1bt = lp.Forward1Backtrack()
 backLBFGS = lp.BackwardLBFGS()
-processors = [f2fixed,f2bt,f1fixed,f1bt,backLBFGS]
+backNewtonCG = lp.BackwardNewtonCG()
+f2bb = lp.Forward2BB()
+f2stoch = lp.Forward2Stochastic(batchSize=2)
+processors = [f2fixed,f2bt,f1fixed,f1bt,backLBFGS,backNewtonCG,f2bb,f2stoch]
 
 toDo = []
 for norm in [False,True]:
@@ -485,12 +508,13 @@ def test_blockIs1bug(processor):
 back_exact = lp.BackwardExact()
 backCG = lp.BackwardCG()
 backLBFGS = lp.BackwardLBFGS()
+backNewtonCG = lp.BackwardNewtonCG()
 
 ToDo = []
 for nblk in [1,2,10]:
     for inter in [False,True]:
         for norm in [False,True]:
-            for processor in [back_exact,backCG,backLBFGS]:
+            for processor in [back_exact,backCG,backLBFGS,backNewtonCG]:
                 ToDo.append((nblk,inter,norm,processor))
 
 @pytest.mark.parametrize("nblk,inter,norm,processor",ToDo)
@@ -548,6 +572,22 @@ def test_backward(nblk,inter,norm,processor):
     assert ps_opt - LSval <1e-2
 
 
+def test_stochastic_seed():
+    rng = np.random.default_rng(1)
+    A = rng.normal(0,1,[60,8])
+    y = rng.normal(0,1,60)
+    globalState = np.random.get_state()[1].copy()
+    solutions = []
+    for seed in [3,3,4]:
+        projSplit = ps.ProjSplitFit()
+        projSplit.addData(A,y,2,lp.Forward2Stochastic(batchSize=5,seed=seed))
+        projSplit.run(maxIterations=50,nblocks=2,blockActivation='cyclic')
+        solutions.append(projSplit.getSolution())
+    assert np.array_equal(solutions[0],solutions[1])
+    assert not np.array_equal(solutions[0],solutions[2])
+    assert np.array_equal(np.random.get_state()[1],globalState)
+
+
 def test_writeCache2Disk():
     if getNewOptVals:
         with open('results/cache_lslr','wb') as file:
@@ -0,0 +1,166 @@
+import sys
+sys.path.append('../')
+import projSplitFit as ps
+import regularizers as rg
+import numpy as np
+import pytest
+import time
+
+rng = np.random.default_rng(4)
+d = 40
+x = 2*rng.normal(0,1,d)
+X = 2*rng.normal(0,1,[d,3])
+scale = 0.8
+
+def sortedSimplex(v,radius):
+    # the projection onto the simplex by sorting
+    u = np.sort(v)[::-1]
+    css = np.cumsum(u)
+    k = np.arange(1,len(v)+1)
+    rho = np.nonzero(u*k > css - radius)[0][-1]
+    return np.maximum(v - (css[rho] - radius)/(rho + 1),0)
+
+def soft(v,t):
+    return np.sign(v)*np.maximum(abs(v) - t,0)
+
+groups = [range(0,10),range(10,25),[25,30,35]]
+
+def sparseGroupReference(v,t,alpha):
+    out = soft(v,alpha*t)
+    for group in groups:
+        group = list(group)
+        groupNorm = np.linalg.norm(out[group])
+        out[group] *= max(0,1 - (1 - alpha)*t/groupNorm) if groupNorm > 0 else 0
+    return out
+
+def test_simplex_and_balls():
+    for radius in [0.5,3.0,200.0]:
+        simplex = rg.simplex(radius,step=scale)
+        p = simplex.getProx(x)
+        assert np.abs(p - sortedSimplex(x,radius)).max() < 1e-12
+        assert abs(p.sum() - radius) < 1e-9 and p.min() >= 0
+
+        ball = rg.L1ball(radius)
+        p = ball.getProx(x)
+        if abs(x).sum() <= radius:
+            assert np.abs(p - x).max() == 0
+        else:
+            assert np.abs(p - np.sign(x)*sortedSimplex(abs(x),radius)).max() < 1e-12
+    # ties and a vector already on the simplex
+    assert np.abs(rg.simplex(1.0).getProx(np.ones(4)) - 0.25).max() < 1e-15
+    onSimplex = np.array([0.2,0.0,0.5,0.3])
+    assert np.abs(rg.simplex(1.0).getProx(onSimplex) - onSimplex).max() < 1e-15
+
+    linf = rg.Linf(scaling=2.0,step=scale)
+    p = linf.getProx(x)
+    assert np.abs(p - (x - np.sign(x)*sortedSimplex(abs(x),2.0*scale))).max() < 1e-12
+    assert abs(linf.evaluate(x) - 2.0*abs(x).max()) < 1e-12
+
+def medianOfThreeAdversary(d):
+    # values chosen lazily so that the median of the first, middle and last
+    # candidates is always among the smallest remaining, which made earlier
+    # pivot choices take a number of rounds proportional to d
+    values = np.full(d,np.nan)
+    positions = np.arange(d)
+    low = 0.0
+    while len(positions) > 0:
+        picks = positions[[0,len(positions)//2,-1]]
+        for p in picks:
+            if np.isnan(values[p]):
+                values[p] = low
+                low += 1
+        pivot = np.median(values[picks])
+        known = ~np.isnan(values[positions])
+        keep = np.ones(len(positions),dtype=bool)
+        keep[known] = values[positions[known]] > pivot
+        positions = positions[keep]
+    return values
+
+def test_simplex_adversarial():
+    v = medianOfThreeAdversary(20000)
+    start = time.time()
+    p = rg.simplex().getProx(v)
+    assert time.time() - start < 0.1
+    assert np.abs(p - sortedSimplex(v,1.0)).max() < 1e-12
+    assert np.abs(rg.L1ball().getProx(-v) + sortedSimplex(v,1.0)).max() < 1e-12
+
+def test_separable():
+    net = rg.elasticNet(alpha=0.3,scaling=2.0,step=scale)
+    assert np.abs(net.getProx(x) - soft(x,0.3*2.0*scale)/(1 + 0.7*2.0*scale)).max() < 1e-12
+    assert abs(net.evaluate(x) - 2.0*(0.3*abs(x).sum() + 0.35*(x**2).sum())) < 1e-9
+
+    lower = -np.ones(d)
+    lower[:5] = 0.0
+    box = rg.box(lower,1.5)
+    assert np.abs(box.getProx(X) - np.clip(X,lower[:,None],1.5)).max() == 0
+    assert np.abs(rg.nonnegative().getProx(x) - np.maximum(x,0)).max() == 0
+    with pytest.raises(Exception):
+        rg.box(1.0,0.0)
+
+    assert net.separable and box.separable
+    for reg in [rg.simplex(),rg.L1ball(),rg.Linf(),rg.SLOPE(np.ones(d)),
+                rg.sparseGroupLasso(d,groups)]:
+        assert not reg.separable
+
+def test_sparse_group_lasso():
+    reg = rg.sparseGroupLasso(d,groups,alpha=0.4,scaling=1.5,step=scale)
+    assert np.abs(reg.getProx(x) - sparseGroupReference(x,1.5*scale,0.4)).max() < 1e-12
+    groupNorms = sum(np.linalg.norm(x[list(group)]) for group in groups)
+    assert abs(reg.evaluate(x) - 1.5*(0.4*abs(x).sum() + 0.6*groupNorms)) < 1e-9
+
+def test_slope():
+    # equal weights give the L1 prox, and (1,0,...,0) the Linf prox
+    assert np.abs(rg.SLOPE(np.ones(d),step=scale).getProx(x) - soft(x,scale)).max() < 1e-12
+    first = np.zeros(d)
+    first[0] = 1.0
+    assert np.abs(rg.SLOPE(first,step=scale).getProx(x)
+                  - rg.Linf(step=scale).getProx(x)).max() < 1e-12
+
+    weights = np.sort(rng.uniform(0,1,d))[::-1]
+    reg = rg.SLOPE(weights,step=scale)
+    p = reg.getProx(x)
+    value = lambda v: scale*reg.evaluate(v) + 0.5*np.sum((v - x)**2)
+    for _ in range(100):
+        assert value(p) <= value(p + 0.01*rng.normal(0,1,d)) + 1e-12
+    with pytest.raises(Exception):
+        rg.SLOPE(weights[::-1])
+
+def test_slope_without_isotonic_regression(monkeypatch):
+    # older SciPy: the module still imports, and only SLOPE is unavailable
+    import scipy.optimize
+    monkeypatch.delattr(scipy.optimize,'isotonic_regression')
+    with pytest.raises(Exception,match='SciPy 1.12'):
+        rg.SLOPE(np.ones(d))
+    assert np.abs(rg.simplex().getProx(x) - sortedSimplex(x,1.0)).max() < 1e-12
+
+@pytest.mark.parametrize("reg",[rg.simplex(2.0),rg.L1ball(2.0),rg.Linf(),rg.elasticNet(),
+                                rg.box(-0.5,0.5),rg.sparseGroupLasso(d,groups),
+                                rg.SLOPE(np.linspace(1,0,d))])
+def test_columns(reg):
+    P = reg.getProx(X)
+    for j in range(X.shape[1]):
+        assert np.abs(P[:,j] - reg.getProx(X[:,j])).max() < 1e-12
+        assert abs(reg.evaluate(X)[j] - reg.evaluate(X[:,j])) < 1e-9
+
+def test_fit():
+    n = 50
+    A = rng.normal(0,1,[n,d])
+    y = A.dot(np.abs(rng.normal(0,1,d))/d) + 0.1*rng.normal(0,1,n)
+    projSplit = ps.ProjSplitFit()
+    projSplit.addData(A,y,loss=2,intercept=False,normalize=False)
+    projSplit.addRegularizer(rg.simplex(1.0))
+    projSplit.run(nblocks=2,primalTol=1e-7,dualTol=1e-7,maxIterations=20000)
+    z = projSplit.getSolution()
+    assert abs(z.sum() - 1.0) < 1e-4 and z.min() > -1e-4
+
+    fits = []
+    for fuse in [True,False]:
+        projSplit = ps.ProjSplitFit()
+        projSplit.addData(A,y,loss=2,normalize=False)
+        projSplit.addRegularizer(rg.L1(scaling=0.05))
+        projSplit.addRegularizer(rg.box(-0.1,0.1))
+        projSplit.run(fuseRegularizers=fuse,nblocks=2,primalTol=1e-8,dualTol=1e-8,
+                      maxIterations=20000)
+        fits.append(projSplit)
+    assert fits[0].numRegs == 1
+    assert np.abs(fits[0].getSolution() - fits[1].getSolution()).max() < 1e-4
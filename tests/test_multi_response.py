@@ -0,0 +1,107 @@
+
+import sys
+sys.path.append('../')
+import projSplitFit as ps
+import lossProcessors as lp
+from regularizers import L1
+from regularizers import L2
+from regularizers import groupL2
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+
+m = 40
+d = 12
+K = 3
+np.random.seed(2)
+A = np.random.normal(0,1,[m,d])
+Y = np.random.normal(0,1,[m,K])
+Ylr = 2.0*(np.random.normal(0,1,[m,K]) > 0) - 1.0
+G = np.random.normal(0,1,[4,d])
+groups = [[0,1,2],[3,4,5,6]]
+
+def fit(A,y,loss,process,intercept,embed,linOp,useGroup):
+    projSplit = ps.ProjSplitFit()
+    if embed:
+        projSplit.addData(A,y,loss=loss,process=process(),intercept=intercept,
+                          normalize=False,embed=L1(scaling=0.05))
+    else:
+        projSplit.addData(A,y,loss=loss,process=process(),intercept=intercept,
+                          normalize=False)
+        projSplit.addRegularizer(L1(scaling=0.05))
+    if linOp:
+        projSplit.addRegularizer(L2(scaling=0.02),linearOp=G)
+    if useGroup:
+        projSplit.addRegularizer(groupL2(d,groups,scaling=0.03))
+    projSplit.run(nblocks=3,maxIterations=5000,primalTol=1e-8,dualTol=1e-8)
+    return projSplit
+
+processors = [lambda: lp.Forward2Backtrack(),lambda: lp.Forward2Fixed(autoStep=True),
+              lambda: lp.Forward1Fixed(autoStep=True),lambda: lp.BackwardExact()]
+
+@pytest.mark.parametrize("process",processors)
+@pytest.mark.parametrize("intercept,embed,linOp,useGroup",
+                         [(False,False,False,False),(True,False,True,False),
+                          (True,True,False,True),(False,False,True,True)])
+def test_matches_single(process,intercept,embed,linOp,useGroup):
+    if embed and (process()).embedOK == False:
+        return
+    projSplit = fit(A,Y,2,process,intercept,embed,linOp,useGroup)
+    Z = projSplit.getSolution()
+    obj = projSplit.getObjective()
+    assert Z.shape == (d+int(intercept),K)
+    assert obj.shape == (K,)
+    assert projSplit.getPrimalViolation().max() < 1e-8
+    assert projSplit.getDualViolation().max() < 1e-8
+    for k in range(K):
+        single = fit(A,Y[:,k],2,process,intercept,embed,linOp,useGroup)
+        assert np.abs(single.getSolution() - Z[:,k]).max() < 1e-6
+        assert abs(single.getObjective() - obj[k]) < 1e-6
+
+
+@pytest.mark.parametrize("sparse",[False,True])
+def test_logistic_sparse(sparse):
+    Ause = csr_matrix(A) if sparse else A
+    projSplit = fit(Ause,Ylr,'logistic',lambda: lp.Forward2Backtrack(),True,False,False,False)
+    Z = projSplit.getSolution()
+    for k in range(K):
+        single = fit(Ause,Ylr[:,k],'logistic',lambda: lp.Forward2Backtrack(),True,False,False,False)
+        assert np.abs(single.getSolution() - Z[:,k]).max() < 1e-6
+
+
+def test_frozen_and_history():
+    # the second response is already solved by zero, so converges first
+    Yeasy = np.copy(Y)
+    Yeasy[:,1] = 0.0
+    projSplit = ps.ProjSplitFit()
+    projSplit.addData(A,Yeasy,loss=2,intercept=True,normalize=False)
+    projSplit.addRegularizer(L1(scaling=0.05))
+    projSplit.run(nblocks=2,keepHistory=True,historyFreq=1,maxIterations=300)
+    hist = projSplit.getHistory()
+    assert hist.shape[0] == 5
+    assert abs(hist[0][-1] - np.sum(projSplit.getObjective())) < 1e-6
+    assert np.abs(projSplit.getSolution()[:,1]).max() == 0.0
+
+    # continue the run from the stored state to a tighter tolerance
+    projSplit.run(nblocks=2,primalTol=1e-8,dualTol=1e-8,maxIterations=5000)
+    assert projSplit.getPrimalViolation().max() < 1e-8
+    assert projSplit.getSolution(ergodic="weighted").shape == (d+1,K)
+
+
+def test_unsupported_processor():
+    projSplit = ps.ProjSplitFit()
+    projSplit.addData(A,Y,loss=2,process=lp.BackwardLBFGS(),normalize=False)
+    assert type(projSplit.process) is lp.Forward2Backtrack
+
+
+def test_verbose(capsys):
+    Yeasy = np.copy(Y)
+    Yeasy[:,1] = 0.0
+    projSplit = ps.ProjSplitFit()
+    projSplit.addData(A,Yeasy,loss=2,normalize=False)
+    projSplit.addRegularizer(L1(scaling=0.1))
+    projSplit.run(nblocks=2,maxIterations=201,primalTol=1e-9,dualTol=1e-9,verbose=True)
+    lines = [line for line in capsys.readouterr().out.splitlines() if line.startswith('iteration')]
+    assert len(lines) == 3
+    assert lines[0].endswith('converged responses = 0/{}'.format(K))
+    assert lines[-1].endswith('converged responses = 1/{}'.format(K))
@@ -0,0 +1,89 @@
+import sys
+sys.path.append('../')
+import projSplitFit as ps
+from copy import copy
+from regularizers import nuclearNorm, Regularizer
+import numpy as np
+import pytest
+
+rng = np.random.default_rng(6)
+m = 30
+n = 20
+Z = rng.normal(0,1,[m,3]).dot(rng.normal(0,1,[3,n]))
+
+def svt(x,scale):
+    U,s,Vt = np.linalg.svd(x.reshape(m,n),full_matrices=False)
+    return ((U*np.maximum(s - scale,0)).dot(Vt)).reshape(-1)
+
+@pytest.mark.parametrize("threshold",[0.5,3.0,50.0,1e-3])
+def test_prox(threshold):
+    reg = nuclearNorm((m,n),scaling=threshold)
+    assert reg.getRank() is None
+    for i in range(3):
+        # a few nearby points, as in consecutive iterations
+        x = (Z + 0.1*rng.normal(0,1,[m,n])).reshape(-1)
+        p = reg.getProx(x)
+        assert np.abs(p - svt(x,threshold)).max() < 1e-8
+        assert reg.getRank() == np.linalg.matrix_rank(p.reshape(m,n),tol=1e-8)
+    assert abs(reg.evaluate(x) - threshold*np.linalg.svd(x.reshape(m,n),compute_uv=False).sum()) < 1e-9
+
+def test_columns_and_copies():
+    # responses of ranks 3, 1 and 0 after thresholding
+    X = np.stack([Z.reshape(-1),np.outer(rng.normal(0,1,m),rng.normal(0,1,n)).reshape(-1),
+                  0.01*rng.normal(0,1,m*n)],axis=1)
+    reg = nuclearNorm((m,n),scaling=0.5)
+    for i in range(2):
+        P = reg.getProx(X + 0.01*i)
+        for j in range(3):
+            assert np.abs(P[:,j] - svt(X[:,j] + 0.01*i,0.5)).max() < 1e-8
+        assert list(reg.getRank()) == [3,1,0]
+        assert np.abs(reg.evaluate(X)[1] - reg.evaluate(X[:,1])).max() < 1e-9
+
+    # a copy starts from the same subspaces but keeps its own
+    other = copy(reg)
+    assert other.prox is not reg.prox
+    other.getProx(X[:,0])
+    assert other.getRank() == 3
+    assert list(reg.getRank()) == [3,1,0]
+    assert len(reg.prox.V) == 3
+
+def test_bad_input():
+    with pytest.raises(Exception):
+        nuclearNorm((m,))
+    with pytest.raises(Exception):
+        nuclearNorm((m,0))
+
+def test_multitask():
+    # tasks sharing their observations, with coefficients W of rank 2
+    p,T,nobs = 20,12,50
+    W = rng.normal(0,1,[p,2]).dot(rng.normal(0,1,[2,T]))
+    X = rng.normal(0,1,[nobs,p])
+    # row j*T+t of A z is (X W)[j,t] for z = W.reshape(-1)
+    A = np.kron(X,np.eye(T))
+    y = X.dot(W).reshape(-1) + 0.1*rng.normal(0,1,nobs*T)
+    taskNorm = lambda x: np.linalg.svd(x.reshape(p,T),compute_uv=False).sum()
+    def taskProx(x,scale):
+        U,s,Vt = np.linalg.svd(x.reshape(p,T),full_matrices=False)
+        return ((U*np.maximum(s - scale,0)).dot(Vt)).reshape(-1)
+
+    fits = []
+    for reg in [nuclearNorm((p,T),scaling=0.05),
+                Regularizer(taskProx,taskNorm,scaling=0.05,testLength=p*T)]:
+        projSplit = ps.ProjSplitFit()
+        projSplit.addData(A,y,loss=2,intercept=False,normalize=False)
+        projSplit.addRegularizer(reg)
+        projSplit.run(nblocks=2,primalTol=1e-7,dualTol=1e-7,maxIterations=5000)
+        fits.append(projSplit)
+    assert abs(fits[0].getObjective() - fits[1].getObjective()) < 1e-6
+    assert np.abs(fits[0].getSolution() - fits[1].getSolution()).max() < 1e-4
+    assert fits[0].allRegularizers[0].getRank() == 2
+    assert np.linalg.matrix_rank(fits[0].getSolution().reshape(p,T),tol=1e-6) == 2
+
+    # the folds are solved concurrently on copies of the regularizer
+    projSplit = fits[0]
+    V = np.copy(projSplit.allRegularizers[0].prox.V)
+    heldOut = [projSplit.crossValidate(3,seed=1,nJobs=nJobs,primalTol=1e-7,dualTol=1e-7,
+                                       maxIterations=5000) for nJobs in [1,3]]
+    assert np.abs(heldOut[0] - heldOut[1]).max() < 1e-6
+    assert projSplit.allRegularizers[0].getRank() == 2
+    assert np.array_equal(projSplit.allRegularizers[0].prox.V,V)
@@ -0,0 +1,117 @@
+import sys
+sys.path.append('../')
+import projSplitFit as ps
+import projSplitUtils as ut
+import lossProcessors as lp
+from regularizers import L1
+import numpy as np
+from scipy.sparse.linalg import aslinearoperator
+import pytest
+
+rng = np.random.default_rng(5)
+m = 80
+d = 25
+A = rng.normal(0,1,[m,d])
+y = rng.normal(0,1,m)
+ylogistic = np.sign(rng.normal(0,1,m))
+runArgs = {'nblocks':4,'blockActivation':'cyclic','primalTol':1e-8,'dualTol':1e-8,
+           'maxIterations':5000}
+
+class MatrixObservations(ut.ObservationOperator):
+    # products with a stored matrix, as a matrix-free operator would compute them
+    def __init__(self,M,norms=True):
+        super().__init__(M.shape)
+        self.M = M
+        self.norms = norms
+
+    def blockMatvec(self,rows,x):
+        return self.M[rows].dot(x)
+
+    def blockRmatvec(self,rows,u):
+        return self.M[rows].T.dot(u)
+
+    def rowNorms(self,rows):
+        return np.linalg.norm(self.M[rows],axis=1) if self.norms else None
+
+    def columnNorms(self):
+        return np.linalg.norm(self.M,axis=0) if self.norms else None
+
+
+def fit(observations,process,loss=2,responses=y,**addArgs):
+    projSplit = ps.ProjSplitFit()
+    projSplit.addData(observations,responses,loss=loss,process=process,**addArgs)
+    projSplit.addRegularizer(L1(scaling=0.01))
+    projSplit.run(**runArgs)
+    return projSplit
+
+@pytest.mark.parametrize("process",[lp.Forward2Backtrack(),lp.Forward2Affine(),
+                                    lp.Forward1Backtrack(),lp.BackwardCG(),
+                                    lp.BackwardLBFGS()])
+@pytest.mark.parametrize("normalize",[False,True])
+def test_same_solution(process,normalize):
+    matrix = fit(A,process,normalize=normalize)
+    free = fit(MatrixObservations(A),process,normalize=normalize)
+    assert isinstance(free.A,ut.ObservationMatrix)
+    assert abs(matrix.getObjective() - free.getObjective()) < 1e-6
+    assert np.abs(matrix.getSolution() - free.getSolution()).max() < 1e-4
+    if normalize:
+        assert np.abs(matrix.getScaling() - free.getScaling()).max() < 1e-12
+
+def test_logistic_and_responses():
+    matrix = fit(A,lp.Forward2Backtrack(),loss='logistic',responses=ylogistic)
+    free = fit(MatrixObservations(A),lp.Forward2Backtrack(),loss='logistic',responses=ylogistic)
+    assert abs(matrix.getObjective() - free.getObjective()) < 1e-6
+
+    Y = np.stack([y,-y,2*y],axis=1)
+    matrix = fit(A,lp.Forward2Backtrack(),responses=Y)
+    free = fit(MatrixObservations(A),lp.Forward2Backtrack(),responses=Y)
+    assert np.abs(matrix.getObjective() - free.getObjective()).max() < 1e-6
+
+def test_cross_validate():
+    heldOut = []
+    for observations in [A,MatrixObservations(A)]:
+        projSplit = ps.ProjSplitFit()
+        projSplit.addData(observations,y,loss=2)
+        projSplit.addRegularizer(L1(scaling=0.01))
+        heldOut.append(projSplit.crossValidate(3,seed=2,primalTol=1e-8,dualTol=1e-8))
+    assert np.abs(heldOut[0] - heldOut[1]).max() < 1e-6
+
+def test_row_blocks():
+    Afree = ut.ObservationMatrix(MatrixObservations(A),1,np.linspace(1,2,d))
+    Afull = np.concatenate((np.ones((m,1)),A*np.linspace(1,2,d)),axis=1)
+    x = rng.normal(0,1,d+1)
+    u = rng.normal(0,1,m)
+    order = rng.permutation(m)
+    for rows,full in [(range(10,30),Afull[10:30]),(slice(5,50),Afull[5:50]),
+                      (order,Afull[order])]:
+        block = Afree[rows]
+        assert block.shape == full.shape
+        assert np.abs(block.dot(x) - full.dot(x)).max() < 1e-12
+        assert np.abs(block.T.dot(u[:full.shape[0]]) - full.T.dot(u[:full.shape[0]])).max() < 1e-12
+        # blocks of blocks, as taken by crossValidate and Forward2Stochastic
+        assert np.abs(block[3:9].dot(x) - full[3:9].dot(x)).max() < 1e-12
+        assert np.abs(block[[4,1,7]].dot(x) - full[[4,1,7]].dot(x)).max() < 1e-12
+
+def test_fallbacks():
+    projSplit = ps.ProjSplitFit()
+    projSplit.addData(MatrixObservations(A),y,loss=2,process=lp.BackwardExact())
+    assert isinstance(projSplit.process,lp.Forward2Backtrack)
+    # without column norms the observations are not normalized
+    projSplit.addData(MatrixObservations(A,norms=False),y,loss=2)
+    assert projSplit.normalize == False
+    with pytest.raises(Exception):
+        projSplit.addData(aslinearoperator(A),y,loss=2)
+
+def test_stochastic():
+    projSplit = ps.ProjSplitFit()
+    projSplit.addData(MatrixObservations(A),y,loss=2,process=lp.Forward2Stochastic(batchSize=5))
+    projSplit.addRegularizer(L1(scaling=0.01))
+    projSplit.run(nblocks=2,maxIterations=200)
+    assert np.isfinite(projSplit.getObjective())
+
+def test_incomplete_operator():
+    class ForwardOnly(ut.ObservationOperator):
+        def blockMatvec(self,rows,x):
+            return A[rows].dot(x)
+    with pytest.raises(TypeError):
+        ForwardOnly(A.shape)
@@ -0,0 +1,69 @@
+
+import sys
+sys.path.append('../')
+import projSplitFit as ps
+import lossProcessors as lp
+from regularizers import L1
+from regularizers import L2sq
+import numpy as np
+import pytest
+
+m = 60
+d = 30
+np.random.seed(4)
+A = np.random.normal(0,1,[m,d])
+xtrue = np.zeros(d)
+xtrue[:5] = np.random.normal(0,1,5)
+y = A.dot(xtrue) + 0.1*np.random.normal(0,1,m)
+scalings = np.geomspace(1.0,0.02,8)
+runArgs = {'nblocks':3,'primalTol':1e-7,'dualTol':1e-7,'maxIterations':20000}
+
+@pytest.mark.parametrize("embed",[False,True])
+def test_path(embed):
+    projSplit = ps.ProjSplitFit()
+    reg = L1()
+    if embed:
+        projSplit.addData(A,y,loss=2,normalize=False,embed=reg)
+    else:
+        projSplit.addData(A,y,loss=2,normalize=False)
+        projSplit.addRegularizer(reg)
+    solutions,objectives = projSplit.fitPath(scalings,**runArgs)
+    assert solutions.shape == (d+1,len(scalings))
+    assert len(objectives) == len(scalings)
+
+    coldIterations = 0
+    for j,scaling in enumerate(scalings):
+        cold = ps.ProjSplitFit()
+        if embed:
+            cold.addData(A,y,loss=2,normalize=False,embed=L1(scaling=scaling))
+        else:
+            cold.addData(A,y,loss=2,normalize=False)
+            cold.addRegularizer(L1(scaling=scaling))
+        cold.run(**runArgs)
+        coldIterations += cold.k
+        assert abs(cold.getObjective() - objectives[j]) < 1e-5
+        if not embed:
+            assert np.abs(cold.getSolution() - solutions[:,j].toarray().ravel()).max() < 1e-4
+
+    assert projSplit.pathIterations.sum() < coldIterations
+    if not embed:
+        # the largest scaling gives a sparse solution, stored compactly
+        assert solutions[:,0].nnz < d
+
+
+def test_choose_regularizer():
+    projSplit = ps.ProjSplitFit()
+    projSplit.addData(A,y,loss=2,normalize=False)
+    reg1 = L1()
+    reg2 = L2sq(scaling=0.1)
+    projSplit.addRegularizer(reg1)
+    projSplit.addRegularizer(reg2)
+    with pytest.raises(Exception):
+        projSplit.fitPath(scalings,**runArgs)
+    with pytest.raises(Exception):
+        projSplit.fitPath(scalings,regularizer=L1(),**runArgs)
+    solutions,objectives = projSplit.fitPath(scalings[:3],regularizer=reg1,
+                                             computeObjectives=False,**runArgs)
+    assert objectives is None
+    assert reg1.getScaling() == scalings[2]
+    assert reg2.getScaling() == 0.1
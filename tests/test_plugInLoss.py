@@ -4,6 +4,7 @@ import sys
 sys.path.append('../')
 import projSplitFit as ps 
 import losses as ls
+import lossProcessors as lp
 from regularizers import L1
 
 from numpy.random import normal
@@ -37,3 +38,41 @@ def test_one_sided():
 
     assert primTol <1e-6
     assert dualTol <1e-6
+
+
+def test_value_and_derivative():
+    import numpy as np
+    yhat = np.array([-800.0,-30.0,-1.5,0.0,0.3,2.0,40.0,900.0])
+    y = np.array([1.0,-1.0,1.0,-1.0,1.0,-1.0,1.0,-1.0])
+
+    for loss in ['logistic',2,3,1.5]:
+        lossObj = ls.Loss(loss)
+        vals,derivs = lossObj.valueAndDerivative(yhat,y)
+        assert np.all(np.isfinite(vals)) and np.all(np.isfinite(derivs))
+        assert np.allclose(vals,lossObj.value(yhat,y))
+        assert np.allclose(derivs,lossObj.derivative(yhat,y))
+
+    def deriv(x,y):
+        return (x>=y)*(x-y)
+
+    def val(x,y):
+        return 0.5*(x>=y)*(x-y)**2
+
+    def valDeriv(x,y):
+        diff = (x>=y)*(x-y)
+        return 0.5*diff**2,diff
+
+    m = 30
+    d = 10
+    A = normal(0,1,[m,d])
+    yresp = normal(0,1,m)
+    results = []
+    for fused in [None,valDeriv]:
+        projSplit = ps.ProjSplitFit()
+        loss = ls.LossPlugIn(deriv,val,fused)
+        projSplit.addData(A,yresp,loss=loss,intercept=False,normalize=False,
+                          process=lp.BackwardLBFGS())
+        projSplit.addRegularizer(L1(scaling=0.01))
+        projSplit.run(keepHistory=False,nblocks=3,maxIterations=2000)
+        results.append(projSplit.getObjective())
+    assert abs(results[0]-results[1]) < 1e-5
@@ -0,0 +1,151 @@
+import sys
+sys.path.append('../')
+import projSplitFit as ps
+import projSplitUtils as ut
+from regularizers import L1
+from regularizers import L2sq
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import aslinearoperator
+import pytest
+
+rng = np.random.default_rng(5)
+
+def asMatrix(G):
+    return np.column_stack([G.matvec(e) for e in np.eye(G.shape[1])])
+
+operators = [ut.Difference1d(7),ut.Difference2d(3,4),ut.Subset(6,[4,0,2]),
+             ut.Subset(6,range(2,5)),ut.dropFirst(5),
+             ut.BlockDiagonal([ut.Difference1d(4),rng.normal(0,1,[2,3]),
+                               sp.random(3,2,density=0.5,random_state=1)]),
+             ut.Kronecker(rng.normal(0,1,[2,3]),sp.random(4,2,density=0.6,random_state=2)),
+             ut.Kronecker(ut.Difference1d(3),np.eye(2))]
+
+@pytest.mark.parametrize("G",operators)
+def test_adjoint_and_buffers(G):
+    M = asMatrix(G)
+    X = rng.normal(0,1,[G.shape[1],3])
+    U = rng.normal(0,1,[G.shape[0],3])
+    assert np.abs(G.rmatvec(U) - M.T.dot(U)).max() < 1e-12
+    assert np.abs(G.dot(X[:,0]) - M.dot(X[:,0])).max() < 1e-12
+    assert np.abs(G.H.dot(U[:,0]) - M.T.dot(U[:,0])).max() < 1e-12
+    # preallocated outputs, overwritten whatever they held
+    out = np.full((G.shape[0],3),7.0)
+    assert G.matvec(X,out=out) is out
+    assert np.abs(out - M.dot(X)).max() < 1e-12
+    out = np.full((3,G.shape[1]),7.0).T
+    G.rmatvec(U,out=out)
+    assert np.abs(out - M.T.dot(U)).max() < 1e-12
+
+def test_definitions():
+    image = rng.normal(0,1,[3,4])
+    D = ut.Difference2d(3,4).dot(image.ravel())
+    assert np.abs(D[:8] - (image[:-1] - image[1:]).ravel()).max() < 1e-15
+    assert np.abs(D[8:] - (image[:,:-1] - image[:,1:]).ravel()).max() < 1e-15
+    B = rng.normal(0,1,[2,3])
+    C = rng.normal(0,1,[4,2])
+    assert np.abs(asMatrix(ut.Kronecker(B,C)) - np.kron(B,C)).max() < 1e-12
+    x = rng.normal(0,1,6)
+    assert np.abs(ut.Subset(6,[4,0,2]).dot(x) - x[[4,0,2]]).max() < 1e-15
+    with pytest.raises(Exception):
+        ut.Subset(6,[1,1])
+    with pytest.raises(Exception):
+        ut.Subset(6,[6])
+
+@pytest.mark.parametrize("nResponses",[1,2])
+def test_same_as_matrix(nResponses):
+    m = 40
+    d = 12
+    A = rng.normal(0,1,[m,d])
+    y = rng.normal(0,1,[m,nResponses]) if nResponses > 1 else rng.normal(0,1,m)
+    G1 = ut.BlockDiagonal([ut.Difference1d(6),ut.Subset(6,[0,5])])
+    G2 = ut.Kronecker(np.eye(3),ut.Difference1d(4))
+    runArgs = {'nblocks':2,'primalTol':1e-8,'dualTol':1e-8,'maxIterations':20000}
+    objectives = []
+    for useMatrices in [False,True]:
+        projSplit = ps.ProjSplitFit()
+        projSplit.addData(A,y,loss=2)
+        for G,reg in [(G1,L1(scaling=0.1)),(G2,L1(scaling=0.05))]:
+            projSplit.addRegularizer(reg,linearOp=asMatrix(G) if useMatrices else G)
+        projSplit.addRegularizer(L2sq(scaling=0.01))
+        projSplit.run(**runArgs)
+        objectives.append(projSplit.getObjective())
+    assert np.abs(objectives[0] - objectives[1]).max() < 1e-6
+
+@pytest.mark.parametrize("H",[rng.normal(0,1,[5,3]),sp.random(5,3,density=0.5,random_state=3),
+                              ut.Difference1d(6),ut.Subset(4,[3,1])])
+def test_intercept_operator(H):
+    op = ut.InterceptOperator(H)
+    M = asMatrix(H) if isinstance(H,ut.StructuredOperator) else (H.toarray() if sp.issparse(H) else H)
+    full = np.zeros((M.shape[0]+1,M.shape[1]+1))
+    full[0,0] = 1.0
+    full[1:,1:] = M
+    assert op.shape == full.shape
+    for cols in [(),(2,)]:
+        x = rng.normal(0,1,(full.shape[1],)+cols)
+        u = rng.normal(0,1,(full.shape[0],)+cols)
+        assert np.abs(op.matvec(x) - full.dot(x)).max() < 1e-12
+        assert np.abs(op.rmatvec(u) - full.T.dot(u)).max() < 1e-12
+        out = np.full((full.shape[0],)+cols,7.0)
+        assert op.matvec(x,out=out) is out
+        assert np.abs(out - full.dot(x)).max() < 1e-12
+
+def test_identity_skipped():
+    m = 30
+    d = 8
+    A = rng.normal(0,1,[m,d])
+    y = rng.normal(0,1,m)
+    projSplit = ps.ProjSplitFit()
+    projSplit.addData(A,y,loss=2,normalize=False)
+    projSplit.addRegularizer(L1(scaling=0.1))
+    projSplit.addRegularizer(L2sq(scaling=0.1))
+    projSplit.run(nblocks=3,primalTol=1e-9,dualTol=1e-9,maxIterations=20000)
+    assert len(projSplit.opBuffers) == 0
+
+    # the same problem through an explicit identity data operator
+    withOp = ps.ProjSplitFit()
+    withOp.addData(A,y,loss=2,normalize=False,linearOp=np.eye(d))
+    withOp.addRegularizer(L1(scaling=0.1))
+    withOp.addRegularizer(L2sq(scaling=0.1))
+    withOp.run(nblocks=3,primalTol=1e-9,dualTol=1e-9,maxIterations=20000)
+    assert abs(withOp.getObjective() - projSplit.getObjective()) < 1e-7
+
+@pytest.mark.parametrize("nResponses",[1,3])
+@pytest.mark.parametrize("sparseOps",[False,True])
+def test_stacked_matrices(nResponses,sparseOps):
+    m = 40
+    d = 15
+    A = rng.normal(0,1,[m,d])
+    y = rng.normal(0,1,[m,nResponses]) if nResponses > 1 else rng.normal(0,1,m)
+    G1 = sp.random(10,d,density=0.3,random_state=4)
+    G2 = rng.normal(0,1,[6,d])
+    if sparseOps:
+        G2 = sp.csr_matrix(G2)
+    else:
+        G1 = G1.toarray()
+    G3 = ut.Difference1d(d)
+    runArgs = {'nblocks':2,'blockActivation':'cyclic','primalTol':1e-7,'dualTol':1e-7,
+               'maxIterations':3000}
+    fits = []
+    for stacked in [True,False]:
+        projSplit = ps.ProjSplitFit()
+        projSplit.addData(A,y,loss=2,normalize=False)
+        for G in [G1,G3,G2]:
+            # as LinearOperators, matrices are applied one at a time
+            projSplit.addRegularizer(L1(scaling=0.05),
+                                     linearOp=G if stacked else aslinearoperator(G))
+        projSplit.addRegularizer(L1(scaling=0.02))
+        projSplit.addRegularizer(L2sq(scaling=0.01))
+        projSplit.run(**runArgs)
+        fits.append(projSplit)
+    assert fits[0].stackedRegs == [0,2]
+    assert fits[1].stackedOp is None
+    assert fits[0].k == fits[1].k
+    assert np.abs(fits[0].getSolution() - fits[1].getSolution()).max() < 1e-10
+
+def test_incomplete_operator():
+    class ForwardOnly(ut.StructuredOperator):
+        def _apply(self,x,out):
+            out[:] = x
+    with pytest.raises(TypeError):
+        ForwardOnly((3,3))
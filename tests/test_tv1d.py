@@ -0,0 +1,60 @@
+import sys
+sys.path.append('../')
+import projSplitFit as ps
+import projSplitUtils as ut
+from regularizers import TV1d
+from regularizers import L1
+import numpy as np
+from scipy.optimize import lsq_linear
+import pytest
+
+def proxByDual(y,lam):
+    # the prox of lam*TV at y is y - D^T u, u solving a bounded least squares
+    n = len(y)
+    D = ut.totalVariation1d(n).dot(np.eye(n))
+    u = lsq_linear(D.T,y,bounds=(-lam,lam),tol=1e-13,method='bvls').x
+    return y - D.T.dot(u)
+
+@pytest.mark.parametrize("n,lam",[(2,0.3),(7,0.1),(30,0.5),(30,5.0),(50,1e-4)])
+def test_prox(n,lam):
+    rng = np.random.default_rng(n)
+    y = np.repeat(rng.normal(0,2,5),n//5 + 1)[:n] + 0.2*rng.normal(0,1,n)
+    reg = TV1d(scaling=lam)
+    assert np.abs(reg.getProx(y) - proxByDual(y,lam)).max() < 1e-10
+    assert abs(reg.evaluate(y) - lam*np.sum(np.abs(np.diff(y)))) < 1e-10
+    # one column at a time for several responses
+    Y = np.stack([y,-y],axis=1)
+    assert np.abs(reg.getProx(Y)[:,1] + reg.getProx(y)).max() < 1e-10
+
+def test_operators():
+    rng = np.random.default_rng(0)
+    n = 6
+    x = rng.normal(0,1,n)
+    u = rng.normal(0,1,n-1)
+    for G in [ut.totalVariation1d(n),ut.dropFirst(n)]:
+        assert G.shape == (n-1,n)
+        assert abs(G.dot(x).dot(u) - x.dot(G.H.dot(u))) < 1e-12
+        X = rng.normal(0,1,[n,3])
+        assert np.abs(G.dot(X)[:,2] - G.dot(X[:,2])).max() < 1e-12
+    assert np.abs(ut.totalVariation1d(n).dot(x) - (x[:-1] - x[1:])).max() < 1e-15
+    assert np.abs(ut.dropFirst(n).dot(x) - x[1:]).max() < 1e-15
+
+def test_same_as_composed_L1():
+    m = 60
+    d = 80
+    rng = np.random.default_rng(1)
+    A = rng.normal(0,1,[m,d])
+    y = A.dot(np.repeat(rng.normal(0,1,4),20)) + 0.1*rng.normal(0,1,m)
+    runArgs = {'nblocks':3,'primalTol':1e-7,'dualTol':1e-7,'maxIterations':20000}
+
+    composed = ps.ProjSplitFit()
+    composed.addData(A,y,loss=2,normalize=False)
+    composed.addRegularizer(L1(scaling=0.05),linearOp=ut.totalVariation1d(d))
+    composed.run(**runArgs)
+
+    direct = ps.ProjSplitFit()
+    direct.addData(A,y,loss=2,normalize=False)
+    direct.addRegularizer(TV1d(scaling=0.05))
+    direct.run(**runArgs)
+    assert abs(direct.getObjective() - composed.getObjective()) < 1e-4
+    assert direct.k < composed.k
@@ -20,14 +20,28 @@ AllTests = []
 
 
 Processor = lp.Forward2Backtrack
-argsInOrder = [1.0,1.0,0.7,1.1,None]
-names = ["step","Delta","decFactor","growFactor","growFreq"]
+argsInOrder = [1.0,1.0,0.7,1.1,None,1]
+names = ["step","Delta","decFactor","growFactor","growFreq","trialBatch"]
 trials = [0.0,1.0,1.5,0.5,-1.0,"howdy"]
 expectedMtx = [[1.0,1.0,1.5,0.5,1.0,1.0],
                [1.0,1.0,1.5,0.5,1.0,1.0],
                [0.7,0.7,0.7,0.5,0.7,0.7],
                [1.0,1.0,1.5,1.0,1.0,1.0],
-               [ 10,  1,  1, 10, 10, 10]
+               [ 10,  1,  1, 10, 10, 10],
+               [  1,  1,  1,  1,  1,  1]
+              ]
+
+AllTests.extend(createNewTests(argsInOrder,names,trials,expectedMtx,Processor))
+
+Processor = lp.Forward2BB
+argsInOrder = [1.0,1.0,0.7,1.5,1]
+names = ["step","Delta","decFactor","maxGrowFactor","trialBatch"]
+trials = [0.0,1.0,1.5,0.5,-1.0,"howdy"]
+expectedMtx = [[1.0,1.0,1.5,0.5,1.0,1.0],
+               [1.0,1.0,1.5,0.5,1.0,1.0],
+               [0.7,0.7,0.7,0.5,0.7,0.7],
+               [1.5,1.0,1.5,1.5,1.5,1.5],
+               [  1,  1,  1,  1,  1,  1]
               ]
 
 AllTests.extend(createNewTests(argsInOrder,names,trials,expectedMtx,Processor))
@@ -40,6 +54,15 @@ expectedMtx = [[1.0,1.0,1.5,0.5,1.0,1.0]
               ]
 AllTests.extend(createNewTests(argsInOrder,names,trials,expectedMtx,Processor))
 
+Processor = lp.Forward2Stochastic
+argsInOrder = [1.0,100]
+names = ["step","batchSize"]
+trials = [0.0,1.0,1.5,0.5,-1.0,"howdy"]
+expectedMtx = [[1.0,1.0,1.5,0.5,1.0,1.0],
+               [100,  1,  1,100,100,100]
+              ]
+AllTests.extend(createNewTests(argsInOrder,names,trials,expectedMtx,Processor))
+
 Processor = lp.Forward2Affine
 
 argsInOrder = [1.0]
@@ -59,15 +82,16 @@ expectedMtx = [[1.0,1.0,1.5,0.5, 1.0,    1.0],
 AllTests.extend(createNewTests(argsInOrder,names,trials,expectedMtx,Processor))
 
 Processor = lp.Forward1Backtrack
-argsInOrder = [1.0,0.1,0.7,1.0,None]
-names = ["step","alpha","delta","growFac","growFreq"]
+argsInOrder = [1.0,0.1,0.7,1.0,None,1]
+names = ["step","alpha","delta","growFac","growFreq","trialBatch"]
 
 trials =       [0.0,1.0,1.5,0.5,-1.0,"howdy"]
 expectedMtx = [[1.0,1.0,1.5,0.5, 1.0,    1.0],
                [0.1,0.1,0.1,0.5, 0.1,    0.1],
                [0.7,0.7,0.7,0.5, 0.7,    0.7],
                [1.0,1.0,1.5,1.0, 1.0,    1.0],
-               [10 ,  1,  1, 10,  10,     10]
+               [10 ,  1,  1, 10,  10,     10],
+               [  1,  1,  1,  1,   1,      1]
               ]
 AllTests.extend(createNewTests(argsInOrder,names,trials,expectedMtx,Processor))
 
@@ -113,6 +137,20 @@ expectedMtx = [[1.0,1.0,1.5,0.5, 1.0,    1.0],
 
 AllTests.extend(createNewTests(argsInOrder,names,trials,expectedMtx,Processor))
 
+Processor = lp.BackwardNewtonCG
+
+argsInOrder = [0.9,1.0,100,20]
+names = ["sigma","step","maxIter","maxCGIter"]
+
+trials =       [0.0,1.0,1.5,0.5,-1.0,"howdy"]
+
+expectedMtx = [[0.0,0.9,0.9,0.5, 0.9,    0.9],
+               [1.0,1.0,1.5,0.5, 1.0,    1.0],
+               [100,  1,  1,100, 100,    100],
+               [ 20,  1,  1, 20,  20,     20]
+              ]
+AllTests.extend(createNewTests(argsInOrder,names,trials,expectedMtx,Processor))
+
 @pytest.mark.parametrize("Processor,args,testAttribute,expected",AllTests)
 def test_incorrect(Processor,args,testAttribute,expected):
     processObj = Processor(*args)